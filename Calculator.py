@@ -1,5 +1,10 @@
 import os
+import re
+import hashlib
+import inspect
+import functools
 import pandas as pd
+from concurrent.futures import wait, FIRST_COMPLETED
 import networkx as nx
 import dolphindb as ddb
 from typing import Dict, List
@@ -11,15 +16,35 @@ config = {
     "dayFactorTB":"pt",
     "minFactorDB":"dfs://Minfactor",
     "minFactorTB":"pt",
-    "sourceDict": "sourceDict", # 所有原始指标left join后存入的字典
+    "sourceDict": "sourceDict", # 加载规划中被多个dataPath组共用的原始数据表, 每个数据表只加载一次
     "sourceObj": "df",  # 原始所需要指标的left join得到内存表的名称
+    "daySourceObj": "dayDf",    # 分钟频+日频组中日频数据表left join得到的日频内存表名称(不展开至分钟行)
     "middleObj": "middle",  # 中间变量名称,字典格式,取的时候直接从字典取
     "dataObj": "data",  # 最终返回的因子变量名称
     "factorDict": "factorDict",  # 分钟频/日频共用因子Dict(不可被undef!)
+    "panelObj": "panel",    # 因子宽表模式下当前dataPath组的因子宽表名称: (symbol, TradeDate, 因子1, 因子2, ...)
+    "factorPanel": False,   # 是否使用因子宽表模式: 同组因子作为宽表的列, 衍生因子直接读取父因子列, 无需复制/对齐
+    "writeBatchMB": 256,    # 写入因子数据库时单批数据的内存上限(MB)
+    "resultCache": False,   # 是否启用结果缓存: 因子指纹与已存储区间均未变化的因子跳过计算
+    "cacheTB": "fingerprint",   # 因子指纹表名称(与因子表位于同一数据库)
+    "hydrate": False,   # 是否从因子数据库读取已存储的依赖因子, 而非从原始数据重新计算
+    "writeBehind": False,   # 是否写后即存: 因子计算完成后立即提交后台写入, 已无下游依赖的因子立即释放
+    "featureStore": False,  # 是否将classFunc生成的中间列(classFunc返回"columns")持久化至特征库, 已覆盖计算区间时直接读取
+    "featureDB": "dfs://Feature",   # 特征库名称, 每个classFunc对应一张特征表(表名为函数名)
+    "memSchedule": False,   # 是否按预测内存峰值编排组内因子计算顺序, 并释放下游因子均已计算完毕的中间因子
+    "symbolCount": 5000,    # 标的数量估计, 用于预测因子变量的内存占用
+    "memBudgetGB": None,    # 内存预算(GB), explain据此选择分块窗口与并发数量, 无法满足时直接报错
+    "telemetry": False,     # 是否记录每个阶段(加载/join/classFunc/midFunc/calFunc/填充/写入)的耗时、输出行数与内存
+    "statsTB": "factorStats",   # 阶段统计共享内存表名称(并发模式下各session共同写入)
+    "columnLiveness": False,    # 是否按classFunc/calFunc声明的读取列("reads")在最后一次使用后删除sourceObj中的列
+    "rollingState": False,  # 增量模式下是否保存因子族(family)的滚动状态: 按标的保存前缀和尾部, 次日更新无需回看父因子的窗口
+    "stateTB": "rollingState",  # 滚动状态表名称(维度表, 位于特征库featureDB中)
     "symbolCol": "symbol",
     "dateCol": "TradeDate",
     "timeCol": "TradeTime",
     "minuteCol": "minute",
+    "barsPerDay": 240,  # 分钟频每个交易日的K线数量, 用于将分钟频callBackPeriod换算为交易日
+    "marketType": "XSHG",   # 交易日历
 }
 
 def trans_time(start_date: str, end_date:str):
@@ -28,12 +53,31 @@ def trans_time(start_date: str, end_date:str):
     if not start_date:
         start_date = "2020.01.01"
     if not end_date:
-        end_date = pd.Timestamp(now).strftime("%Y.%m.%d")
+        end_date = pd.Timestamp.now().strftime("%Y.%m.%d")
     start_date = pd.Timestamp(start_date).strftime("%Y.%m.%d")
     end_date = pd.Timestamp(end_date).strftime("%Y.%m.%d")
     return start_date, end_date
 
 
+def with_trace(func):
+    """
+    运行函数装饰器: 增加trace参数(Chrome trace文件路径), 给定时本次运行临时开启阶段统计(telemetry),
+    运行结束后将阶段统计导出为Chrome/Perfetto trace-event文件(见FactorCalculator.export_trace)
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, trace: str = None, **kwargs):
+        telemetry = self.telemetry
+        self.telemetry = telemetry or bool(trace)
+        try:
+            res = func(self, *args, **kwargs)
+        finally:
+            self.telemetry = telemetry
+        if trace:
+            self.export_trace(trace)
+        return res
+    return wrapper
+
+
 def get_factor_byDependency(factor_cfg: Dict, factor_list: List[str]) -> List[str]:
     """
     安全版本：处理循环依赖，收集所有相关节点
@@ -306,6 +350,81 @@ def complete_factor_cfg(factor_cfg: Dict) -> Dict:
             factor_map[factor_name]['indicator'] = indicators
     return factor_map
 
+def expand_factor_family(factor_cfg: Dict) -> Dict:
+    """
+    展开因子族模板: 因子配置了"family": {"transform": ["avg","std"], "window": [5,10,20,...]}时,
+    为每个 变换×窗口 生成依赖该因子的滚动统计因子(因子名_变换窗口, 如shio_avg20), 由get_family计算
+    已显式配置的同名因子优先, 不会被模板覆盖
+    """
+    factor_map = dict(factor_cfg)
+    for factor_name, cfg in factor_cfg.items():
+        family = cfg.get("family")
+        if not family:
+            continue
+        for transform in family["transform"]:
+            for window in family["window"]:
+                member = f"{factor_name}_{transform}{window}"
+                if member in factor_map:
+                    continue
+                factor_map[member] = {"class": cfg["class"],
+                                      "calFunc": "get_family",
+                                      "dependency": {"factor": [factor_name], "midFunc": None},
+                                      "dataPath": [],
+                                      "indicator": [],
+                                      "params": {"freq": cfg["params"]["freq"], "callBackPeriod": window,
+                                                 "transform": transform, "window": window}}
+    return factor_map
+
+
+class DolphinDBBackend:
+    """
+    DolphinDB执行后端(默认): 由FactorCalculator生成DolphinDB脚本, 提交至session执行并上传至因子数据库
+    执行后端需要实现init(初始化)与execute(执行)两个方法, 见CalculatorLocal.LocalBackend;
+    执行计划与回看期估计(explain/get_callBackPeriod)还需要get_sourceRows/get_callBackDate/get_classInfo,
+    分块/并发/分片/增量模式直接执行生成的脚本, 只支持实现了run_script的后端
+    """
+    def init(self, calculator: "FactorCalculator",
+             dropDayDB: bool = False,
+             dropDayTB: bool = False,
+             dropMinDB: bool = False,
+             dropMinTB: bool = False):
+        calculator.init_def()  # 初始化相关变量+数据插入函数
+        calculator.init_database(dropDayDB, dropDayTB, dropMinDB, dropMinTB)  # 初始化数据库
+
+    def execute(self, calculator: "FactorCalculator", start_date: str, end_date: str):
+        calculator.plan_load()
+        calculator.processing(start_date, end_date, calculator.dataPath_MD_dict)
+        calculator.processing(start_date, end_date, calculator.dataPath_MM_dict)
+        calculator.processing(start_date, end_date, calculator.dataPath_DD_dict)
+        calculator.dolphindb_cmd += calculator.update_data(writeStartDict=calculator.writeStartDict)  # 上传至数据库的SQL语句
+        self.run_script(calculator, calculator.dolphindb_cmd)  # 运行
+        calculator.update_feature()
+        calculator.report_peak()
+        calculator.collect_stats()
+
+    def run_script(self, calculator: "FactorCalculator", script: str):
+        """在计算器的session中执行DolphinDB脚本"""
+        return calculator.session.run(script)
+
+    def get_sourceRows(self, calculator: "FactorCalculator", dataPath: str, start_date: str, end_date: str) -> int:
+        """原始数据表在[start_date, end_date]内的行数(按日期分区裁剪的count(*), 不读取指标列)"""
+        cfg = calculator.indicator_cfg[dataPath]
+        whereCond = "" if cfg["dateCol"] in ["", None, "NA"] else f" where {cfg['dateCol']} between {start_date} and {end_date}"
+        res = calculator.session.run(f"""exec count(*) from loadTable("{cfg['dataPath'][0]}", "{cfg['dataPath'][1]}"){whereCond}""")
+        return int(res or 0)
+
+    def get_callBackDate(self, calculator: "FactorCalculator", date: str, nDays: int) -> str:
+        """按交易日历(marketType)向前回看nDays个交易日"""
+        res = calculator.session.run(f"""temporalAdd({date},-{nDays},"{calculator.marketType}")""")
+        return pd.Timestamp(res).strftime("%Y.%m.%d")
+
+    def get_classInfo(self, calculator: "FactorCalculator", funcName: str) -> Dict:
+        """classFunc的声明(只生成命令, 不执行): 写入sourceObj的中间列columns、回看期callBackPeriod(K线数量)等"""
+        if funcName not in calculator.func_map:
+            return {}
+        res = calculator.func_map[funcName](calculator)
+        return res if isinstance(res, dict) else {}
+
 
 class FactorCalculator:
     def __init__(self, session: ddb.session,
@@ -314,11 +433,27 @@ class FactorCalculator:
                  indicator_cfg: Dict,
                  func_map: Dict,    # 函数str:对应函数Obj
                  class_cfg: Dict = None,
+                 backend = None,    # 执行后端, 默认为DolphinDBBackend
                  ):
 
         """初始化"""
         self.session = session
         self.dolphindb_cmd = "" # 最终合成的DolphinDB命令
+        self.dolphindb_cmdDict = {}  # 并发模式下每个dataPath组对应的DolphinDB命令
+        self.shardMode = False  # 分片模式: 只生成时序部分, 截面填充在合并分片后统一执行
+        self.fillList = []  # 已计算但尚未执行截面填充的因子列表(calFunc返回"fill": True)
+        self.fuseDict = {}  # (from, by): [(因子名, select表达式)], 尚未执行的可合并select(calFunc返回"select")
+        self.panelMode = False  # 当前dataPath组是否使用因子宽表
+        self.panelList = []  # 当前因子宽表中已有的因子列表
+        self.writeMode = False  # 当前dataPath组是否写后即存
+        self.writeList = []  # 已提交后台写入的因子列表
+        self.releaseList = []   # 当前dataPath组中已从factorDict释放的因子列表
+        self.writeStartDict = {}    # 因子: 已存储的最新日期(增量/分块模式), 只写入该日期之后的数据
+        self.sourceCols = []    # 当前sourceObj中的指标列(不含索引列)
+        self.classCols = []     # 当前dataPath组中classFunc写入sourceObj的列(classFunc返回"columns")
+        self.readList = []  # 当前片段中已生成命令的classFunc/calFunc读取的sourceObj列, 未声明时为None
+        self.fuseReadDict = {}  # 因子名: 暂存于fuseDict中的因子读取的sourceObj列
+        self.midList = None     # 当前dataPath组中已生成的midFunc/预处理命令(同组内只生成一次), None时不去重
         self.factor_need = []       # 实际需要添加的因子列表
         self.factor_list = []       # 所有需要的因子列表
 
@@ -339,23 +474,60 @@ class FactorCalculator:
         self.factorFuncName_dict = {}
 
         self.config = config
-        self.factor_cfg = factor_cfg
+        self.factor_cfg = expand_factor_family(factor_cfg)
         self.indicator_cfg = indicator_cfg
         self.func_map = func_map
         self.class_cfg = class_cfg if class_cfg else {}
+        self.backend = backend if backend else DolphinDBBackend()
         self.dayDB = config["dayFactorDB"]   # 因子库名(日频)
         self.dayTB = config["dayFactorTB"]  # 因子表名(日频)
         self.minDB = config["minFactorDB"]
         self.minTB = config["minFactorTB"]
         self.sourceDict = config["sourceDict"]
         self.sourceObj = config["sourceObj"]
+        self.daySourceObj = config["daySourceObj"]
         self.middleObj = config["middleObj"]
         self.dataObj = config["dataObj"]
         self.factorDict = config["factorDict"]
+        self.panelObj = config.get("panelObj", "panel")
+        self.factorPanel = config.get("factorPanel", False)
+        self.writeBehind = config.get("writeBehind", False)
+        self.writeBatchMB = config.get("writeBatchMB", 256)
+        self.columnLiveness = config.get("columnLiveness", False)
+        self.telemetry = config.get("telemetry", False)
+        self.statsTB = config.get("statsTB", "factorStats")
+        self.stageGroup = ""    # 当前生成命令所属的dataPath组, 写入阶段统计
+        self.stats = None   # 最近一次运行的阶段统计(DataFrame), 见collect_stats
+        self.memSchedule = config.get("memSchedule", False)
+        self.symbolCount = config.get("symbolCount", 5000)
+        self.memBudgetGB = config.get("memBudgetGB", None)
+        self.releaseMode = False    # 当前dataPath组是否释放已无下游依赖的中间因子
+        self.predictedPeak = 0  # 预测的factorDict内存峰值(字节)
+        self.retainedBytes = 0  # 之前的dataPath组计算完毕后仍保留在factorDict中的因子内存(字节)
+        self.featureStore = config.get("featureStore", False)
+        self.featureDB = config.get("featureDB", "dfs://Feature")
+        self.featureMode = False    # 当前dataPath组是否使用特征库
+        self.loadRange = None   # (起始日期, 结束日期), 当前dataPath组的数据加载区间
+        self.featureStoreDict = None    # 特征表: (指纹, 已存储起始日期, 已存储结束日期), 首次使用时查询
+        self.featurePendingList = []    # 本次脚本中写入的特征表区间, 脚本运行完毕后写入特征库的指纹表
+        self.resultCache = config.get("resultCache", False)
+        self.cacheTB = config.get("cacheTB", "fingerprint")
+        self.rollingState = config.get("rollingState", False)
+        self.stateTB = config.get("stateTB", "rollingState")
+        self.stateDict = {}     # 增量模式下有可用滚动状态的父因子: 状态表中已存储的最新日期
+        self.stateWrite = False     # 本次运行结束时是否写入滚动状态(写入前保留因子族的前缀和表)
+        self.prepDict = {}  # 由预处理命令生成的输入表: 预处理命令, 合并的select执行后释放
+        self.hydrate = config.get("hydrate", False)
+        self.hydrateRange = None    # (起始日期, 结束日期), 依赖因子从因子数据库读取的区间
+        self.loadCountDict = {}     # 加载规划: 数据表: 使用该数据表的dataPath组数量(只包含通过sourceDict加载的数据表)
+        self.loadFeatureDict = {}   # 加载规划: 数据表: 所有dataPath组所需特征的并集
+        self.loadedDict = {}    # 数据表: 已加载至sourceDict中的剩余使用次数
         self.symbolCol = config["symbolCol"]
         self.dateCol = config["dateCol"]
         self.timeCol = config["timeCol"]
         self.minuteCol = config["minuteCol"]
+        self.barsPerDay = config.get("barsPerDay", 240)
+        self.marketType = config.get("marketType", "XSHG")
 
     def set_factorList(self, factor_list: List):
         self.factor_need = factor_list  # 真正需要传上去的因子列表
@@ -385,7 +557,7 @@ class FactorCalculator:
             schemaTb = table(1:0, ["symbol","date","factor","value"],[SYMBOL,DATE,SYMBOL,DOUBLE])
             db.createPartitionedTable(schemaTb, "{self.dayTB}", partitionColumns=`date`factor, sortColumns=`factor`symbol`date, keepDuplicates=LAST)
             """)
-        if not self.session.existsTable(dbUrl=self.minDB,tableName=self.dayTB):
+        if not self.session.existsTable(dbUrl=self.minDB,tableName=self.minTB):
             self.session.run(f"""
             db1 = database(,VALUE,2010.01M..2030.01M)
             db2 = database(,VALUE,[`Maxim,`DolphinDB])
@@ -393,12 +565,62 @@ class FactorCalculator:
             schemaTb = table(1:0, ["symbol","date","time","factor","value"], [SYMBOL,DATE,TIME,SYMBOL,DOUBLE])
             db.createPartitionedTable(schemaTb, "{self.minTB}", partitionColumns=`date`factor, sortColumns=`factor`symbol`time`date, keepDuplicates=LAST)
             """)
+        if self.featureStore:
+            self.init_feature()
+        if self.rollingState:
+            self.init_state()
+
+    def init_feature(self):
+        """创建特征库(按月分区)及特征指纹表(维度表, 每张特征表只保留最新一条)"""
+        if not self.session.existsDatabase(dbUrl=self.featureDB):
+            self.session.run(f"""
+            database("{self.featureDB}", VALUE, 2010.01M..2030.01M, engine="TSDB")
+            """)
+        if not self.session.existsTable(dbUrl=self.featureDB, tableName=self.cacheTB):
+            self.session.run(f"""
+            schemaTb = table(1:0, ["feature","fingerprint","startDate","endDate","updateTime"], [SYMBOL,STRING,DATE,DATE,TIMESTAMP])
+            createDimensionTable(database("{self.featureDB}"), schemaTb, "{self.cacheTB}", sortColumns=`feature, keepDuplicates=LAST)
+            """)
+        self.featureStoreDict = None
+        self.featurePendingList = []
+
+    def init_state(self):
+        """在特征库中创建滚动状态表(维度表): 因子族父因子每个标的最近若干行的值与前缀和"""
+        if not self.session.existsDatabase(dbUrl=self.featureDB):
+            self.session.run(f"""
+            database("{self.featureDB}", VALUE, 2010.01M..2030.01M, engine="TSDB")
+            """)
+        if not self.session.existsTable(dbUrl=self.featureDB, tableName=self.stateTB):
+            self.session.run(f"""
+            schemaTb = table(1:0, ["factor","fingerprint","{self.symbolCol}","{self.dateCol}","x","preX","preX2","preN"],
+                             [SYMBOL,STRING,SYMBOL,DATE,DOUBLE,DOUBLE,DOUBLE,LONG])
+            createDimensionTable(database("{self.featureDB}"), schemaTb, "{self.stateTB}", sortColumns=`factor`{self.symbolCol}`{self.dateCol}, keepDuplicates=LAST)
+            """)
+
+    def is_minFactor(self, factorName: str) -> bool:
+        """是否为分钟频因子"""
+        return str(self.factor_cfg[factorName]["params"]["freq"]).lower() in ["minute","m","min"]
+
+    def get_deps(self, factorName: str) -> List:
+        """因子直接依赖的因子列表(配置中dependency.factor可以为单个因子名称)"""
+        deps = self.factor_cfg[factorName]["dependency"]["factor"] or []
+        return [deps] if isinstance(deps, str) else list(deps)
+
+    def get_periodDays(self, factorName: str) -> int:
+        """因子自身的回看期(params.callBackPeriod)换算为交易日: 分钟频因子的单位为K线数量, 按barsPerDay向上取整"""
+        period = int(self.factor_cfg[factorName]["params"].get("callBackPeriod") or 0)
+        return -(-period // self.barsPerDay) if self.is_minFactor(factorName) else period
 
     def init_check(self):
         """
         检查给定的config内部结构是否合理
         补全给定的config内部配置项信息
         """
+        # 重置划分结果, 多次调用(如explain之后再run)时不重复添加
+        self.dataPath_D_list, self.dataPath_M_list = [], []
+        self.factor_day_list, self.factor_min_list = [], []
+        self.factor_DD_list, self.factor_MM_list, self.factor_MD_list = [], [], []
+        self.classFactorName_dict, self.factorFuncName_dict = {}, {}
         # 补全indicator_cfg中的indicator信息
         for dbName, indicator_Dict in self.indicator_cfg.items():
             # 判断数据库表对应的时间频率
@@ -425,7 +647,7 @@ class FactorCalculator:
                     if str(dataPath) not in indicatorList[j]:
                         self.factor_cfg[factorName]["indicator"][i][j] = str(dataPath)+"_"+self.factor_cfg[factorName]["indicator"][i][j]
             # 添加至对应频率的因子列表
-            if str(Dict["params"]["freq"]).lower() in ["minute","m","min"]:
+            if self.is_minFactor(factorName):
                 self.factor_min_list.append(factorName)
             else:
                 self.factor_day_list.append(factorName)
@@ -460,39 +682,170 @@ class FactorCalculator:
     def init_def(self):
         self.session.run(f"""
         {self.sourceObj}=0;
+        {self.daySourceObj}=0;
+        {self.sourceDict}=dict(STRING,ANY);  // 多个dataPath组共用的原始数据表
         {self.middleObj}=syncDict(STRING,ANY);  // [线程安全Dict]中间无关变量
         {self.dataObj}=0;
         {self.factorDict}=syncDict(STRING,ANY); // [线程安全Dict]因子变量,算完了丢进去
-        """+self.data_insert()  # 定义插入函数
+        peakMem=0;  // 观测的内存峰值(字节)
+        """+self.stats_def()+self.data_insert()  # 定义插入函数
         )
-    def data_insert(self):
-        # 分批添加至数据库
+    def init_shared(self, objName: str = None):
+        """
+        将factorDict声明为跨session共享的syncDict, 供并发模式下不同dataPath组之间传递因子
+        objName: 共享变量名称, 默认为factorDict
+        """
+        objName = objName if objName else self.factorDict
+        return f"""
+        try{{ undef("{objName}", SHARED) }}catch(ex){{}};
+        try{{ undef(`{objName}) }}catch(ex){{}};
+        syncDict(STRING, ANY, "{objName}");  // [线程安全Dict]共享因子变量
+        """
+
+    def stats_def(self) -> str:
+        """定义阶段统计共享内存表(每次初始化时清空)"""
+        if not self.telemetry:
+            return ""
         return f"""
-        def InsertData(DBName, TBName, data, batchsize){{
-            // 预防Out of Memory，分批插入数据，batchsize为每次数据的记录数
-            start_idx = 0
-            end_idx = batchsize
+        try{{ undef("{self.statsTB}", SHARED) }}catch(ex){{}};
+        share table(1:0, ["group","kind","name","startTime","endTime","rows","memBefore","memAfter","worker","rowsPerSec"],
+                    [STRING,STRING,STRING,NANOTIMESTAMP,NANOTIMESTAMP,LONG,LONG,LONG,STRING,DOUBLE]) as {self.statsTB};
+        """
+
+    def stage_cmd(self, kind: str, name: str, cmd: str, rowsObj: str = None, nameVar: str = None, rateVar: str = None) -> str:
+        """
+        性能统计: 记录单个阶段的开始/结束时间、输出行数(rowsObj的行数)、执行前后的session内存, 写入statsTB
+        kind: load/join/classFunc/midFunc/calFunc/fill/insert; nameVar: 阶段名称为DolphinDB变量时给定变量名
+        rateVar: 阶段命令返回的写入速度(行/秒)所在的变量(insert阶段), 其余阶段为空值
+        注: 只包装不再嵌套其他阶段的命令
+        """
+        if not self.telemetry or not cmd.strip():
+            return cmd
+        rows = f"long(rows({rowsObj}))" if rowsObj else "0"
+        name = nameVar if nameVar else f'"{name}"'
+        rate = rateVar if rateVar else "00F"
+        return f"""
+    stageStart = now(true);
+    stageMem = mem()["allocatedBytes"] - mem()["freeBytes"];""" + cmd + f"""
+    {self.statsTB}.tableInsert("{self.stageGroup}", "{kind}", {name}, stageStart, now(true), {rows}, stageMem, mem()["allocatedBytes"] - mem()["freeBytes"],
+                               string(getCurrentSessionAndUser()[0]), {rate});
+    """
+
+    def export_trace(self, path: str, stats: pd.DataFrame = None):
+        """
+        将阶段统计导出为Chrome/Perfetto trace-event文件(chrome://tracing或ui.perfetto.dev打开)
+        1. 每个阶段为一个span(ph="X"), 每个执行session(并发模式下的每个worker)为一条track
+        2. 因子依赖关系以flow箭头(ph="s"/"f")连接: 依赖因子的计算阶段结束 -> 下游因子的计算阶段开始, 便于查看关键路径
+        """
+        stats = self.stats if stats is None else stats
+        if stats is None or len(stats) == 0:
+            print("阶段统计为空, 未导出trace")
+            return
+        startTime, endTime = pd.to_datetime(stats["startTime"]), pd.to_datetime(stats["endTime"])
+        origin = startTime.min()
+        tidDict = {worker: i + 1 for i, worker in enumerate(dict.fromkeys(stats["worker"]))}
+        eventList = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"session {worker}"}}
+                     for worker, tid in tidDict.items()]
+        spanDict = {}   # 因子名: 计算该因子的span
+        for i in range(len(stats)):
+            row = stats.iloc[i]
+            span = {"name": row["name"], "cat": row["kind"], "ph": "X", "pid": 1, "tid": tidDict[row["worker"]],
+                    "ts": (startTime.iloc[i] - origin).total_seconds() * 1e6,
+                    "dur": max((endTime.iloc[i] - startTime.iloc[i]).total_seconds() * 1e6, 1.0),
+                    "args": {"group": row["group"], "rows": int(row["rows"]),
+                             "memBefore": int(row["memBefore"]), "memAfter": int(row["memAfter"])}}
+            eventList.append(span)
+            if row["kind"] == "calFunc":
+                for factor in str(row["name"]).split(","):
+                    spanDict[factor] = span
+        flowId = 0
+        for factor, span in spanDict.items():
+            if factor not in self.factor_cfg:
+                continue
+            for dep in self.get_deps(factor):
+                if dep not in spanDict or spanDict[dep] is span:
+                    continue
+                flowId += 1
+                depSpan = spanDict[dep]
+                eventList.append({"name": "dependency", "cat": "dependency", "ph": "s", "id": flowId, "pid": 1,
+                                  "tid": depSpan["tid"], "ts": depSpan["ts"] + depSpan["dur"]})
+                eventList.append({"name": "dependency", "cat": "dependency", "ph": "f", "bp": "e", "id": flowId, "pid": 1,
+                                  "tid": span["tid"], "ts": span["ts"]})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": eventList, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        print(f"trace已导出至{path}: {len(stats)}个阶段, {len(tidDict)}个session")
+
+    def collect_stats(self):
+        """
+        运行结束后取回阶段统计至self.stats: 每个阶段一行, 附加耗时(ms)与内存变化(字节), 并输出耗时最长的阶段
+        insert阶段的rowsPerSec为InsertData返回的写入速度(行/秒)
+        """
+        if not self.telemetry:
+            return None
+        stats = self.session.run(f"select * from {self.statsTB}")
+        if stats is None or len(stats) == 0:
+            return None
+        stats["duration"] = (pd.to_datetime(stats["endTime"]) - pd.to_datetime(stats["startTime"])).dt.total_seconds() * 1000
+        stats["memDelta"] = stats["memAfter"] - stats["memBefore"]
+        self.stats = stats
+        print("阶段统计: 耗时最长的10个阶段(ms)")
+        print(stats.sort_values("duration", ascending=False).head(10)[["group","kind","name","rows","duration","memDelta"]].to_string(index=False))
+        insert = stats[stats["kind"] == "insert"]
+        if len(insert):
+            print(f"因子写入: {len(insert)}个因子, 平均{insert['rowsPerSec'].mean():.0f}行/秒, 最慢{insert['rowsPerSec'].min():.0f}行/秒")
+        return stats
+
+    def data_insert(self):
+        # 按分区分批并行添加至数据库
+        return rf"""
+        def InsertPartition(DBName, TBName, data, rowIdx){{
+            loadTable(DBName, TBName).append!(data[rowIdx]);
+            return size(rowIdx)
+        }};
+        def InsertData(DBName, TBName, data, batchMB){{
+            // 单个因子的数据只属于COMPO分区第二层(factor)的一个分区, 按第一层(date月份)将行号分组,
+            // 每批只包含完整的月份分区, 按数据实际内存占用控制每批不超过batchMB, 不同批次写入不相交的分区, 并行执行
+            // (同时写入的批次数不超过localExecutors+1, 额外内存约为其与batchMB之积)
             krow = rows(data)
-            do{{ 
-                slice_data = data[start_idx:min(end_idx,krow),]
-                if (rows(slice_data)>0){{
-                loadTable(DBName, TBName).append!(slice_data);
-                print(start_idx);
+            if (krow==0){{
+                return 0.0
+            }}
+            startTime = now()
+            monthIdx = groups(month(data.column(1)))  // 月份: 行号
+            batchRows = max(1, long(batchMB * 1048576.0 \ (memSize(data) \ krow)))
+            batchDict = dict(INT, ANY)
+            batch = array(INT, 0)
+            for (m in sort(monthIdx.keys())){{
+                if (size(batch)>0 and size(batch)+size(monthIdx[m])>batchRows){{
+                    batchDict[size(batchDict)] = batch
+                    batch = array(INT, 0)
                 }}
-                start_idx = start_idx + batchsize
-                end_idx = end_idx + batchsize
-            }}while(start_idx < krow)
+                batch.append!(monthIdx[m])
+            }}
+            batchDict[size(batchDict)] = batch
+            ploop(InsertPartition{{DBName, TBName, data}}, batchDict.values())
+            rowsPerSec = krow \ max(1, now()-startTime) * 1000.0
+            print("因子"+string(data.column(columns(data)-2)[0])+"写入"+string(krow)+"行, "+string(size(batchDict))+"批, "+string(round(rowsPerSec,0))+"行/秒")
+            return rowsPerSec
         }};
         InsertDayFactor = InsertData{{"insertDayDB", "insertDayTB", , }};
         InsertMinFactor = InsertData{{"insertMinDB", "insertMinTB", , }};
         """.replace("insertDayDB",self.dayDB).replace("insertDayTB",self.dayTB).replace("insertMinDB",self.minDB).replace("insertMinTB",self.minTB)
 
-    def no_leftJoin(self, dataPath: str, indicator_dict: dict, start_date:str, end_date: str):
+    def no_leftJoin(self, dataPath: str, indicator_dict: dict, start_date:str, end_date: str, shard: List = None, objName: str = None,
+                    cfg: Dict = None):
+        """
+        加载单个数据表并转换为标准字段名称
+        objName: 加载结果的变量名称, 默认为sourceObj
+        cfg: 数据表配置(格式同indicator_cfg), 默认为indicator_cfg[dataPath]
+        """
+        objName = objName if objName else self.sourceObj
         start_date, end_date = trans_time(start_date, end_date)
-        cfg = self.indicator_cfg[dataPath]
+        cfg = cfg if cfg else self.indicator_cfg[dataPath]
         for colName in ["symbolCol","dateCol","timeCol"]:
             if cfg[colName] in ["", None]:
                 cfg[colName] = "NA"
+        shardCond = self.get_shardCond("symbolCol", cfg, shard)
         return f"""
          // 配置项
         start_date = {start_date};
@@ -520,13 +873,13 @@ class FactorCalculator:
         names = matchingCols.copy().append!(string(indicator_dict.keys()));
         selects = idxCols.copy().append!(string(indicator_dict.values()));
         if (dateCol!="NA"){{
-            {self.sourceObj} = <select _$$selects as _$$names from loadTable(dbName, tbName) where _$dateCol between start_date and end_date>.eval()              
+            {objName} = <select _$$selects as _$$names from loadTable(dbName, tbName) where _$dateCol between start_date and end_date{shardCond}>.eval()              
         }}else{{
-            {self.sourceObj} = <select _$$selects as _$$names from loadTable(dbName, tbName)>.eval()          
+            {objName} = <select _$$selects as _$$names from loadTable(dbName, tbName){shardCond.replace(",", " where", 1)}>.eval()          
         }}
         """
 
-    def first_leftJoin(self, lpath: str, rpath: str, lindicator_dict: dict, rindicator_dict:dict, start_date: str, end_date: str):
+    def first_leftJoin(self, lpath: str, rpath: str, lindicator_dict: dict, rindicator_dict:dict, start_date: str, end_date: str, shard: List = None):
         """
         生成left join语句(第一次生成SourceObj的语句, 后续由left_join函数使得SourceObj增量去left join右表)
         """
@@ -539,6 +892,8 @@ class FactorCalculator:
                 lcfg[colName] = "NA"
             if rcfg[colName] in ["", None]:
                 rcfg[colName] = "NA"
+        lshardCond = self.get_shardCond("lsymbolCol", lcfg, shard)
+        rshardCond = self.get_shardCond("rsymbolCol", rcfg, shard)
 
         return f"""
         // 第一次left join
@@ -597,26 +952,27 @@ class FactorCalculator:
         rselects = rightIdxCols.copy().append!(string(rindicator_dict.values()));
         
         if (ldateCol!="NA"){{
-            leftTable = <select _$$lselects as _$$lnames from loadTable(ldbName, ltbName) where _$ldateCol between start_date and end_date>.eval()              
+            leftTable = <select _$$lselects as _$$lnames from loadTable(ldbName, ltbName) where _$ldateCol between start_date and end_date{lshardCond}>.eval()              
         }}else{{
-            leftTable = <select _$$lselects as _$$lnames from loadTable(ldbName, ltbName)>.eval()          
+            leftTable = <select _$$lselects as _$$lnames from loadTable(ldbName, ltbName){lshardCond.replace(",", " where", 1)}>.eval()          
         }}
         if (rdateCol!="NA"){{
-            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName) where _$rdateCol between start_date and end_date>.eval()              
+            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName) where _$rdateCol between start_date and end_date{rshardCond}>.eval()              
         }}else{{
-            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName)>.eval()          
+            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName){rshardCond.replace(",", " where", 1)}>.eval()          
         }};        
         {self.sourceObj} = lsj(leftTable, rightTable, matchingCols);     
         undef(`leftTable`rightTable);  // 释放内存
         """
 
-    def after_leftJoin(self, rpath: str, rindicator_dict: dict, start_date: str, end_date: str):
+    def after_leftJoin(self, rpath: str, rindicator_dict: dict, start_date: str, end_date: str, shard: List = None):
         start_date, end_date = trans_time(start_date, end_date)
         # 左表的名称为$sourceObj获取右表的数据库名称
         rcfg = self.indicator_cfg[rpath]
         for colName in ["symbolCol", "dateCol", "timeCol"]:
             if rcfg[colName] in ["", None]:
                 rcfg[colName] = "NA"
+        rshardCond = self.get_shardCond("rsymbolCol", rcfg, shard)
         return f"""
         // 第二次及后续left join
         // 配置项
@@ -661,14 +1017,170 @@ class FactorCalculator:
         rselects = rightIdxCols.copy().append!(string(rindicator_dict.values())).append!(addSelectCols)
         
         if (rdateCol!="NA"){{
-            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName) where _$rdateCol between start_date and end_date>.eval()              
+            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName) where _$rdateCol between start_date and end_date{rshardCond}>.eval()              
         }}else{{
-            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName)>.eval()          
+            rightTable = <select _$$rselects as _$$rnames from loadTable(rdbName, rtbName){rshardCond.replace(",", " where", 1)}>.eval()          
         }}
         {self.sourceObj} = lsj({self.sourceObj}, rightTable, matchingCols);
         undef(`rightTable); // 释放内存
         """
 
+    def fill_cmd(self, factorList: List) -> str:
+        """
+        截面空缺值均值填充: 将factorList中的因子按(symbol, TradeDate)对齐为一张表, 一次context by TradeDate完成所有因子的填充
+        注: 同一组内的因子由同一sourceObj计算得到, 以第一个因子的(symbol, TradeDate)为对齐基准;
+            已在因子宽表中的因子直接在宽表上填充
+        """
+        minList = [factorName for factorName in factorList if self.is_minFactor(factorName)]
+        if minList and len(minList) < len(factorList):  # 日频/分钟频因子的键不同, 分别填充
+            return self.fill_cmd([factorName for factorName in factorList if factorName not in minList]) + self.fill_cmd(minList)
+        cmd = ""
+        panelList = [factorName for factorName in factorList if self.factor_ref(factorName) == self.panelObj]
+        factorList = [factorName for factorName in factorList if factorName not in panelList]
+        if panelList:
+            cmd += f"""
+    // 截面空缺值填充(因子宽表)
+    update {self.panelObj} set {", ".join([f"{factorName} = nullFill({factorName},avg({factorName}))" for factorName in panelList])} context by {self.dateCol};
+    """
+        if not factorList:
+            return cmd
+        keyCols = self.get_keyCols(factorList[0])
+        if len(factorList) == 1:  # 单个因子直接原地填充
+            factorName = factorList[0]
+            return cmd + f"""
+    // 截面空缺值填充
+    {self.dataObj} = {self.factorDict}["{factorName}"];
+    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {",".join(keyCols[1:])};
+    """
+        cmd += f"""
+    // 截面空缺值填充(合并{len(factorList)}个因子)
+    {self.middleObj} = select {",".join(keyCols)},{factorList[0]} from {self.factorDict}["{factorList[0]}"];
+    """
+        for factorName in factorList[1:]:
+            cmd += f"""{self.middleObj} = lj({self.middleObj}, select {",".join(keyCols)},{factorName} from {self.factorDict}["{factorName}"], `{"`".join(keyCols)});
+    """
+        cmd += f"""update {self.middleObj} set {", ".join([f"{factorName} = nullFill({factorName},avg({factorName}))" for factorName in factorList])} context by {",".join(keyCols[1:])};
+    """
+        for factorName in factorList:
+            cmd += f"""{self.factorDict}["{factorName}"] = select {",".join(keyCols)},"{factorName}" as `factor,{factorName} from {self.middleObj};
+    """
+        return cmd
+
+    def flush_fill(self) -> str:
+        """对所有尚未填充的因子执行一次合并的截面填充(先执行尚未合并计算的因子)"""
+        cmd = self.flush_fuse()
+        cmd += self.stage_cmd("fill", ",".join(self.fillList), self.fill_cmd(self.fillList))
+        self.fillList = []
+        return cmd
+
+    def fuse_cmd(self, source: str, by: str, selectList: List) -> str:
+        """
+        横向合并: 输入表(source)与分组子句(by)相同的多个因子在一次select中计算, 再按因子拆分进factorDict
+        selectList: [(因子名, select表达式)]
+        注: group by时分组列自动出现在结果中, context by/无分组时需显式选出symbolCol/dateCol(含分钟频因子时还需timeCol);
+            非分片模式下需要截面填充的因子直接在合并结果上填充, 不再单独对齐;
+            因子宽表模式下输入为宽表时原地update新增因子列, 否则合并结果先按宽表的键列对齐(只复制键列), 再原地新增至宽表
+        """
+        factorList = [factorName for factorName, _ in selectList]
+        if source == self.panelObj and not by.strip().startswith("group by"):
+            cmd = f"""
+    // 因子宽表合并计算{len(factorList)}个因子: {",".join(factorList)}
+    update {self.panelObj} set {", ".join([f"{factorName} = {expr}" for factorName, expr in selectList])} {by};
+    """
+            return cmd + self.panel_cmd(factorList)
+        keyList = max([self.get_keyCols(factorName) for factorName in factorList], key=len)
+        keyCols = "" if by.strip().startswith("group by") else f"{','.join(keyList)},"
+        cmd = f"""
+    // 合并计算{len(factorList)}个因子: {",".join(factorList)}
+    {self.middleObj} = select {keyCols}{", ".join([f"{expr} as {factorName}" for factorName, expr in selectList])} 
+                        from {source} {by};
+    """
+        fillList = [] if self.shardMode else [factorName for factorName in factorList if factorName in self.fillList]
+        if fillList:
+            cmd += f"""update {self.middleObj} set {", ".join([f"{factorName} = nullFill({factorName},avg({factorName}))" for factorName in fillList])} context by {",".join(keyList[1:])};
+    """
+            self.fillList = [factorName for factorName in self.fillList if factorName not in fillList]
+        if self.panelMode:
+            if self.panelList:
+                cmd += f"""{self.middleObj} = lj(select {self.symbolCol},{self.dateCol} from {self.panelObj}, {self.middleObj}, `{self.symbolCol}`{self.dateCol});
+    update {self.panelObj} set {", ".join([f'{factorName} = {self.middleObj}["{factorName}"]' for factorName in factorList])};
+    """
+            else:
+                cmd += f"""{self.panelObj} = {self.middleObj};
+    """
+            return cmd + self.panel_cmd(factorList)
+        for factorName in factorList:
+            cmd += f"""{self.factorDict}["{factorName}"] = select {",".join(self.get_keyCols(factorName))},"{factorName}" as `factor,{factorName} from {self.middleObj};
+    print("因子{factorName}计算完毕");
+    """
+        return cmd
+
+    def panel_cmd(self, factorList: List) -> str:
+        """
+        登记新增至因子宽表的因子, 组内通过factor_ref直接引用宽表
+        宽表始终原地新增列, factorDict中的因子在组内计算完毕后统一指向宽表(见panelDict_cmd)
+        """
+        self.panelList += [factorName for factorName in factorList if factorName not in self.panelList]
+        cmd = ""
+        for factorName in factorList:
+            cmd += f"""print("因子{factorName}计算完毕");
+    """
+        return cmd
+
+    def panelDict_cmd(self) -> str:
+        """因子宽表模式下组内计算完毕后, 将宽表中(未释放)的因子一次性登记进factorDict"""
+        if not (self.panelMode and self.panelList):
+            return ""
+        return f"""
+    for (factor in {self.panelList}){{
+        {self.factorDict}[factor] = {self.panelObj};
+    }};
+    """
+
+    def get_keyCols(self, factorName: str) -> List:
+        """因子表的键列: 日频因子为(symbol, TradeDate), 分钟频因子为(symbol, TradeDate, TradeTime)"""
+        keyCols = [self.symbolCol, self.dateCol]
+        return keyCols + [self.timeCol] if self.is_minFactor(factorName) else keyCols
+
+    def factor_ref(self, factorName: str) -> str:
+        """因子所在的表: 已在当前因子宽表中的因子直接引用宽表, 否则引用factorDict中的单因子表"""
+        if self.panelMode and factorName in self.panelList:
+            return self.panelObj
+        return f'{self.factorDict}["{factorName}"]'
+
+    def flush_fuse(self) -> str:
+        """
+        执行所有尚未合并计算的select
+        由预处理命令生成的输入表(如因子族的前缀和表)在select执行后释放, 同组内之后仍需要时重新生成;
+        需要写入滚动状态时保留至state_cmd写入后释放
+        """
+        cmd = "".join([self.stage_cmd("calFunc", ",".join([factor for factor, _ in selectList]), self.fuse_cmd(source, by, selectList),
+                                      self.panelObj if self.panelMode else self.middleObj)
+                       for (source, by), selectList in self.fuseDict.items()])
+        for selectList in self.fuseDict.values():
+            self.readList.extend([self.fuseReadDict.pop(factor, None) for factor, _ in selectList])
+        for source, _ in self.fuseDict.keys():
+            if source not in self.prepDict or self.stateWrite:
+                continue
+            prep = self.prepDict.pop(source)
+            if self.midList is not None and prep in self.midList:
+                self.midList.remove(prep)
+            cmd += f"""undef("{source}");   // 释放预处理生成的输入表
+    """
+        self.fuseDict = {}
+        return cmd
+
+    @staticmethod
+    def get_shardCond(symbolVar: str, cfg: Dict, shard: List = None) -> str:
+        """
+        分片模式下的where条件(以","开头, 拼接在日期条件之后), 只保留hashBucket(symbol)属于该分片的标的
+        symbolVar: 生成语句中保存标的列名的变量名称; 没有标的列的表不做分片
+        """
+        if not shard or cfg["symbolCol"] == "NA":
+            return ""
+        shardId, nShard = shard
+        return f", hashBucket(_${symbolVar}, {nShard})=={shardId}"
+
     def last_add(self, symbolCol:str, dateCol:str, nDays: int = 1, marketType: str = None):
         """
         追加数据 SQL 生成
@@ -683,15 +1195,46 @@ class FactorCalculator:
         undef(`last_pt); // 释放内存
         """
 
-    def update_data(self):
+    def update_data(self, writeStartDict: Dict = None, factor_list: List = None):
         """
         最后上传所有所需数据至指定数据库
+        writeStartDict: {因子名: 已存储的最新日期}, 给定时只上传该日期之后的数据(增量模式)
+        factor_list: 只上传factor_need中属于factor_list的因子(并发模式下每个dataPath组只上传自己的因子)
         """
-        day_factor_need= [i for i in self.factor_day_list if i in self.factor_need]
-        min_factor_need= [i for i in self.factor_min_list if i in self.factor_need]
+        factor_need = self.factor_need if factor_list is None else [i for i in factor_list if i in self.factor_need]
+        self.stageGroup = "" if factor_list is None else self.stageGroup
+        # 写后即存模式下已提交后台写入的因子只需等待写入完成
+        write_need = [i for i in factor_need if i in self.writeList]
+        factor_need = [i for i in factor_need if i not in write_need]
+        self.writeList = [i for i in self.writeList if i not in write_need]
+        day_factor_need= [i for i in self.factor_day_list if i in factor_need]
+        min_factor_need= [i for i in self.factor_min_list if i in factor_need]
+        if writeStartDict:
+            writeStart_cmd = f"dict({list(writeStartDict.keys())}, [{','.join(writeStartDict.values())}])"
+        else:
+            writeStart_cmd = "dict(STRING, DATE)"
+        # InsertData返回写入速度(行/秒), 记录进阶段统计
+        dayInsert_cmd = self.stage_cmd("insert", None, f"""
+                insertRate = InsertDayFactor({self.dataObj},{self.writeBatchMB});""", self.dataObj, nameVar="factor", rateVar="insertRate")
+        minInsert_cmd = self.stage_cmd("insert", None, f"""
+                insertRate = InsertMinFactor({self.dataObj},{self.writeBatchMB});""", self.dataObj, nameVar="factor", rateVar="insertRate")
+        wait_cmd = ""
+        if write_need:
+            stats_cmd = ""
+            if self.telemetry:  # 后台写入的耗时取自任务状态
+                stats_cmd = f"""
+                jobStatus = getJobStatus(writeJobs[i]);
+                {self.statsTB}.tableInsert("{self.stageGroup}", "insert", writeFactors[i], nanotimestamp(jobStatus.startTime[0]), nanotimestamp(jobStatus.endTime[0]),
+                                           0, 0, 0, string(writeJobs[i]), insertRate);"""
+            wait_cmd = f"""
+            for (i in 0:size(writeJobs)){{
+                insertRate = getJobReturn(writeJobs[i], true);  // 等待后台写入完成(返回写入速度), 写入失败时抛出异常{stats_cmd}
+            }};
+            """
         return f"""            
             day_factor_need = {day_factor_need};  // 所有需要添加至日频因子数据库的因子列表
             min_factor_need = {min_factor_need};  // 所有需要添加至分钟频因子数据库的因子列表
+            writeStartDict = {writeStart_cmd};  // 因子:已存储的最新日期, 只上传该日期之后的数据
             // 先向数据库添加指定分区
             if (size(day_factor_need)>0){{
                 addValuePartitions(database("{self.dayDB}"),day_factor_need,1); // 添加至COMPO分区的第一层
@@ -700,15 +1243,444 @@ class FactorCalculator:
                 addValuePartitions(database("{self.minDB}"),min_factor_need,1); // 添加至COMPO分区的第一层
             }}            
             for (factor in day_factor_need){{
-                print(select * from {self.factorDict}[factor] limit 10)
-                InsertDayFactor({self.factorDict}[factor],1000000); 
+                // 单因子表/因子宽表统一转换为(symbol, TradeDate, factor, value)格式
+                {self.dataObj} = {self.factorDict}[factor];
+                {self.dataObj} = select {self.symbolCol},{self.dateCol},factor as `factor,_$factor as value from {self.dataObj};
+                if (factor in writeStartDict.keys()){{
+                    {self.dataObj} = select * from {self.dataObj} where {self.dateCol} > writeStartDict[factor];
+                }}
+{dayInsert_cmd}
                 print("日频因子"+factor+"Insert完毕");
             }};
             for (factor in min_factor_need){{
-                InsertMinFactor({self.factorDict}[factor],1000000);
+                // 转换为(symbol, TradeDate, TradeTime, factor, value)格式
+                {self.dataObj} = {self.factorDict}[factor];
+                {self.dataObj} = select {self.symbolCol},{self.dateCol},{self.timeCol},factor as `factor,_$factor as value from {self.dataObj};
+                if (factor in writeStartDict.keys()){{
+                    {self.dataObj} = select * from {self.dataObj} where {self.dateCol} > writeStartDict[factor];
+                }}
+{minInsert_cmd}
                 print("分钟频因子"+factor+"Insert完毕");
             }}
+        """ + wait_cmd
+
+    def write_cmd(self, factorName: str) -> str:
+        """写后即存: 将因子转换为(symbol, TradeDate, factor, value)格式(分钟频因子含TradeTime), 提交后台任务写入因子数据库"""
+        if factorName in self.factor_day_list:
+            DBName, insertFunc = self.dayDB, "InsertDayFactor"
+        else:
+            DBName, insertFunc = self.minDB, "InsertMinFactor"
+        whereCond = f" where {self.dateCol} > {self.writeStartDict[factorName]}" if factorName in self.writeStartDict else ""
+        cmd = "" if self.writeList else f"""
+    writeJobs = array(STRING, 0);   // 后台写入任务ID
+    writeFactors = array(STRING, 0);    // 后台写入任务对应的因子
+    """
+        self.writeList.append(factorName)
+        return cmd + f"""
+    addValuePartitions(database("{DBName}"),["{factorName}"],1);
+    {self.dataObj} = select {",".join(self.get_keyCols(factorName))},"{factorName}" as `factor,{factorName} as value from {self.factor_ref(factorName)}{whereCond};
+    writeJobs.append!(submitJob("write_{factorName}", "因子{factorName}写入", {insertFunc}, {self.dataObj}, {self.writeBatchMB}));
+    writeFactors.append!("{factorName}");
+    """
+
+    def get_factorBytes(self, factorName: str, start_date: str, end_date: str) -> int:
+        """
+        预测单个因子变量的内存占用: 行数(交易日数量*标的数量估计, 分钟频再乘barsPerDay) * 列数 * 8字节
+        交易日数量按工作日近似; 因子族的父因子另计其前缀和表(见get_prefixBytes)
+        """
+        rows = self.get_factorRows(factorName, start_date, end_date)
+        if self.is_minFactor(factorName):
+            nBytes = rows * 5 * 8    # symbol, TradeDate, TradeTime, factor, 因子值
+        else:
+            nBytes = rows * 4 * 8    # symbol, TradeDate, factor, 因子值
+        if factorName in self.get_familyDict():
+            nBytes += self.get_prefixBytes(rows)
+        return nBytes
+
+    def get_factorRows(self, factorName: str, start_date: str, end_date: str) -> int:
+        """预测单个因子的行数: 交易日数量(按工作日近似)*标的数量估计, 分钟频再乘barsPerDay"""
+        nDays = max(len(pd.bdate_range(pd.Timestamp(start_date), pd.Timestamp(end_date))), 1)
+        return nDays * self.symbolCount * (self.barsPerDay if self.is_minFactor(factorName) else 1)
+
+    @staticmethod
+    def get_prefixBytes(rows: int) -> int:
+        """因子族前缀和表{父因子}_prefix的内存占用: 行数与父因子相同, 10列(symbol, TradeDate, x, c, preX, preX2, preN, sumX, sumX2, countX)"""
+        return rows * 10 * 8
+
+    def schedule_factors(self, ownList: List, factorList: List, start_date: str, end_date: str) -> List:
+        """
+        内存编排: 在所有合法的拓扑序中贪心选择预测内存峰值较低的计算顺序
+        每一步在依赖已满足的因子中选择(新增因子内存 - 因此可释放的依赖因子内存)最小者, 相同时保持原拓扑序
+        factor_need中的因子在写入前不可释放(写后即存时视为计算后即可释放)
+        """
+        sizeDict = {factor: self.get_factorBytes(factor, start_date, end_date) for factor in factorList}
+        depsDict, usersDict = {}, {factor: [] for factor in factorList}
+        for factor in factorList:
+            depsDict[factor] = [dep for dep in self.get_deps(factor) if dep in sizeDict]
+            for dep in depsDict[factor]:
+                usersDict[dep].append(factor)
+        releasable = lambda factor: factor not in self.factor_need or (self.writeBehind and factor in ownList)
+        order, liveDict, peak = [], {}, 0
+        while len(order) < len(factorList):
+            readyList = [factor for factor in factorList if factor not in order and all(dep in order for dep in depsDict[factor])]
+            def delta(factor):
+                freed = sum(liveDict[dep] for dep in depsDict[factor] if dep in liveDict and releasable(dep)
+                            and all(user in order or user == factor for user in usersDict[dep]))
+                return sizeDict[factor] - freed
+            factor = min(readyList, key=lambda i: (delta(i), factorList.index(i)))
+            order.append(factor)
+            liveDict[factor] = sizeDict[factor]
+            peak = max(peak, sum(liveDict.values()))
+            for dep in list(liveDict.keys()):
+                if releasable(dep) and usersDict[dep] and all(user in order for user in usersDict[dep]):
+                    liveDict.pop(dep)
+        self.predictedPeak = max(self.predictedPeak, self.retainedBytes + peak)
+        self.retainedBytes += sum([size for factor, size in liveDict.items() if factor in self.factor_need and not releasable(factor)])
+        return order
+
+    def report_peak(self):
+        """输出预测的factorDict内存峰值与观测的内存峰值(含原始数据), 用于估计服务器内存"""
+        if not self.memSchedule:
+            return
+        observed = self.session.run("peakMem")
+        observed = 0 if observed is None else observed
+        print(f"内存编排: 因子变量预测峰值{self.predictedPeak/1024**3:.2f}GB, 观测内存峰值{observed/1024**3:.2f}GB(含原始数据)")
+        self.predictedPeak, self.retainedBytes = 0, 0
+        self.session.run("peakMem=0;")
+
+    def persist_cmd(self, ownList: List, factorList: List, doneList: List) -> str:
+        """
+        写后即存/内存编排: doneList中已无待执行工作(待合并select/待截面填充)的因子
+        1. 写后即存时, 属于本组(ownList)且在factor_need中的因子立即提交后台写入
+        2. 组内下游因子均已计算完毕, 且不在factor_need中或已提交写入的因子从factorDict中释放
+        """
+        pendingList = self.fillList + [fuseFactor for selectList in self.fuseDict.values() for fuseFactor, _ in selectList]
+        cmd = ""
+        for factorName in doneList:
+            if factorName in pendingList or factorName in self.releaseList:
+                continue
+            if self.writeMode and factorName in ownList and factorName in self.factor_need and factorName not in self.writeList:
+                cmd += self.write_cmd(factorName)
+            if factorName in self.factor_need and factorName not in self.writeList:  # 等待写入, 不能释放
+                continue
+            dependList = []
+            for factor in factorList:
+                if factorName in self.get_deps(factor):
+                    dependList.append(factor)
+            if all(factor in doneList and factor not in pendingList for factor in dependList):
+                cmd += self.release_cmd(factorName)
+        return cmd
+
+    def release_cmd(self, factorName: str) -> str:
+        """从factorDict(以及因子宽表)中释放因子"""
+        self.releaseList.append(factorName)
+        cmd = f"""{self.factorDict}.erase!("{factorName}");   // 释放已无下游依赖的因子
+    """
+        if factorName in self.panelList:
+            self.panelList.remove(factorName)
+            cmd += f"""{self.panelObj}.dropColumns!(`{factorName});
+    """
+        return cmd
+
+    @staticmethod
+    def get_funcSource(func) -> str:
+        """
+        函数源码, 无法获取源码时(如内置函数)使用函数名称
+        递归包含函数中引用的本仓库模块级函数(如get_family->family, get_vaR240_m120->vaR),
+        修改实际的计算函数时, 调用它的calFunc/classFunc的指纹随之变化
+        """
+        repoDir = os.path.dirname(os.path.abspath(__file__))
+        sourceList, visitList, stack = [], [], [func]
+        while stack:
+            func = stack.pop(0)
+            if func in visitList:
+                continue
+            visitList.append(func)
+            try:
+                sourceList.append(inspect.getsource(func))
+            except (OSError, TypeError):
+                sourceList.append(getattr(func, "__qualname__", repr(func)))
+                continue
+            codeList, names = [getattr(func, "__code__", None)], []
+            while codeList:  # 包含嵌套函数/推导式中引用的名称
+                code = codeList.pop(0)
+                if code is None:
+                    continue
+                names += [name for name in code.co_names if name not in names]
+                codeList += [const for const in code.co_consts if inspect.iscode(const)]
+            for name in names:
+                helper = getattr(func, "__globals__", {}).get(name)
+                if inspect.isfunction(helper) and os.path.abspath(inspect.getfile(helper)).startswith(repoDir):
+                    stack.append(helper)
+        return "\n".join(sourceList)
+
+    def get_fingerprint(self, factorName: str, fingerprintDict: Dict = None) -> str:
+        """
+        因子指纹: factor_cfg中的配置 + calFunc/midFunc/classFunc源码(含其调用的辅助函数) + 原始数据表配置 + 依赖因子的指纹
+        任一依赖因子发生变化时, 下游因子的指纹随之变化
+        注: 需在init_check补全配置之后调用, 否则同一因子补全前后的指纹不同
+        fingerprintDict: 已计算的指纹缓存{因子名: 指纹}
+        """
+        fingerprintDict = {} if fingerprintDict is None else fingerprintDict
+        if factorName in fingerprintDict:
+            return fingerprintDict[factorName]
+        cfg = self.factor_cfg[factorName]
+        deps = self.get_deps(factorName)
+        funcList = [cfg["calFunc"]] + (cfg["dependency"]["midFunc"] or []) + (self.class_cfg.get(cfg["class"]) or [])
+        content = [json.dumps(cfg, sort_keys=True, default=str)]
+        content += [self.get_funcSource(self.func_map[funcName]) for funcName in funcList if funcName in self.func_map]
+        content += [json.dumps(self.indicator_cfg.get(dataPath), sort_keys=True, default=str) for dataPath in cfg["dataPath"] or []]
+        content += [self.get_fingerprint(dep, fingerprintDict) for dep in deps]
+        fingerprintDict[factorName] = hashlib.sha1("\n".join(content).encode("utf-8")).hexdigest()
+        return fingerprintDict[factorName]
+
+    def init_cache(self):
+        """在日频/分钟频因子数据库中创建因子指纹表(维度表, 每个因子只保留最新一条)"""
+        for DBName in [self.dayDB, self.minDB]:
+            if self.session.existsTable(dbUrl=DBName, tableName=self.cacheTB):
+                continue
+            self.session.run(f"""
+            schemaTb = table(1:0, ["factor","fingerprint","startDate","endDate","updateTime"], [SYMBOL,STRING,DATE,DATE,TIMESTAMP])
+            createDimensionTable(database("{DBName}"), schemaTb, "{self.cacheTB}", sortColumns=`factor, keepDuplicates=LAST)
+            """)
+
+    def get_cache(self, factor_list: List) -> Dict:
+        """
+        查询因子指纹表
+        return: {因子名: (指纹, 已存储起始日期"%Y.%m.%d", 已存储结束日期"%Y.%m.%d")}
+        """
+        resDict = {}
+        for DBName, factorList in [(self.dayDB, [i for i in factor_list if not self.is_minFactor(i)]),
+                                   (self.minDB, [i for i in factor_list if self.is_minFactor(i)])]:
+            if not factorList:
+                continue
+            df = self.session.run(f"""
+            select factor, fingerprint, startDate, endDate from loadTable("{DBName}", "{self.cacheTB}") where factor in {factorList}
+            """)
+            for factor, fingerprint, startDate, endDate in zip(df["factor"], df["fingerprint"], df["startDate"], df["endDate"]):
+                resDict[factor] = (fingerprint, pd.Timestamp(startDate).strftime("%Y.%m.%d"), pd.Timestamp(endDate).strftime("%Y.%m.%d"))
+        return resDict
+
+    def update_cache(self, fingerprintDict: Dict, cacheDict: Dict, start_date: str, end_date: str):
+        """
+        写入本次计算的因子指纹与已存储区间
+        指纹未变且与已存储区间相交时合并区间, 否则以本次计算区间为准
+        """
+        resList = []
+        for factor in self.factor_need:
+            startDate, endDate = start_date, end_date
+            if factor in cacheDict and cacheDict[factor][0] == fingerprintDict[factor] \
+                    and cacheDict[factor][1] <= end_date and cacheDict[factor][2] >= start_date:
+                startDate, endDate = min(startDate, cacheDict[factor][1]), max(endDate, cacheDict[factor][2])
+            resList.append((factor, fingerprintDict[factor], startDate, endDate))
+        for DBName, factorList in [(self.dayDB, [i for i in resList if not self.is_minFactor(i[0])]),
+                                   (self.minDB, [i for i in resList if self.is_minFactor(i[0])])]:
+            if not factorList:
+                continue
+            self.session.run(f"""
+            cacheTb = table({[i[0] for i in factorList]} as factor, {[i[1] for i in factorList]} as fingerprint,
+                            [{",".join([i[2] for i in factorList])}] as startDate, [{",".join([i[3] for i in factorList])}] as endDate,
+                            take(now(), {len(factorList)}) as updateTime)
+            loadTable("{DBName}", "{self.cacheTB}").append!(cacheTb)
+            """)
+
+    def get_coverage(self, factor_list: List) -> Dict:
+        """
+        查询日频因子数据库中每个因子已存储的日期区间(分钟频因子数据库不参与依赖因子读取, 见plan_hydrate)
+        return: {因子名: ("%Y.%m.%d", "%Y.%m.%d")}, 数据库中不存在的因子不会出现在返回结果中
+        """
+        resDict = {}
+        if not factor_list or not self.session.existsTable(dbUrl=self.dayDB, tableName=self.dayTB):
+            return resDict
+        df = self.session.run(f"""
+        select min(date) as startDate, max(date) as lastDate from loadTable("{self.dayDB}", "{self.dayTB}") where factor in {factor_list} group by factor
+        """)
+        for factor, startDate, lastDate in zip(df["factor"], df["startDate"], df["lastDate"]):
+            if not pd.isnull(startDate) and not pd.isnull(lastDate):
+                resDict[factor] = (pd.Timestamp(startDate).strftime("%Y.%m.%d"), pd.Timestamp(lastDate).strftime("%Y.%m.%d"))
+        return resDict
+
+    def plan_hydrate(self, start_date: str, end_date: str) -> List:
+        """
+        依赖因子读取规划: factor_need之外的日频依赖因子已存储于因子数据库且覆盖[start_date-回看期, end_date]时,
+        直接从因子数据库读取(区间向前延伸回看期), 不再从原始数据重新计算, 其上游因子若无其他用途则不再计算
+        启用结果缓存时还要求该因子的指纹与已存储的指纹一致
+        注: 只读取日频因子数据库, 分钟频依赖因子总是从原始数据重新计算, 并输出提示
+        return: 从因子数据库读取的因子列表
         """
+        depList = [factor for factor in self.factor_list if factor not in self.factor_need and not self.is_minFactor(factor)]
+        coverageDict = self.get_coverage(depList)
+        # 读取区间向前延伸回看期, 已存储区间需覆盖回看期的起点, 否则下游窗口在起始段使用的历史不完整
+        callBackPeriod = max([self.get_callBackPeriod(factor) for factor in self.factor_need], default=0)
+        callBackDate = self.get_callBackDate(start_date, callBackPeriod) if depList else start_date
+        persistList = [factor for factor in depList if factor in coverageDict
+                       and coverageDict[factor][0] <= callBackDate and coverageDict[factor][1] >= end_date]
+        if self.resultCache and persistList:
+            fingerprintDict, cacheDict = {}, self.get_cache(persistList)
+            persistList = [factor for factor in persistList
+                           if factor in cacheDict and cacheDict[factor][0] == self.get_fingerprint(factor, fingerprintDict)]
+        # 从factor_need出发沿依赖链遍历, 遇到可读取的因子不再向上展开
+        hydrateList, visitList, stack = [], [], list(self.factor_need)
+        while stack:
+            factor = stack.pop()
+            if factor in visitList:
+                continue
+            visitList.append(factor)
+            if factor in persistList:
+                hydrateList.append(factor)
+                continue
+            stack.extend(self.get_deps(factor))
+        minList = [factor for factor in visitList if factor not in self.factor_need and self.is_minFactor(factor)]
+        if minList:
+            print(f"依赖因子读取: 分钟频依赖因子{minList}不从因子数据库读取, 从原始数据重新计算")
+        if not hydrateList:
+            return hydrateList
+        self.hydrateRange = (callBackDate, end_date)
+        self.factor_list = [factor for factor in self.factor_list if factor in visitList]
+        self.factor_cfg = {factor: self.factor_cfg[factor] for factor in self.factor_list}
+        for factor in hydrateList:  # 替换为从因子数据库读取, 不依赖任何原始数据与因子
+            self.factor_cfg[factor] = {"class": "hydrate", "calFunc": "hydrate_factor",
+                                       "dependency": {"factor": None, "midFunc": None},
+                                       "dataPath": [], "indicator": [],
+                                       "params": self.factor_cfg[factor]["params"]}
+        self.func_map = {**self.func_map, "hydrate_factor": FactorCalculator.hydrate_factor}
+        print(f"依赖因子读取: {hydrateList}从因子数据库读取, 读取区间{self.hydrateRange[0]}~{self.hydrateRange[1]}")
+        return hydrateList
+
+    def hydrate_factor(self, factorName: str, feature: Dict):
+        """calFunc: 从日频因子数据库读取已存储的因子"""
+        return {"cmd": f"""
+    {self.dataObj} = select symbol as {self.symbolCol}, date as {self.dateCol}, factor, value as {factorName}
+                    from loadTable("{self.dayDB}", "{self.dayTB}")
+                    where factor == "{factorName}", date between {self.hydrateRange[0]} and {self.hydrateRange[1]}
+                    order by symbol, date;
+    {self.factorDict}["{factorName}"] = {self.dataObj};
+    print("因子{factorName}读取完毕");
+    """, "reads": []}
+
+    def get_lastDate(self, factor_list: List) -> Dict:
+        """
+        查询因子数据库中每个因子已存储的最新日期
+        return: {因子名: "%Y.%m.%d"}, 数据库中不存在的因子不会出现在返回结果中
+        """
+        resDict = {}
+        for DBName, TBName, factorList in [(self.dayDB, self.dayTB, [i for i in factor_list if i in self.factor_day_list]),
+                                           (self.minDB, self.minTB, [i for i in factor_list if i in self.factor_min_list])]:
+            if not factorList:
+                continue
+            if not self.session.existsTable(dbUrl=DBName, tableName=TBName):
+                continue
+            df = self.session.run(f"""
+            select max(date) as lastDate from loadTable("{DBName}", "{TBName}") where factor in {factorList} group by factor
+            """)
+            for factor, lastDate in zip(df["factor"], df["lastDate"]):
+                if not pd.isnull(lastDate):
+                    resDict[factor] = pd.Timestamp(lastDate).strftime("%Y.%m.%d")
+        return resDict
+
+    def get_callBackPeriod(self, factorName: str) -> int:
+        """
+        沿依赖链累加callBackPeriod, 返回计算该因子需要向前回看的交易日数量
+        注: 分钟频因子的callBackPeriod单位为K线数量, 按barsPerDay换算为交易日;
+            读取原始数据的因子还需加上所属class的classFunc声明的回看期(K线数量, 如ret240需要前240根K线)
+        """
+        cfg = self.factor_cfg[factorName]
+        period = self.get_periodDays(factorName)
+        if cfg["dataPath"]:
+            period += max([-(-int(self.backend.get_classInfo(self, funcName).get("callBackPeriod") or 0) // self.barsPerDay)
+                           for funcName in self.class_cfg.get(cfg["class"]) or []], default=0)
+        deps = self.get_deps(factorName)
+        if cfg["calFunc"] == "get_family" and deps[0] in self.stateDict:  # 窗口已保存于滚动状态表, 只需父因子的新日期
+            period = 0
+        return period + max([self.get_callBackPeriod(dep) for dep in deps if dep in self.factor_cfg], default=0)
+
+    def get_callBackDate(self, date: str, nDays: int) -> str:
+        """给定日期向前回看nDays个交易日"""
+        date = pd.Timestamp(date).strftime("%Y.%m.%d")
+        if nDays <= 0:
+            return date
+        return self.backend.get_callBackDate(self, date, nDays)
+
+    def get_familyDict(self) -> Dict:
+        """factor_list中的因子族: {父因子: [因子族成员]}"""
+        familyDict = {}
+        for factor in self.factor_list:
+            cfg = self.factor_cfg[factor]
+            if cfg["calFunc"] == "get_family":
+                familyDict.setdefault(self.get_deps(factor)[0], []).append(factor)
+        return familyDict
+
+    def get_stateLength(self, memberList: List) -> int:
+        """
+        滚动状态需保存的行数: 最大窗口 + 下游因子沿依赖链对因子族成员的最大回看期
+        (状态表尾部较早的行窗口不完整, 只有最近的行可被下游因子回看)
+        """
+        def downstream(factorName: str) -> int:
+            periodList = []
+            for factor in self.factor_list:
+                if factorName in self.get_deps(factor):
+                    periodList.append(self.get_periodDays(factor) + downstream(factor))
+            return max(periodList, default=0)
+        return max([int(self.factor_cfg[member]["params"]["window"]) + downstream(member) for member in memberList], default=0)
+
+    def get_stateFingerprint(self, base: str, memberList: List) -> str:
+        """滚动状态指纹: 父因子指纹 + 保存行数, 任一变化时状态失效"""
+        return hashlib.sha1(f"{self.get_fingerprint(base)}#{self.get_stateLength(memberList)}".encode("utf-8")).hexdigest()
+
+    def get_state(self, lastDateDict: Dict) -> Dict:
+        """
+        查询滚动状态表
+        lastDateDict: {因子名: 已存储的最新日期}, 见get_lastDate
+        return: {父因子: 已存储的最新日期"%Y.%m.%d"}, 只包含指纹与当前配置一致,
+                且所有因子族成员(及factor_need中的下游因子)均已存储至该日期的父因子;
+                新增或落后于状态的成员需要从头计算, 不能只计算状态之后的日期
+        """
+        familyDict = self.get_familyDict()
+        if not familyDict:
+            return {}
+        df = self.session.run(f"""
+        select first(fingerprint) as fingerprint, max({self.dateCol}) as stateDate from loadTable("{self.featureDB}", "{self.stateTB}")
+        where factor in {list(familyDict.keys())} group by factor
+        """)
+        stateDict = {}
+        if df is not None:
+            for base, fingerprint, stateDate in zip(df["factor"], df["fingerprint"], df["stateDate"]):
+                if fingerprint != self.get_stateFingerprint(base, familyDict[base]) or pd.isnull(stateDate):
+                    continue
+                stateDate = pd.Timestamp(stateDate).strftime("%Y.%m.%d")
+                checkList = familyDict[base] + [factor for factor in self.get_downstream(familyDict[base]) if factor in self.factor_need]
+                if all(lastDateDict.get(factor, "") >= stateDate for factor in checkList):
+                    stateDict[base] = stateDate
+        return stateDict
+
+    def get_downstream(self, factorList: List) -> List:
+        """factor_list中沿依赖链依赖factorList的所有下游因子"""
+        downList, stack = [], list(factorList)
+        while stack:
+            factorName = stack.pop()
+            for factor in self.factor_list:
+                if factorName in self.get_deps(factor) and factor not in downList:
+                    downList.append(factor)
+                    stack.append(factor)
+        return downList
+
+    def state_cmd(self) -> str:
+        """
+        写入因子族父因子的滚动状态: 每个标的前缀和表(见utilFunc.family)的最近若干行, 替换该父因子之前的状态
+        注: 下次增量运行只读取x并重新计算前缀和, preX/preX2/preN(相对于本次中心化的值)保留供查看
+        """
+        cmd = ""
+        for base, memberList in self.get_familyDict().items():
+            cmd += f"""
+    // 写入{base}的滚动状态
+    stateTb = select "{base}" as factor, "{self.get_stateFingerprint(base, memberList)}" as fingerprint, {self.symbolCol}, {self.dateCol}, x, preX, preX2, preN
+              from {base}_prefix context by {self.symbolCol} csort {self.dateCol} limit -{self.get_stateLength(memberList)};
+    delete from loadTable("{self.featureDB}", "{self.stateTB}") where factor="{base}";
+    loadTable("{self.featureDB}", "{self.stateTB}").append!(stateTb);
+    undef("{base}_prefix");
+    """
+        self.prepDict = {}
+        return cmd
 
     def get_featuresGivenFactor(self, factor_list: List) -> Dict:
         """
@@ -744,87 +1716,790 @@ class FactorCalculator:
                                       factor_list=factor_list)
 
     def processing(self, start_date: str, end_date: str, dataPathDict: Dict):
-        start_date, end_date = trans_time(start_date, end_date)
         for dataPath, factorList in dataPathDict.items():  # 遍历所有MD类型的数据库以及对应的因子List
-            # 准备这个dataPath下需要哪些特征 -> dict(dbName, feature_dict)
-            dataPath = dataPath.split("$")
-            featureDict = self.get_featuresGivenFactor(factorList)
-            # 获取这个dataPath下有那些class的因子
-            classList = list(set([self.factor_cfg[factor]["class"] for factor in factorList]))
+            self.dolphindb_cmd += self.processing_group(start_date, end_date, dataPath, factorList)
 
-            # 先添加left join数据 -> 对于该数据库对+对应的因子列表，初始化sourceObj
-            if len(dataPath) == 1:  # 说明不需要执行semi-leftJoin
-                self.dolphindb_cmd += self.no_leftJoin(dataPath=dataPath[0],
-                                                       indicator_dict=featureDict[dataPath[0]],
-                                                       start_date=start_date,
-                                                       end_date=end_date)
-            elif len(dataPath) >= 2:  # 说明需要执行semi-leftJoin
-                self.dolphindb_cmd += self.first_leftJoin(lpath=dataPath[0], rpath=dataPath[1],
-                                                          lindicator_dict=featureDict[dataPath[0]],
-                                                          rindicator_dict=featureDict[dataPath[1]],
-                                                          start_date=start_date,
-                                                          end_date=end_date)
-                if len(dataPath) >= 3:  # 说明从左到右依次执行多次semi-leftJoin
-                    for i in range(2, len(dataPath)):
-                        self.dolphindb_cmd += self.after_leftJoin(rpath=dataPath[i],
-                                                                  rindicator_dict=featureDict[dataPath[i]],
-                                                                  start_date=start_date,
-                                                                  end_date=end_date)
-            # 将factorList按照依赖关系进行排序, 这里会把一个class内部的因子排在一起, dependency正确排序
+    def processing_group(self, start_date: str, end_date: str, dataPath: str, factorList: List, expand: bool = True) -> str:
+        """
+        生成单个dataPath组的DolphinDB命令: 加载数据+left join -> classFunc -> midFunc+calFunc
+        expand: 是否在组内重新计算依赖链上的所有因子; False时只计算factorList中的因子, 依赖因子需已存在于factorDict中
+        """
+        cmd = ""
+        ownList = factorList
+        # 获取这个dataPath下有那些class的因子
+        classList = list(set([self.factor_cfg[factor]["class"] for factor in factorList]))
+        # 将factorList按照依赖关系进行排序, 这里会把一个class内部的因子排在一起, dependency正确排序
+        if expand:
             factorList = self.sort_factorsGivenDependency(factorList)
+            if self.memSchedule:  # 按预测内存峰值重新编排拓扑序
+                factorList = self.schedule_factors(ownList, factorList, start_date, end_date)
+        else:
+            factorList = [factor for factor in self.sort_factorsGivenDependency(factorList) if factor in factorList]
+        # 因子宽表模式: 组内因子重新计算完整依赖链且均为日频时, 同组因子作为同一张宽表的列
+        self.panelMode = self.factorPanel and expand and all(factor in self.factor_day_list for factor in factorList)
+        self.panelList = []
+        # 写后即存: 每个因子计算完毕后, 提交写入已完成的因子并释放已无下游依赖的因子
+        self.writeMode = self.writeBehind and expand
+        self.releaseMode = self.memSchedule and expand
+        self.releaseList = []
+        # 特征库: classFunc生成的中间列已覆盖加载区间时直接读取, 否则计算后写入
+        self.featureMode = self.featureStore and expand and isinstance(self.backend, DolphinDBBackend)
+        self.loadRange = trans_time(start_date, end_date)
+        self.stageGroup = dataPath
+        # 组内命令按片段生成, 每个片段记录其读取的sourceObj列: [(命令, 读取列列表)]
+        segmentList = []
+        self.readList, self.classCols, self.midList = [], [], []
+        # 先批量执行classFunc(没有原始数据的组不需要执行)
+        if dataPath:
+            cmd += self.class_cmd(factorList, classList)
+        segmentList.append((cmd, self.readList))
+        # 再分别执行因子计算函数factorFunc
+        for i, factorName in enumerate(factorList):
+            self.readList = []
+            cmd = self.factor_cmd(factorName)
+            if self.writeMode or self.releaseMode:
+                cmd += self.persist_cmd(ownList, factorList, factorList[:i+1])
+            if self.releaseMode:
+                cmd += f"""peakMem = max(peakMem, mem()["allocatedBytes"] - mem()["freeBytes"]);
+    """
+            segmentList.append((cmd, self.readList))
+        self.readList = []
+        cmd = self.flush_fill()
+        if self.writeMode or self.releaseMode:
+            cmd += self.persist_cmd(ownList, factorList, factorList)
+        cmd += self.panelDict_cmd()
+        segmentList.append((cmd, self.readList))
+        self.panelMode, self.writeMode, self.releaseMode, self.featureMode = False, False, False, False
+        self.midList = None
+        # 组内命令生成后再确定加载方式: 分钟频+日频组只有在组内命令引用日频字段时才将日频字段展开至分钟行
+        cmd = self.load_cmd(start_date, end_date, dataPath, ownList, cache=expand, body="".join([seg for seg, _ in segmentList]))
+        if self.columnLiveness and expand and dataPath:
+            segmentList = self.liveness_cmd(segmentList)
+        return cmd + "".join([seg for seg, _ in segmentList])
+
+    def liveness_cmd(self, segmentList: List) -> List:
+        """
+        列的活跃性分析: sourceObj中的指标列与classFunc写入的列在最后一次被读取的片段之后删除(从未被读取的列在classFunc之后删除)
+        组内任一classFunc/calFunc未声明读取列时无法确定活跃性, 不删除任何列
+        segmentList: [(命令, 读取列列表)], 第一个片段为classFunc
+        """
+        if any(reads is None for _, readList in segmentList for reads in readList):
+            return segmentList
+        lastDict = {col: 0 for col in self.sourceCols + self.classCols}
+        for i, (_, readList) in enumerate(segmentList):
+            for col in [col for reads in readList for col in reads]:
+                if col in lastDict:
+                    lastDict[col] = i
+        res = []
+        for i, (seg, readList) in enumerate(segmentList):
+            dropList = [col for col, last in lastDict.items() if last == i]
+            if dropList and i < len(segmentList) - 1:  # 组结束时sourceObj整体被替换, 无需删除
+                seg += f"""
+    {self.sourceObj}.dropColumns!({dropList});  // 最后一次使用, 释放
+    """
+            res.append((seg, readList))
+        return res
 
-            # 先批量执行classFunc
-            for factorName in factorList:
-                # 获取这个因子的class, 判断有没有设置对应的classFunc
-                class_ = self.factor_cfg[factorName]["class"]
-                if class_ not in classList:  # 被执行/判断过了
-                    continue
-                classList.remove(class_)  # 进入执行/判断分支
-                if class_ not in self.class_cfg.keys():
-                    continue
-                funcList = self.class_cfg[class_]
-                if funcList in [None, []]:
-                    continue
-                # 说明是有效的classFunc
-                for funcName in funcList:
-                    res = self.func_map[funcName](self)
-                    if isinstance(res, dict):
-                        self.dolphindb_cmd += res["cmd"]
-                    else:
-                        self.dolphindb_cmd += res
+    def load_cmd(self, start_date: str, end_date: str, dataPath: str, factorList: List, shard: List = None, cache: bool = False,
+                 body: str = None) -> str:
+        """
+        生成加载数据+left join的DolphinDB命令 -> 对于该数据库对+对应的因子列表，初始化sourceObj
+        shard: [分片编号, 分片数量], 给定时只加载hashBucket(symbol)属于该分片的标的
+        cache: 是否使用加载规划, 组内数据表出现在加载规划中时从sourceDict中的共用数据表构建sourceObj
+        body: 组内classFunc+calFunc命令, 用于判断分钟频+日频组是否需要将日频字段展开至分钟行
+        """
+        start_date, end_date = trans_time(start_date, end_date)
+        cmd = ""
+        if not dataPath:  # 依赖因子均从因子数据库读取, 不需要原始数据
+            return cmd
+        # 准备这个dataPath下需要哪些特征 -> dict(dbName, feature_dict)
+        dataPath = dataPath.split("$")
+        featureDict = self.get_featuresGivenFactor(factorList)
+        self.sourceCols = [col for path in dataPath for col in featureDict[path].keys()]
+        if cache and not shard and any(path in self.loadCountDict for path in dataPath):
+            broadcast = body is None or self.need_broadcast(dataPath, featureDict, body)
+            dayLoad = broadcast or re.search(rf"\b{self.daySourceObj}\b", body) is not None
+            return self.cache_cmd(start_date, end_date, dataPath, featureDict, broadcast=broadcast, dayLoad=dayLoad)
+        if len(dataPath) == 1:  # 说明不需要执行semi-leftJoin
+            cmd += self.stage_cmd("load", dataPath[0], self.no_leftJoin(dataPath=dataPath[0],
+                                                                        indicator_dict=featureDict[dataPath[0]],
+                                                                        start_date=start_date,
+                                                                        end_date=end_date,
+                                                                        shard=shard), self.sourceObj)
+        elif len(dataPath) >= 2:  # 说明需要执行semi-leftJoin
+            cmd += self.stage_cmd("join", f"{dataPath[0]}${dataPath[1]}", self.first_leftJoin(lpath=dataPath[0], rpath=dataPath[1],
+                                                                                              lindicator_dict=featureDict[dataPath[0]],
+                                                                                              rindicator_dict=featureDict[dataPath[1]],
+                                                                                              start_date=start_date,
+                                                                                              end_date=end_date,
+                                                                                              shard=shard), self.sourceObj)
+            if len(dataPath) >= 3:  # 说明从左到右依次执行多次semi-leftJoin
+                for i in range(2, len(dataPath)):
+                    cmd += self.stage_cmd("join", dataPath[i], self.after_leftJoin(rpath=dataPath[i],
+                                                                                   rindicator_dict=featureDict[dataPath[i]],
+                                                                                   start_date=start_date,
+                                                                                   end_date=end_date,
+                                                                                   shard=shard), self.sourceObj)
+        return cmd
+
+    def plan_load(self):
+        """
+        加载规划: 统计所有dataPath组使用的数据表, 被多个组使用的数据表只加载一次(特征取所有组的并集)存入sourceDict,
+        各组的sourceObj从sourceDict中的数据表select/lsj得到; 与共用数据表位于同一组的其他数据表同样经由sourceDict加载
+        分钟频+日频组同样经由sourceDict加载, 以便日频数据表按日频粒度单独保存(见cache_cmd)
+        """
+        countDict, featureUnionDict = {}, {}
+        groupList = [item for dataPathDict in [self.dataPath_MD_dict, self.dataPath_MM_dict, self.dataPath_DD_dict]
+                     for item in dataPathDict.items()]
+        for dataPath, factorList in groupList:
+            if not dataPath:
+                continue
+            featureDict = self.get_featuresGivenFactor(factorList)
+            for path in dataPath.split("$"):
+                countDict[path] = countDict.get(path, 0) + 1
+                featureUnionDict.setdefault(path, {}).update(featureDict.get(path, {}))
+        self.loadCountDict, self.loadFeatureDict, self.loadedDict = {}, {}, {}
+        for dataPath, factorList in groupList:
+            pathList = dataPath.split("$") if dataPath else []
+            if any(countDict[path] >= 2 for path in pathList) or self.is_splitPath(pathList):
+                for path in pathList:
+                    self.loadCountDict[path] = self.loadCountDict.get(path, 0) + 1
+                    self.loadFeatureDict[path] = featureUnionDict[path]
+        sharedList = [path for path, count in countDict.items() if count >= 2]
+        if sharedList:
+            print(f"加载规划: {sharedList}被多个dataPath组共用, 每个数据表只加载一次(原{sum(countDict.values())}次, 现{len(countDict)}次)")
+
+    def get_idxCols(self, dataPath: str) -> List:
+        """数据表加载后的标准索引列名称"""
+        cfg = self.indicator_cfg[dataPath]
+        return [stdName for colName, stdName in [("dateCol", self.dateCol), ("timeCol", self.timeCol), ("symbolCol", self.symbolCol)]
+                if cfg[colName] not in ["", None, "NA"]]
+
+    def is_splitPath(self, dataPath: List) -> bool:
+        """是否为分钟频+日频组: 第一个数据表为分钟频(indicator_cfg中的dataFreq), 其余数据表均为日频"""
+        return (len(dataPath) >= 2 and dataPath[0] in self.dataPath_M_list
+                and all(path in self.dataPath_D_list for path in dataPath[1:]))
+
+    def need_broadcast(self, dataPath: List, featureDict: Dict, body: str) -> bool:
+        """分钟频+日频组的classFunc/calFunc命令中是否引用了日频字段, 引用时需将日频字段展开至分钟行"""
+        if not self.is_splitPath(dataPath):
+            return True
+        dayCols = [col for path in dataPath[1:] for col in featureDict[path].keys()]
+        return any(re.search(rf"\b{col}\b", body) for col in dayCols)
+
+    def cache_cmd(self, start_date: str, end_date: str, dataPath: List, featureDict: Dict, broadcast: bool = True,
+                  dayLoad: bool = True) -> str:
+        """
+        从sourceDict中的共用数据表构建sourceObj: 第一个数据表select出本组所需的列, 其余数据表依次lsj
+        (与first_leftJoin/after_leftJoin一致, matchingCols为与第一个数据表共有的索引列), 数据表的最后一次使用后从sourceDict中释放
+        分钟频+日频组: 日频数据表先在日频粒度上lsj为daySourceObj(symbol, TradeDate, 日频字段),
+        broadcast=False(组内未引用日频字段)时不再展开至分钟行, sourceObj只包含分钟频字段;
+        dayLoad=False(组内也未读取daySourceObj)时不加载日频数据表, 只扣减其在加载规划中的使用次数
+        """
+        cmd = ""
+        if self.is_splitPath(dataPath) and not dayLoad:
+            for path in dataPath[1:]:
+                if path in self.loadedDict:  # 已由其他组加载
+                    self.loadedDict[path] -= 1
+                    if self.loadedDict[path] == 0:
+                        self.loadedDict.pop(path)
+                        cmd += f"""{self.sourceDict}.erase!("{path}");  // 最后一次使用, 释放
+        """
+                else:
+                    self.loadCountDict[path] -= 1
+                    if self.loadCountDict[path] == 0:
+                        self.loadCountDict.pop(path)
+            dataPath = dataPath[:1]
+            self.sourceCols = list(featureDict[dataPath[0]].keys())
+        for path in dataPath:
+            if path not in self.loadedDict:
+                cmd += self.stage_cmd("load", path, self.no_leftJoin(dataPath=path,
+                                                                     indicator_dict=self.loadFeatureDict[path],
+                                                                     start_date=start_date,
+                                                                     end_date=end_date,
+                                                                     objName=f'{self.sourceDict}["{path}"]'), f'{self.sourceDict}["{path}"]')
+                self.loadedDict[path] = self.loadCountDict[path]
+        lidxCols = self.get_idxCols(dataPath[0])
+        joinCmd = f"""
+        // 从共用数据表构建{"$".join(dataPath)}
+        {self.sourceObj} = select {",".join(lidxCols + list(featureDict[dataPath[0]].keys()))} from {self.sourceDict}["{dataPath[0]}"];
+        """
+        if self.is_splitPath(dataPath):
+            didxCols = self.get_idxCols(dataPath[1])
+            joinCmd += f"""{self.daySourceObj} = select {",".join(didxCols + list(featureDict[dataPath[1]].keys()))} from {self.sourceDict}["{dataPath[1]}"];
+        """
+            for path in dataPath[2:]:
+                matchingCols = [col for col in self.get_idxCols(path) if col in didxCols]
+                joinCmd += f"""{self.daySourceObj} = lsj({self.daySourceObj}, select {",".join(matchingCols + list(featureDict[path].keys()))} from {self.sourceDict}["{path}"], {matchingCols});
+        """
+            if broadcast:
+                matchingCols = [col for col in didxCols if col in lidxCols]
+                joinCmd += f"""{self.sourceObj} = lsj({self.sourceObj}, {self.daySourceObj}, {matchingCols});
+        """
+            else:
+                self.sourceCols = list(featureDict[dataPath[0]].keys())
+                joinCmd += f"""// 组内未引用日频字段, 日频数据保留在{self.daySourceObj}中, 不展开至分钟行
+        """
+        else:
+            for path in dataPath[1:]:
+                matchingCols = [col for col in self.get_idxCols(path) if col in lidxCols]
+                joinCmd += f"""{self.sourceObj} = lsj({self.sourceObj}, select {",".join(matchingCols + list(featureDict[path].keys()))} from {self.sourceDict}["{path}"], {matchingCols});
+        """
+        cmd += self.stage_cmd("join", "$".join(dataPath), joinCmd, self.sourceObj)
+        for path in dataPath:
+            self.loadedDict[path] -= 1
+            if self.loadedDict[path] == 0:
+                self.loadedDict.pop(path)
+                cmd += f"""{self.sourceDict}.erase!("{path}");  // 最后一次使用, 释放
+        """
+        return cmd
 
-            # 再分别执行因子计算函数factorFunc
-            for factorName in factorList:
-                # 看一下有没有midFunc, 如果有的话需要获取midFunc
-                midFuncList = self.factor_cfg[factorName]["dependency"]["midFunc"]
-                if midFuncList:
-                    for midFunc in midFuncList:
-                        res = self.func_map[midFunc](self)
-                        if isinstance(res, dict):
-                            res = res["cmd"]
-                        self.dolphindb_cmd += res
-                # 获取这个因子的计算函数
-                calFuncName = self.factor_cfg[factorName]["calFunc"]
-                paramsDict = self.factor_cfg[factorName]  # 获取这个factor的一切信息
-                calFunc = self.func_map[calFuncName]
-                nParams = calFunc.__code__.co_argcount
-                if nParams == 3:
-                    self.dolphindb_cmd += calFunc(self, factorName, paramsDict)
+    def get_featureStore(self) -> Dict:
+        """
+        查询特征指纹表
+        return: {特征表名: (指纹, 已存储起始日期"%Y.%m.%d", 已存储结束日期"%Y.%m.%d")}
+        """
+        if self.featureStoreDict is None:
+            self.featureStoreDict = {}
+            df = self.session.run(f"""
+            select feature, fingerprint, startDate, endDate from loadTable("{self.featureDB}", "{self.cacheTB}")
+            """)
+            if df is not None:
+                for feature, fingerprint, startDate, endDate in zip(df["feature"], df["fingerprint"], df["startDate"], df["endDate"]):
+                    self.featureStoreDict[feature] = (fingerprint, pd.Timestamp(startDate).strftime("%Y.%m.%d"),
+                                                      pd.Timestamp(endDate).strftime("%Y.%m.%d"))
+        return self.featureStoreDict
+
+    def feature_cmd(self, funcName: str, res: Dict) -> str:
+        """
+        特征库: classFunc生成的中间列持久化至特征表{featureDB}/{funcName}(symbol, TradeDate, TradeTime, 中间列)
+        1. 指纹(classFunc源码+读取列)未变且已存储区间覆盖加载区间时, 与原始数据表一样加载特征表并lsj至sourceObj
+        2. 否则执行classFunc, 并将已存储区间之外的日期追加至特征表(指纹变化时重建特征表)
+        classFunc返回"callBackPeriod"(K线数量)时, 加载区间开头的回看期不写入特征表
+        """
+        columns = list(res["columns"])
+        fingerprint = hashlib.sha1((self.get_funcSource(self.func_map[funcName]) + json.dumps(res.get("reads"))).encode("utf-8")).hexdigest()
+        start_date, end_date = self.loadRange
+        nDays = -(-int(res.get("callBackPeriod") or 0) // self.barsPerDay)
+        writeStart = start_date if nDays <= 0 else \
+            pd.Timestamp(self.session.run(f"""temporalAdd({start_date},{nDays},"{self.marketType}")""")).strftime("%Y.%m.%d")
+        storeDict = self.get_featureStore()
+        stored = storeDict.get(funcName)
+        idxCols = [self.dateCol, self.timeCol, self.symbolCol]
+        if stored and stored[0] == fingerprint and stored[1] <= writeStart and stored[2] >= end_date:
+            self.readList.append([])
+            cfg = {"dataPath": [self.featureDB, funcName], "dateCol": self.dateCol, "timeCol": self.timeCol, "symbolCol": self.symbolCol}
+            return self.no_leftJoin(dataPath=funcName,
+                                    indicator_dict={col: col for col in columns},
+                                    start_date=start_date,
+                                    end_date=end_date,
+                                    objName=self.middleObj,
+                                    cfg=cfg) + f"""
+        // 从特征库读取{funcName}的中间列
+        {self.sourceObj} = lsj({self.sourceObj}, {self.middleObj}, {idxCols});
+        """
+        self.readList.append(res.get("reads"))
+        cmd = res["cmd"]
+        cond = f"{self.dateCol} between {writeStart} and {end_date}"
+        if stored and stored[0] == fingerprint:  # 只追加已存储区间之外的日期
+            cond += f" and ({self.dateCol}<{stored[1]} or {self.dateCol}>{stored[2]})"
+            startDate, endDate = (min(writeStart, stored[1]), max(end_date, stored[2])) \
+                if stored[1] <= end_date and stored[2] >= writeStart else (writeStart, end_date)
+        else:
+            startDate, endDate = writeStart, end_date
+        cmd += f"""
+    // 写入特征库{self.featureDB}/{funcName}
+    if ({"true" if stored and stored[0] != fingerprint else "false"} and existsTable("{self.featureDB}", "{funcName}")){{
+        dropTable(database("{self.featureDB}"), "{funcName}");  // classFunc发生变化, 重建特征表
+    }};
+    if (!existsTable("{self.featureDB}", "{funcName}")){{
+        database("{self.featureDB}").createPartitionedTable(select top 0 {",".join(idxCols + columns)} from {self.sourceObj}, "{funcName}",
+                                                           partitionColumns=`{self.dateCol}, sortColumns=`{self.symbolCol}`{self.timeCol}, keepDuplicates=LAST);
+    }};
+    loadTable("{self.featureDB}", "{funcName}").append!(select {",".join(idxCols + columns)} from {self.sourceObj} where {cond});
+    """
+        # 同一脚本中之后的dataPath组可直接读取
+        storeDict[funcName] = (fingerprint, startDate, endDate)
+        self.featurePendingList.append((funcName, fingerprint, startDate, endDate))
+        return cmd
+
+    def update_feature(self):
+        """脚本运行完毕后, 写入本次写入的特征表指纹与已存储区间"""
+        if not self.featurePendingList:
+            return
+        resList = list({i[0]: i for i in self.featurePendingList}.values())
+        self.session.run(f"""
+        featureTb = table({[i[0] for i in resList]} as feature, {[i[1] for i in resList]} as fingerprint,
+                          [{",".join([i[2] for i in resList])}] as startDate, [{",".join([i[3] for i in resList])}] as endDate,
+                          take(now(), {len(resList)}) as updateTime)
+        loadTable("{self.featureDB}", "{self.cacheTB}").append!(featureTb)
+        """)
+        self.featurePendingList = []
+
+    def class_cmd(self, factorList: List, classList: List = None) -> str:
+        """
+        生成classFunc的DolphinDB命令, 每个class只执行一次
+        classFunc返回{"cmd": 生成中间列的命令, "defs": 函数定义等始终执行的命令, "columns": 生成的中间列, "reads": 读取的列}
+        """
+        if classList is None:
+            classList = list(set([self.factor_cfg[factor]["class"] for factor in factorList]))
+        classList = list(classList)
+        cmd = ""
+        for factorName in factorList:
+            # 获取这个因子的class, 判断有没有设置对应的classFunc
+            class_ = self.factor_cfg[factorName]["class"]
+            if class_ not in classList:  # 被执行/判断过了
+                continue
+            classList.remove(class_)  # 进入执行/判断分支
+            if class_ not in self.class_cfg.keys():
+                continue
+            funcList = self.class_cfg[class_]
+            if funcList in [None, []]:
+                continue
+            # 说明是有效的classFunc
+            for funcName in funcList:
+                res = self.func_map[funcName](self)
+                if isinstance(res, dict):
+                    cmd += res.get("defs", "")
+                    if self.featureMode and res.get("columns"):
+                        cmd += self.stage_cmd("classFunc", funcName, self.feature_cmd(funcName, res), self.sourceObj)
+                    else:
+                        cmd += self.stage_cmd("classFunc", funcName, res["cmd"], self.sourceObj)
+                        self.readList.append(res.get("reads"))
+                    self.classCols.extend(res.get("columns") or [])
                 else:
-                    self.dolphindb_cmd += calFunc(self, factorName)
+                    cmd += self.stage_cmd("classFunc", funcName, res, self.sourceObj)
+                    self.readList.append(None)
+        return cmd
 
+    def factor_cmd(self, factorName: str) -> str:
+        """
+        生成单个因子的DolphinDB命令: midFunc+calFunc
+        calFunc返回{"cmd": str, "fill": True}时, 该因子的截面填充推迟到依赖它的因子计算之前(或组结束时)合并执行
+        calFunc返回{"select": 表达式, "from": 输入表, "by": 分组子句}时, 该因子暂存于fuseDict,
+        与输入表、分组子句相同的其他因子合并为一次select, 在依赖它的因子计算之前(或组结束时)执行
+        calFunc返回的"reads"声明其读取的sourceObj列(输入表不是sourceObj的select无需声明), 用于列的活跃性分析
+        select形式可以附带"prep": 生成输入表的预处理命令, 同组内相同的预处理只生成一次(如因子族共用的前缀和表)
+        """
+        cmd = ""
+        deps = self.get_deps(factorName)
+        # 依赖的因子尚未计算时, 先执行合并的select
+        fuseList = [fuseFactor for selectList in self.fuseDict.values() for fuseFactor, _ in selectList]
+        if any(dep in fuseList for dep in deps):
+            cmd += self.flush_fuse()
+        # 依赖的因子尚未截面填充时, 先合并执行一次填充
+        if not self.shardMode and any(dep in self.fillList for dep in deps):
+            cmd += self.flush_fill()
+        # 看一下有没有midFunc, 如果有的话需要获取midFunc
+        midFuncList = self.factor_cfg[factorName]["dependency"]["midFunc"]
+        if midFuncList:
+            for midFunc in midFuncList:
+                if self.midList is not None:
+                    if midFunc in self.midList:  # 同组内多个因子共用的midFunc只需生成一次
+                        continue
+                    self.midList.append(midFunc)
+                res = self.func_map[midFunc](self)
+                if isinstance(res, dict):
+                    self.readList.append(res.get("reads", []))   # midFunc通常只定义函数, 未声明时视为不读取
+                    res = res["cmd"]
+                cmd += self.stage_cmd("midFunc", midFunc, res)
+        # 获取这个因子的计算函数
+        calFuncName = self.factor_cfg[factorName]["calFunc"]
+        paramsDict = self.factor_cfg[factorName]  # 获取这个factor的一切信息
+        calFunc = self.func_map[calFuncName]
+        nParams = calFunc.__code__.co_argcount
+        if nParams == 3:
+            res = calFunc(self, factorName, paramsDict)
+        else:
+            res = calFunc(self, factorName)
+        if isinstance(res, dict):
+            if res.get("fill"):
+                self.fillList.append(factorName)
+            if "select" in res:
+                if res.get("prep") and (self.midList is None or res["prep"] not in self.midList):
+                    if self.midList is not None:  # 同组内多个因子共用的预处理只需生成一次
+                        self.midList.append(res["prep"])
+                    cmd += self.stage_cmd("midFunc", factorName, res["prep"])
+                    self.prepDict[res["from"]] = res["prep"]
+                self.fuseDict.setdefault((res["from"], res.get("by", "")), []).append((factorName, res["select"]))
+                self.fuseReadDict[factorName] = res.get("reads") if res["from"] == self.sourceObj else []
+                return cmd
+            self.readList.append(res.get("reads"))
+            res = res["cmd"]
+        else:
+            self.readList.append(None)
+        cmd += self.stage_cmd("calFunc", factorName, res, f'{self.factorDict}["{factorName}"]')
+        return cmd
+
+    @with_trace
     def run(self, start_date: str, end_date: str,
             dropDayDB: bool = False,
             dropDayTB: bool = False,
             dropMinDB: bool = False,
             dropMinTB: bool = False):
-        """主函数"""
+        """
+        主函数, 由执行后端(self.backend)完成初始化与计算
+        trace: Chrome trace文件路径, 给定时记录阶段统计并导出(见with_trace)
+        启用结果缓存(config["resultCache"])时, 指纹未变且已存储区间覆盖[start_date, end_date]的因子跳过计算,
+        只重新计算配置/代码发生变化的因子及其下游因子
+        """
         # Step1. 初始化
-        self.init_def() # 初始化相关变量+数据插入函数
-        self.init_database(dropDayDB, dropDayTB, dropMinDB, dropMinTB)  # 初始化数据库
+        self.backend.init(self, dropDayDB, dropDayTB, dropMinDB, dropMinTB)
+        self.init_check()   # 指纹基于补全后的配置计算(init_check可重复调用), 与调用顺序无关
+        if self.resultCache:
+            start_date, end_date = trans_time(start_date, end_date)
+            self.init_cache()
+            fingerprintDict = {}
+            for factor in self.factor_need:
+                self.get_fingerprint(factor, fingerprintDict)
+            cacheDict = self.get_cache(self.factor_need)
+            factor_need = [factor for factor in self.factor_need
+                           if factor not in cacheDict or cacheDict[factor][0] != fingerprintDict[factor]
+                           or cacheDict[factor][1] > start_date or cacheDict[factor][2] < end_date]
+            print(f"结果缓存: {len(self.factor_need)-len(factor_need)}个因子无需重新计算, {len(factor_need)}个因子需要计算")
+            if not factor_need:
+                return
+            self.set_factorList(factor_need)
+        hydrateList = []
+        if self.hydrate and isinstance(self.backend, DolphinDBBackend):
+            start_date, end_date = trans_time(start_date, end_date)
+            hydrateList = self.plan_hydrate(start_date, end_date)
         self.init_check()
 
         # Step2. DD_list/MM_list/MD_list
+        self.init_group()
+        self.writeStartDict = {}    # 全量计算: 写入全部日期
+        if hydrateList:  # 读取的依赖因子包含回看期, 只写入start_date之后的数据
+            writeStart = (pd.Timestamp(start_date) - pd.Timedelta(days=1)).strftime("%Y.%m.%d")
+            self.writeStartDict = {factor: writeStart for factor in self.factor_need}
+
+        # 运行
+        res = self.backend.execute(self, start_date, end_date)
+        if self.resultCache:
+            self.update_cache(fingerprintDict, cacheDict, start_date, end_date)
+        return res
+
+    def check_backend(self, mode: str):
+        """分块/并发/分片/增量模式直接执行生成的DolphinDB脚本, 执行后端需要实现run_script"""
+        if not hasattr(self.backend, "run_script"):
+            raise NotImplementedError(f"{mode}需要执行DolphinDB脚本, 执行后端{type(self.backend).__name__}不支持, 请使用run")
+
+    def get_sourceRows(self, dataPath: str, start_date: str, end_date: str) -> int:
+        """原始数据表在[start_date, end_date]内的行数, 由执行后端查询"""
+        return self.backend.get_sourceRows(self, dataPath, start_date, end_date)
+
+    def explain(self, start_date: str, end_date: str, memBudgetGB: float = None) -> Dict:
+        """
+        执行计划(不执行): 按dataPath组列出 加载原始数据->left join->classFunc->因子计算->写入 各阶段的预计行数与内存(字节)
+        1. 原始数据行数由执行后端查询(见get_sourceRows), 其余阶段按列数*8字节估计; 计划中所有表的行数由同一模型换算:
+           读取原始数据的因子为所在组的原始数据行数(日频=分钟频/barsPerDay), 只依赖其他因子的因子与因子族前缀和表
+           取其依赖因子在计划中的行数, 依赖因子不在计划中时按get_factorRows估计
+        2. 组内峰值按 原始数据+中间列+组内全部因子 估计, 之前的组中factor_need因子保留至写入
+        3. 给定内存预算(默认config["memBudgetGB"])时: 全量运行超出预算则选择能满足预算的最大分块窗口(run_chunked的freq),
+           并发数量为预算可容纳的组数量(run_parallel); 最小窗口仍超出预算时抛出MemoryError
+        return: {"stages": DataFrame[group, stage, object, rows, bytes], "peakBytes": 全量运行预测峰值, "chunk": 分块窗口/None, "parallel": 并发数量}
+        """
+        start_date, end_date = trans_time(start_date, end_date)
+        memBudgetGB = memBudgetGB if memBudgetGB is not None else self.memBudgetGB
+        self.init_check()
+        self.init_group()
+        rowsDict, stageList, groupPeakDict = {}, [], {}
+        factorRowsDict = {}     # 因子名: 计划中的行数
+        peak, retained = 0, 0
+
+        def planRows(factor: str, minFactor: bool) -> int:
+            """计划中因子的行数(按minFactor换算频率), 不在计划中时按get_factorRows估计"""
+            rows = factorRowsDict.get(factor) or self.get_factorRows(factor, start_date, end_date)
+            if self.is_minFactor(factor) and not minFactor:
+                return rows // self.barsPerDay
+            if minFactor and not self.is_minFactor(factor):
+                return rows * self.barsPerDay
+            return rows
+
+        for dataPathDict in [self.dataPath_MD_dict, self.dataPath_MM_dict, self.dataPath_DD_dict]:
+            for dataPath, factorList in dataPathDict.items():
+                pathList = dataPath.split("$") if dataPath else []
+                featureDict = self.get_featuresGivenFactor(factorList)
+                groupBytes, sourceRows, sourceCols = 0, 0, 0
+                # 加载原始数据+left join
+                for path in pathList:
+                    if path not in rowsDict:
+                        rowsDict[path] = self.get_sourceRows(path, start_date, end_date)
+                    nCols = len(self.get_idxCols(path)) + len(featureDict[path])
+                    stageList.append((dataPath, "load", path, rowsDict[path], rowsDict[path] * nCols * 8))
+                    groupBytes += rowsDict[path] * nCols * 8
+                    sourceCols += len(featureDict[path]) + (len(self.get_idxCols(path)) if path == pathList[0] else 0)
+                if pathList:
+                    sourceRows = rowsDict[pathList[0]]
+                    if len(pathList) >= 2:
+                        stageList.append((dataPath, "join", dataPath, sourceRows, sourceRows * sourceCols * 8))
+                        groupBytes += sourceRows * sourceCols * 8
+                    # classFunc中间列
+                    for class_ in list(dict.fromkeys([self.factor_cfg[factor]["class"] for factor in factorList])):
+                        for funcName in self.class_cfg.get(class_) or []:
+                            nCols = len(self.backend.get_classInfo(self, funcName).get("columns") or [])
+                            stageList.append((dataPath, "classFunc", funcName, sourceRows, sourceRows * nCols * 8))
+                            groupBytes += sourceRows * nCols * 8
+                # 因子计算+写入
+                minSource = bool(pathList) and pathList[0] in self.dataPath_M_list
+                needBytes, prefixList = 0, []
+                for factor in self.sort_factorsGivenDependency(factorList):
+                    if self.factor_cfg[factor]["calFunc"] == "get_family":  # 因子族共用的前缀和表, 每个父因子计一次
+                        base = self.get_deps(factor)[0]
+                        if base not in prefixList:
+                            prefixList.append(base)
+                            rows = planRows(base, self.is_minFactor(base))    # 行数与父因子相同
+                            stageList.append((dataPath, "prep", f"{base}_prefix", rows, self.get_prefixBytes(rows)))
+                            groupBytes += self.get_prefixBytes(rows)
+                    if not pathList:
+                        rows = max([planRows(dep, self.is_minFactor(factor)) for dep in self.get_deps(factor)],
+                                   default=self.get_factorRows(factor, start_date, end_date))
+                    elif self.is_minFactor(factor):
+                        rows = sourceRows if minSource else sourceRows * self.barsPerDay
+                    else:
+                        rows = sourceRows // self.barsPerDay if minSource else sourceRows
+                    factorRowsDict[factor] = rows
+                    factorBytes = rows * (5 if self.is_minFactor(factor) else 4) * 8
+                    stageList.append((dataPath, "factor", factor, rows, factorBytes))
+                    groupBytes += factorBytes
+                    if factor in factorList and factor in self.factor_need:
+                        stageList.append((dataPath, "write", factor, rows, factorBytes))
+                        needBytes += factorBytes
+                groupPeakDict[dataPath] = groupBytes
+                peak = max(peak, retained + groupBytes)
+                retained += needBytes
+        stages = pd.DataFrame(stageList, columns=["group", "stage", "object", "rows", "bytes"])
+        res = {"stages": stages, "peakBytes": peak, "chunk": None, "parallel": 1}
+        print(stages.to_string(index=False))
+        print(f"执行计划: {len(groupPeakDict)}个dataPath组, 全量运行预测峰值{peak/1024**3:.2f}GB")
+        if memBudgetGB is None:
+            return res
+
+        # 按内存预算选择分块窗口与并发数量
+        budget = memBudgetGB * 1024**3
+        nDays = max(len(pd.bdate_range(pd.Timestamp(start_date), pd.Timestamp(end_date))), 1)
+        callBackPeriod = max([self.get_callBackPeriod(factor) for factor in self.factor_cfg], default=0)
+        ratio = 1.0
+        if peak > budget:
+            for freq in ["Y", "Q", "M"]:
+                chunkDays = max(len(pd.bdate_range(pd.Timestamp(chunk_start), pd.Timestamp(chunk_end)))
+                                for chunk_start, chunk_end in self.get_chunkList(start_date, end_date, freq))
+                ratio = min((chunkDays + callBackPeriod) / nDays, 1.0)
+                if peak * ratio <= budget:
+                    res["chunk"] = freq
+                    break
+            else:
+                raise MemoryError(f"执行计划: 按月分块的预测峰值{peak*ratio/1024**3:.2f}GB仍超出内存预算{memBudgetGB}GB, 请缩小计算区间或因子范围")
+        maxGroup = max(groupPeakDict.values(), default=0) * ratio
+        res["parallel"] = max(1, min(len(groupPeakDict), int(budget // maxGroup) if maxGroup else len(groupPeakDict)))
+        print(f"执行计划: 内存预算{memBudgetGB}GB, 分块窗口{res['chunk'] or '不分块'}, 并发数量{res['parallel']}")
+        return res
+
+    @with_trace
+    def run_chunked(self, start_date: str, end_date: str, freq: str = "Y",
+                    dropDayDB: bool = False,
+                    dropDayTB: bool = False,
+                    dropMinDB: bool = False,
+                    dropMinTB: bool = False):
+        """
+        分块模式: 将[start_date, end_date]按freq划分为若干时间窗口, 每个窗口单独加载数据+计算+上传
+        每个窗口向前多加载因子依赖链所需的回看期, 上传前剔除回看期(预热)部分的数据
+        内存峰值只与窗口长度有关, 与历史总长度无关
+        freq: 窗口长度, pandas Period频率("M"/"Q"/"Y")
+        """
+        self.check_backend("run_chunked")
+        start_date, end_date = trans_time(start_date, end_date)
+        # Step1. 初始化
+        self.backend.init(self, dropDayDB, dropDayTB, dropMinDB, dropMinTB)
+        self.init_check()
+        self.init_group()
+        self.plan_load()
+
+        # Step2. 依赖链上的最大回看期
+        callBackPeriod = max([self.get_callBackPeriod(factor) for factor in self.factor_cfg], default=0)
+
+        # Step3. 逐窗口运行
+        for chunk_start, chunk_end in self.get_chunkList(start_date, end_date, freq):
+            load_start = self.get_callBackDate(chunk_start, callBackPeriod)
+            print(f"分块模式: 计算区间{chunk_start}~{chunk_end}, 加载区间{load_start}~{chunk_end}")
+            # 只上传窗口内部的数据(剔除预热部分)
+            writeStart = (pd.Timestamp(chunk_start) - pd.Timedelta(days=1)).strftime("%Y.%m.%d")
+            self.writeStartDict = {factor: writeStart for factor in self.factor_need}
+            self.dolphindb_cmd = ""
+            self.processing(load_start, chunk_end, self.dataPath_MD_dict)
+            self.processing(load_start, chunk_end, self.dataPath_MM_dict)
+            self.processing(load_start, chunk_end, self.dataPath_DD_dict)
+            self.dolphindb_cmd += self.update_data(writeStartDict=self.writeStartDict)
+            self.dolphindb_cmd += f"""
+            {self.factorDict}.clear!();  // 释放当前窗口的因子
+            {self.sourceObj} = 0;
+            {self.daySourceObj} = 0;
+            {self.panelObj} = 0;
+            """
+            self.backend.run_script(self, self.dolphindb_cmd)
+            self.update_feature()
+            self.report_peak()
+        self.collect_stats()
+
+    @with_trace
+    def run_parallel(self, start_date: str, end_date: str, pool: ddb.DBConnectionPool,
+                     dropDayDB: bool = False,
+                     dropDayTB: bool = False,
+                     dropMinDB: bool = False,
+                     dropMinTB: bool = False):
+        """
+        并发模式: 每个dataPath组生成一个独立的脚本, 组之间只保留因子依赖关系
+        相互独立的dataPath组提交至连接池并发执行, 因子通过共享的factorDict在session之间传递
+        注: 组之间的依赖关系图存在环(因子之间无环, 但两个组互相依赖对方的因子)时无法拆分为独立脚本, 直接报错, 请使用run
+        """
+        self.check_backend("run_parallel")
+        start_date, end_date = trans_time(start_date, end_date)
+        # Step1. 初始化
+        self.backend.init(self, dropDayDB, dropDayTB, dropMinDB, dropMinTB)
+        self.init_check()
+        self.init_group()
+        self.loadCountDict, self.loadFeatureDict, self.loadedDict = {}, {}, {}  # 各组脚本独立加载数据, 不使用之前运行的加载规划
+
+        # Step2. 构建dataPath组之间的依赖关系图
+        dataPathDict = {**self.dataPath_MD_dict, **self.dataPath_MM_dict, **self.dataPath_DD_dict}
+        G = self.get_groupGraph(dataPathDict)
+        if not nx.is_directed_acyclic_graph(G):
+            raise ValueError(f"dataPath组之间存在循环依赖{list(nx.simple_cycles(G))}, 无法并发执行, 请使用run")
+        self.dolphindb_cmdDict = {}
+        for dataPath, factorList in dataPathDict.items():
+            self.dolphindb_cmdDict[dataPath] = self.data_insert() + f"""
+            {self.sourceObj}=0;
+            {self.middleObj}=syncDict(STRING,ANY);
+            {self.dataObj}=0;
+            """ + self.processing_group(start_date, end_date, dataPath, factorList, expand=False) \
+                + self.update_data(factor_list=factorList)
+        self.backend.run_script(self, self.init_shared())
+
+        # Step3. 依赖满足的dataPath组提交至连接池
+        pending = {dataPath: set(G.predecessors(dataPath)) for dataPath in G.nodes}
+        running = {}
+        try:
+            while pending or running:
+                for dataPath in [k for k, v in pending.items() if not v]:
+                    pending.pop(dataPath)
+                    running[pool.runTaskAsync(self.dolphindb_cmdDict[dataPath])] = dataPath
+                if not running:
+                    raise RuntimeError(f"dataPath组{list(pending.keys())}的依赖无法满足")
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    dataPath = running.pop(future)
+                    future.result()  # 抛出该组的异常
+                    for v in pending.values():
+                        v.discard(dataPath)
+                    print(f"dataPath组{dataPath}计算完毕")
+            self.collect_stats()
+        finally:
+            self.backend.run_script(self, f"""try{{ undef("{self.factorDict}", SHARED) }}catch(ex){{}}""")
+
+    @with_trace
+    def run_sharded(self, start_date: str, end_date: str, pool: ddb.DBConnectionPool, nShard: int = 4,
+                    dropDayDB: bool = False,
+                    dropDayTB: bool = False,
+                    dropMinDB: bool = False,
+                    dropMinTB: bool = False):
+        """
+        分片模式: 按hashBucket(symbol)将标的划分为nShard个分片
+        1. 每个分片在连接池的一个session中执行: 加载数据 -> classFunc -> 基础因子(只依赖原始数据)的时序部分
+        2. 主session合并所有分片的基础因子, 统一执行一次截面空缺值填充
+        3. 主session计算衍生因子(依赖其他因子)并上传
+        注: 基础因子的calFunc只允许context by symbol的时序计算, 截面填充通过返回"fill": True声明
+        """
+        self.check_backend("run_sharded")
+        start_date, end_date = trans_time(start_date, end_date)
+        # Step1. 初始化
+        self.backend.init(self, dropDayDB, dropDayTB, dropMinDB, dropMinTB)
+        self.init_check()
+        self.init_group()
+        shardDict = f"{self.factorDict}Shard"  # 分片结果的共享变量名称
+        self.backend.run_script(self, self.init_shared(shardDict))
+
+        dataPathDict = {**self.dataPath_MD_dict, **self.dataPath_MM_dict, **self.dataPath_DD_dict}
+        try:
+            for dataPath, factorList in dataPathDict.items():
+                classList = list(set([self.factor_cfg[factor]["class"] for factor in factorList]))
+                factorList = self.sort_factorsGivenDependency(factorList)
+                baseList = [factor for factor in factorList if not self.get_deps(factor)]
+                deriveList = [factor for factor in factorList if factor not in baseList]
+
+                # Step2. 每个分片计算基础因子的时序部分
+                self.shardMode, self.fillList, self.midList = True, [], []
+                factor_cmd = self.class_cmd(baseList, classList) + "".join([self.factor_cmd(factor) for factor in baseList]) + self.flush_fuse()
+                self.shardMode, self.midList = False, None
+                futures = []
+                for shardId in range(nShard):
+                    self.dolphindb_cmdDict[f"{dataPath}#{shardId}"] = f"""
+                    {self.sourceObj}=0;
+                    {self.middleObj}=syncDict(STRING,ANY);
+                    {self.dataObj}=0;
+                    {self.factorDict}=syncDict(STRING,ANY);
+                    """ + self.load_cmd(start_date, end_date, dataPath, factorList, shard=[shardId, nShard]) + factor_cmd + f"""
+                    for (factor in {baseList}){{
+                        {shardDict}[factor+"#{shardId}"] = {self.factorDict}[factor];
+                    }}
+                    """
+                    futures.append(pool.runTaskAsync(self.dolphindb_cmdDict[f"{dataPath}#{shardId}"]))
+                for future in futures:
+                    future.result()  # 抛出分片的异常
+                print(f"dataPath组{dataPath}的{nShard}个分片计算完毕")
+
+                # Step3. 合并分片+截面空缺值填充(所有基础因子合并为一次), 再计算衍生因子
+                cmd = ""
+                for factor in baseList:
+                    cmd += f"""
+                    {self.factorDict}["{factor}"] = unionAll([{",".join([f'{shardDict}["{factor}#{i}"]' for i in range(nShard)])}], false);
+                    """
+                cmd += f"""
+                {shardDict}.clear!();  // 释放分片结果
+                """
+                cmd += self.flush_fill()
+                self.midList = []
+                cmd += "".join([self.factor_cmd(factor) for factor in deriveList])
+                cmd += self.flush_fill()
+                self.midList = None
+                self.dolphindb_cmd += cmd
+                self.backend.run_script(self, cmd)
+            # Step4. 上传
+            cmd = self.update_data()
+            self.dolphindb_cmd += cmd
+            self.backend.run_script(self, cmd)
+            self.collect_stats()
+        finally:
+            self.shardMode, self.fillList, self.fuseDict, self.midList = False, [], {}, None
+            self.backend.run_script(self, f"""try{{ undef("{shardDict}", SHARED) }}catch(ex){{}}""")
+
+    def get_groupGraph(self, dataPathDict: Dict) -> nx.DiGraph:
+        """
+        dataPath组之间的依赖关系图
+        每个因子只属于自身dataPath对应的组, 若依赖因子属于其他组, 则添加一条 依赖组->当前组 的边
+        """
+        factorGroup = {factor: dataPath for dataPath, factorList in dataPathDict.items() for factor in factorList}
+        G = nx.DiGraph()
+        G.add_nodes_from(dataPathDict.keys())
+        for dataPath, factorList in dataPathDict.items():
+            for factor in factorList:
+                for dep in self.get_deps(factor):
+                    if dep in factorGroup and factorGroup[dep] != dataPath:
+                        G.add_edge(factorGroup[dep], dataPath)
+        return G
+
+    @staticmethod
+    def get_chunkList(start_date: str, end_date: str, freq: str = "Y") -> List:
+        """将[start_date, end_date]按照freq划分为首尾相接的时间窗口"""
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        chunkList = []
+        for period in pd.period_range(start, end, freq=freq):
+            chunk_start = max(period.start_time.normalize(), start)
+            chunk_end = min(period.end_time.normalize(), end)
+            chunkList.append((chunk_start.strftime("%Y.%m.%d"), chunk_end.strftime("%Y.%m.%d")))
+        return chunkList
+
+    def init_group(self):
+        """按照MD/MM/DD类型, 将因子按照dataPath进行分组"""
         # MD_list (left-join)
         self.dataPath_MD_dict = {}  # 存储所有MD格式的dataPath以及对应的因子list
         for factorName in self.factor_MD_list:  # 遍历所有MD类型的因子
@@ -845,16 +2520,59 @@ class FactorCalculator:
                 self.dataPath_DD_dict[dataPath] = []
             self.dataPath_DD_dict[dataPath].append(factorName)
 
-        # 运行
-        self.processing(start_date, end_date, self.dataPath_MD_dict)
-        self.processing(start_date, end_date, self.dataPath_MM_dict)
-        self.processing(start_date, end_date, self.dataPath_DD_dict)
-        self.dolphindb_cmd+=self.update_data() # 上传至数据库的SQL语句
-        self.session.run(self.dolphindb_cmd)    # 运行
+    @with_trace
+    def run_incremental(self, start_date: str = None, end_date: str = None):
+        """
+        增量模式: 只计算并上传因子数据库中尚未存储的日期
+        1. 查询factor_need中每个因子已存储的最新日期
+        2. 沿依赖链累加callBackPeriod, 确定需要回看加载的起始日期
+        3. 只上传最新日期之后的数据
+        start_date: 数据库中尚不存在的因子的起始计算日期
+        trace: Chrome trace文件路径, 给定时记录阶段统计并导出(见with_trace)
+        """
+        self.check_backend("run_incremental")
+        start_date, end_date = trans_time(start_date, end_date)
+        # Step1. 初始化
+        self.backend.init(self)
+        self.init_check()
+        self.init_group()
+        self.plan_load()
+
+        # Step2. 确定每个因子的上传起始日期以及数据的加载起始日期
+        lastDateDict = self.get_lastDate(self.factor_need)
+        self.stateDict = self.get_state(lastDateDict) if self.rollingState else {}
+        if self.factor_need and all(factor in lastDateDict and lastDateDict[factor] >= end_date for factor in self.factor_need):
+            print(f"所有因子均已更新至{end_date}, 无需计算")
+            return
+        load_start_date = end_date
+        for factor in self.factor_need:
+            if factor not in lastDateDict:  # 数据库中不存在的因子从start_date开始计算
+                load_start_date = min(load_start_date, start_date)
+                continue
+            load_start_date = min(load_start_date,
+                                  self.get_callBackDate(lastDateDict[factor], self.get_callBackPeriod(factor)))
+        for base, stateDate in self.stateDict.items():  # 滚动状态之后的日期需要父因子的值
+            load_start_date = min(load_start_date, self.get_callBackDate(stateDate, self.get_callBackPeriod(base)))
+        print(f"增量模式: 加载区间{load_start_date}~{end_date}" + (f", 使用滚动状态: {list(self.stateDict.keys())}" if self.stateDict else ""))
+
+        # Step3. 运行
+        self.writeStartDict = lastDateDict
+        self.stateWrite = self.rollingState
+        self.processing(load_start_date, end_date, self.dataPath_MD_dict)
+        self.processing(load_start_date, end_date, self.dataPath_MM_dict)
+        self.processing(load_start_date, end_date, self.dataPath_DD_dict)
+        self.dolphindb_cmd += self.update_data(writeStartDict=lastDateDict)
+        if self.rollingState:
+            self.dolphindb_cmd += self.state_cmd()
+        self.stateDict, self.stateWrite = {}, False
+        self.backend.run_script(self, self.dolphindb_cmd)
+        self.update_feature()
+        self.report_peak()
+        self.collect_stats()
 
 
 if __name__ == "__main__":
-    from func import classFunc,shioMidFunc,shioCalFunc,varCalFunc,coinCalFunc,umrCalFunc
+    from func import classFunc,shioMidFunc,shioCalFunc,varCalFunc,coinCalFunc,umrCalFunc,utilFunc
     with open(r".\config\factor.json5", "r",encoding='utf-8') as f:
         factor_cfg = json5.load(f)
     with open(r".\config\indicator.json5","r",encoding='utf-8') as f:
@@ -870,10 +2588,12 @@ if __name__ == "__main__":
                          indicator_cfg=indicator_cfg,
                          func_map=get_funcMapFromImport(
                              classFunc,shioMidFunc,
-                             shioCalFunc,varCalFunc,coinCalFunc,umrCalFunc),
+                             shioCalFunc,varCalFunc,coinCalFunc,umrCalFunc,utilFunc),
                          class_cfg=class_cfg)
     # F.init_database(True,True,True,True)
-    F.set_factorList(factor_list=list(factor_cfg.keys()))
+    F.set_factorList(factor_list=list(F.factor_cfg.keys()))  # 包含由family模板展开的因子
     F.run(start_date="20170101",end_date="20250930")
+    # F.run_parallel(start_date="20170101",end_date="20250930",pool=pool)
+    # F.run(start_date="20170101",end_date="20250930",trace="trace.json")  # 导出Chrome trace
     print(F.dolphindb_cmd)
 
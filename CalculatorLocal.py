@@ -0,0 +1,166 @@
+import os
+import json5
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+from Calculator import *
+
+
+class LocalBackend:
+    """
+    本地NumPy/pandas执行后端: 不依赖DolphinDB server, 在Python进程内完成 加载数据->left join->classFunc->calFunc
+    1. 原始数据从dataDir下的本地文件读取, 文件名为indicator_cfg中的数据表名称(如stockDayKBar.parquet/stockDayKBar.csv),
+       字段名称与indicator_cfg一致(dateCol/timeCol/symbolCol+indicator中的实际字段)
+    2. classFunc/calFunc使用func_map中的本地实现(见func/localFunc.py), 与DolphinDB版本同名; midFunc已内联于本地calFunc中
+    3. 计算结果保存在factorDict中, 给定outputDir时factor_need中的因子以(symbol, date, factor, value)格式写入本地parquet(分钟频因子含time)
+    4. init时检查factor_list用到的classFunc/calFunc均有本地实现, 缺失时在计算前抛出NotImplementedError;
+       不实现run_script, 分块/并发/分片/增量模式只支持DolphinDB后端
+    """
+    def __init__(self, dataDir: str, func_map: Dict, outputDir: str = None):
+        self.dataDir = dataDir
+        self.func_map = func_map
+        self.outputDir = outputDir
+        self.sourceObj = None   # 当前dataPath组left join后的数据
+        self.factorDict = {}    # 因子名: 因子DataFrame
+        self.tableDict = {}     # 数据表名称: 已读取的本地数据(同一次运行中只读取一次)
+
+    def init(self, calculator: FactorCalculator, *args, **kwargs):
+        """本地后端不需要初始化数据库, 只检查函数是否均有本地实现"""
+        self.symbolCol = calculator.symbolCol
+        self.dateCol = calculator.dateCol
+        self.timeCol = calculator.timeCol
+        self.factorDict = {}
+        self.tableDict = {}
+        self.check_func(calculator)
+
+    def check_func(self, calculator: FactorCalculator):
+        """factor_list中因子的classFunc/calFunc均需在func_map中有本地实现"""
+        calculator.init_check()
+        funcList = []
+        for factor in calculator.factor_list:
+            cfg = calculator.factor_cfg[factor]
+            funcList += (calculator.class_cfg.get(cfg["class"]) or []) + [cfg["calFunc"]]
+        missList = sorted(set(funcName for funcName in funcList if funcName not in self.func_map))
+        if missList:
+            raise NotImplementedError(f"本地后端未实现函数{missList}")
+
+    def execute(self, calculator: FactorCalculator, start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+        start_date, end_date = trans_time(start_date, end_date)
+        for dataPathDict in [calculator.dataPath_MD_dict, calculator.dataPath_MM_dict, calculator.dataPath_DD_dict]:
+            for dataPath, factorList in dataPathDict.items():
+                self.processing_group(calculator, start_date, end_date, dataPath, factorList)
+        resDict = {factor: self.factorDict[factor] for factor in calculator.factor_need}
+        if self.outputDir:
+            self.update_data(resDict)
+        return resDict
+
+    def processing_group(self, calculator: FactorCalculator, start_date: str, end_date: str, dataPath: str, factorList: List):
+        """与FactorCalculator.processing_group执行顺序一致: 加载数据+left join -> classFunc -> calFunc"""
+        dataPath = dataPath.split("$")
+        featureDict = calculator.get_featuresGivenFactor(factorList)
+        self.sourceObj = self.load(calculator, dataPath[0], featureDict[dataPath[0]], start_date, end_date)
+        for path in dataPath[1:]:
+            self.sourceObj = self.left_join(self.sourceObj, self.load(calculator, path, featureDict[path], start_date, end_date))
+        self.sourceObj = self.sourceObj.sort_values([col for col in [self.symbolCol, self.dateCol, self.timeCol]
+                                                     if col in self.sourceObj.columns], kind="stable").reset_index(drop=True)
+
+        classList = list(set([calculator.factor_cfg[factor]["class"] for factor in factorList]))
+        factorList = calculator.sort_factorsGivenDependency(factorList)
+        for factorName in factorList:
+            class_ = calculator.factor_cfg[factorName]["class"]
+            if class_ not in classList:
+                continue
+            classList.remove(class_)
+            for funcName in calculator.class_cfg.get(class_) or []:
+                self.get_func(funcName)(self)
+
+        for factorName in factorList:
+            calFunc = self.get_func(calculator.factor_cfg[factorName]["calFunc"])
+            if calFunc.__code__.co_argcount == 3:
+                self.factorDict[factorName] = calFunc(self, factorName, calculator.factor_cfg[factorName])
+            else:
+                self.factorDict[factorName] = calFunc(self, factorName)
+            print(f"因子{factorName}计算完毕")
+
+    def get_func(self, funcName: str):
+        if funcName not in self.func_map:
+            raise NotImplementedError(f"本地后端未实现函数{funcName}")
+        return self.func_map[funcName]
+
+    def get_sourceRows(self, calculator: FactorCalculator, dataPath: str, start_date: str, end_date: str) -> int:
+        """本地数据表在[start_date, end_date]内的行数"""
+        cfg = calculator.indicator_cfg[dataPath]
+        df = self.read_table(dataPath)
+        if cfg["dateCol"] in ["", None, "NA"]:
+            return len(df)
+        date = pd.to_datetime(df[cfg["dateCol"]].astype(str))
+        return int(date.between(pd.Timestamp(start_date), pd.Timestamp(end_date)).sum())
+
+    def get_callBackDate(self, calculator: FactorCalculator, date: str, nDays: int) -> str:
+        """本地没有交易日历, 按工作日向前回看nDays个交易日"""
+        return (pd.Timestamp(date) - pd.offsets.BDay(nDays)).strftime("%Y.%m.%d")
+
+    def get_classInfo(self, calculator: FactorCalculator, funcName: str) -> Dict:
+        """本地classFunc直接在已加载的数据上计算, 不单独声明中间列与回看期(执行计划中不计入)"""
+        return {}
+
+    def read_table(self, tableName: str) -> pd.DataFrame:
+        """读取本地数据表, 优先读取parquet"""
+        if tableName not in self.tableDict:
+            path = os.path.join(self.dataDir, tableName)
+            if os.path.exists(path + ".parquet"):
+                self.tableDict[tableName] = pd.read_parquet(path + ".parquet")
+            elif os.path.exists(path + ".csv"):
+                self.tableDict[tableName] = pd.read_csv(path + ".csv")
+            else:
+                raise FileNotFoundError(f"本地数据表{tableName}不存在: {path}.parquet/.csv")
+        return self.tableDict[tableName]
+
+    def load(self, calculator: FactorCalculator, dataPath: str, indicator_dict: Dict, start_date: str, end_date: str) -> pd.DataFrame:
+        """读取本地数据表并转换为标准字段名称, 对应FactorCalculator.no_leftJoin"""
+        cfg = calculator.indicator_cfg[dataPath]
+        df = self.read_table(dataPath)
+        nameDict = {}
+        for colName, stdName in [("dateCol", self.dateCol), ("timeCol", self.timeCol), ("symbolCol", self.symbolCol)]:
+            if cfg[colName] not in ["", None, "NA"]:
+                nameDict[cfg[colName]] = stdName
+        nameDict.update({value: key for key, value in indicator_dict.items()})
+        df = df[list(nameDict.keys())].rename(columns=nameDict)
+        if self.dateCol in df.columns:
+            df[self.dateCol] = pd.to_datetime(df[self.dateCol].astype(str))
+            df = df[df[self.dateCol].between(pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        return df.reset_index(drop=True)
+
+    def left_join(self, left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+        """对应DolphinDB lsj: 按左右表共有的时间/标的列匹配, 右表重复键只取第一条"""
+        matchingCols = [col for col in [self.dateCol, self.timeCol, self.symbolCol] if col in left.columns and col in right.columns]
+        right = right.drop_duplicates(matchingCols)
+        return left.merge(right, on=matchingCols, how="left")
+
+    def update_data(self, resDict: Dict[str, pd.DataFrame]):
+        """factor_need中的因子以(symbol, date, factor, value)格式写入outputDir, 分钟频因子为(symbol, date, time, factor, value)"""
+        os.makedirs(self.outputDir, exist_ok=True)
+        for factor, data in resDict.items():
+            data = data.rename(columns={self.dateCol: "date", self.timeCol: "time", factor: "value"})
+            data = data[[col for col in [self.symbolCol, "date", "time", "factor", "value"] if col in data.columns]]
+            data.to_parquet(os.path.join(self.outputDir, f"{factor}.parquet"), index=False)
+            print(f"因子{factor}写入完毕")
+
+
+if __name__ == "__main__":
+    from func import localFunc
+    with open(r".\config\factor.json5", "r",encoding='utf-8') as f:
+        factor_cfg = json5.load(f)
+    with open(r".\config\indicator.json5","r",encoding='utf-8') as f:
+        indicator_cfg = json5.load(f)
+    with open(r".\config\class.json5","r",encoding='utf-8') as f:
+        class_cfg = json5.load(f)
+    func_map = get_funcMapFromImport(localFunc)
+    F = FactorCalculator(session=None, config=config,
+                         factor_cfg=factor_cfg,
+                         indicator_cfg=indicator_cfg,
+                         func_map=func_map,
+                         class_cfg=class_cfg,
+                         backend=LocalBackend(dataDir=r".\data", func_map=func_map))
+    F.set_factorList(factor_list=list(F.factor_cfg.keys()))  # 包含由family模板展开的因子
+    res = F.run(start_date="20240101", end_date="20240930")
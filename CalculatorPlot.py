@@ -851,10 +851,10 @@ if __name__ == "__main__":
                              factor_cfg=factor_cfg,
                              indicator_cfg=indicator_cfg,
                              func_map=get_funcMapFromImport(classFunc, shioMidFunc, shioCalFunc, varCalFunc,
-                                                            coinCalFunc),
+                                                            coinCalFunc, utilFunc),
                              class_cfg=class_cfg)
 
-    F.set_factorList(factor_list=list(factor_cfg.keys()))
+    F.set_factorList(factor_list=list(F.factor_cfg.keys()))  # 包含由family模板展开的因子
 
     # 初始化但不运行计算，只用于可视化
     F.init_check()
@@ -0,0 +1,165 @@
+import json5
+import math
+import argparse
+import pandas as pd
+from typing import Callable, Dict, Iterable, List
+from Calculator import *
+
+
+class StreamEngine:
+    """
+    盘中实时因子引擎: 逐根(或按微批)接收分钟K线, 按标的维护classFunc中间列与因子的增量状态, 每根K线后发布更新的因子值
+    1. 因子定义与批量计算相同(factor_cfg/class_cfg中的函数名), 流式实现见func/streamFunc.py; 只使用分钟频数据表(dataPath)的K线,
+       同一根K线上每个class的classFunc只执行一次
+    2. 输入为分钟频数据表原始字段名称的DataFrame(与数据库/本地文件一致), 按时间顺序逐行处理;
+       on_bars处理一个微批, run消费Python迭代器(本地替代), subscribe订阅DolphinDB流数据表
+    3. 发布: on_bars返回本批K线更新的因子值{因子名: DataFrame[symbol, TradeDate, TradeTime, factor, 因子名]},
+       需要截面填充的因子(fill)使用当前截面(当日已更新的标的)的均值填充, 收盘后的结果与批量计算一致;
+       潮汐因子与VaR因子盘中(如14:55前)即可取得当日截至最新K线的值, 不必等待收盘后批量计算
+    4. 跨日状态(如ret240需要前240根K线)需要先用warmup回放历史K线
+    5. 依赖其他因子的因子(如由family模板展开的滚动统计因子)不支持流式计算: 用户直接请求(factor_need)时init抛出异常,
+       仅作为其他因子的依赖被展开时跳过
+    """
+    def __init__(self, calculator: FactorCalculator, func_map: Dict, dataPath: str = "stockMin1KBar", onUpdate: Callable = None):
+        self.calculator = calculator
+        self.func_map = func_map
+        self.dataPath = dataPath
+        self.onUpdate = onUpdate    # 每个微批处理完毕后的回调: onUpdate(因子更新字典)
+        self.symbolCol = calculator.symbolCol
+        self.dateCol = calculator.dateCol
+        self.timeCol = calculator.timeCol
+        self.stateDict = {}     # 标的: 该标的的增量状态
+        self.valueDict = {}     # 因子名: {标的: (日期, 时间, 最新因子值, 是否截面填充)}
+        self.factorList = []
+        self.classDict = {}     # 因子名: 该因子所属class的classFunc列表
+        self.nameDict = {}      # 原始字段名称: 标准字段名称
+
+    def init(self):
+        """
+        检查因子配置, 确定需要流式计算的因子及其classFunc
+        注: 依赖其他因子的因子暂不支持流式计算, 用户请求的因子中包含时抛出NotImplementedError, 否则跳过并提示
+        """
+        self.calculator.init_check()
+        self.factorList = [factor for factor in self.calculator.sort_factorsGivenDependency(self.calculator.factor_list)
+                           if self.calculator.factor_cfg[factor]["dataPath"][:1] == [self.dataPath]]
+        dependList = [factor for factor in self.factorList if self.calculator.factor_cfg[factor]["dependency"]["factor"]]
+        needList = [factor for factor in dependList if factor in self.calculator.factor_need]
+        if needList:
+            raise NotImplementedError(f"流式引擎暂不支持依赖其他因子的因子{needList}, 请使用批量计算")
+        if dependList:
+            print(f"流式引擎暂不支持依赖其他因子的因子, 跳过: {dependList}")
+            self.factorList = [factor for factor in self.factorList if factor not in dependList]
+        for factor in self.factorList:
+            cfg = self.calculator.factor_cfg[factor]
+            self.get_func(cfg["calFunc"])
+            self.classDict[factor] = [self.get_func(funcName) for funcName in self.calculator.class_cfg.get(cfg["class"]) or []]
+        cfg = self.calculator.indicator_cfg[self.dataPath]
+        self.nameDict = {cfg["dateCol"]: self.dateCol, cfg["timeCol"]: self.timeCol, cfg["symbolCol"]: self.symbolCol}
+        self.nameDict.update({value: key for key, value in cfg["indicator"].items()})
+        self.stateDict, self.valueDict = {}, {factor: {} for factor in self.factorList}
+        print(f"流式引擎: 数据表{self.dataPath}, 因子{self.factorList}")
+
+    def get_func(self, funcName: str):
+        if funcName not in self.func_map:
+            raise NotImplementedError(f"流式引擎未实现函数{funcName}")
+        return self.func_map[funcName]
+
+    def on_bars(self, bars: pd.DataFrame, publish: bool = True) -> Dict[str, pd.DataFrame]:
+        """
+        处理一个微批的K线(可以只有一根), 返回本批更新的因子值
+        publish: 是否发布(warmup回放历史时为False)
+        """
+        bars = bars.rename(columns=self.nameDict)
+        bars[self.dateCol] = pd.to_datetime(bars[self.dateCol].astype(str))
+        updateDict = {factor: [] for factor in self.factorList}
+        for bar in bars.to_dict("records"):
+            state = self.stateDict.setdefault(bar[self.symbolCol], {})
+            classList = []
+            for factor in self.factorList:
+                for classFunc in self.classDict[factor]:
+                    if classFunc not in classList:  # 同一根K线上每个classFunc只执行一次
+                        classList.append(classFunc)
+                        classFunc(self, state, bar)
+                res = self.get_func(self.calculator.factor_cfg[factor]["calFunc"])(self, state, bar, factor,
+                                                                                    self.calculator.factor_cfg[factor])
+                self.valueDict[factor][bar[self.symbolCol]] = (bar[self.dateCol], bar[self.timeCol], res["value"], res["fill"])
+                updateDict[factor].append(bar[self.symbolCol])
+        if not publish:
+            return {}
+        resDict = {factor: self.snapshot(factor, symbolList) for factor, symbolList in updateDict.items()}
+        if self.onUpdate:
+            self.onUpdate(resDict)
+        return resDict
+
+    def snapshot(self, factorName: str, symbolList: List = None) -> pd.DataFrame:
+        """
+        因子的最新值(symbolList给定时只返回这些标的), 格式与批量计算一致: symbol, TradeDate, TradeTime, factor, 因子名
+        需要截面填充的因子使用最新日期截面的均值填充空值
+        """
+        valueDict = self.valueDict[factorName]
+        data = pd.DataFrame([(symbol, date, time, value, fill) for symbol, (date, time, value, fill) in valueDict.items()],
+                            columns=[self.symbolCol, self.dateCol, self.timeCol, factorName, "fill"])
+        if data.empty:
+            return data.drop(columns="fill").assign(factor=factorName)
+        data = data[data[self.dateCol] == data[self.dateCol].max()]  # 当日已更新的标的构成截面
+        data[factorName] = data[factorName].astype(float).replace([math.inf, -math.inf], math.nan)
+        if data["fill"].any():
+            data[factorName] = data[factorName].fillna(data[factorName].mean())
+        if symbolList is not None:
+            data = data[data[self.symbolCol].isin(symbolList)]
+        data = data.assign(factor=factorName)
+        return data[[self.symbolCol, self.dateCol, self.timeCol, "factor", factorName]].reset_index(drop=True)
+
+    def warmup(self, bars: pd.DataFrame):
+        """回放历史K线以建立跨日状态, 不发布"""
+        self.on_bars(bars, publish=False)
+
+    def run(self, barIterator: Iterable[pd.DataFrame]):
+        """本地替代: 逐个消费微批(DataFrame)的迭代器, 每个微批处理完毕后产出本批更新的因子值"""
+        for bars in barIterator:
+            yield self.on_bars(bars)
+
+    def subscribe(self, session: ddb.session, host: str, port: int, tableName: str, actionName: str = "factorStream",
+                  batchSize: int = 5000, throttle: float = 1, outputTable: str = None):
+        """
+        订阅DolphinDB流数据表(字段与分钟频数据表一致), 按batchSize/throttle聚合为微批处理
+        outputTable: 给定时将更新的因子值(symbol, TradeDate, TradeTime, factor, value)写入该流数据表
+        """
+        def handler(bars: pd.DataFrame):
+            resDict = self.on_bars(bars)
+            dataList = [res.rename(columns={factor: "value"}) for factor, res in resDict.items() if not res.empty]
+            if outputTable and dataList:
+                session.run(f"tableInsert{{{outputTable}}}", pd.concat(dataList, ignore_index=True))
+        session.enableStreaming()
+        session.subscribe(host, port, handler, tableName, actionName, offset=-1, resub=True,
+                          msgAsTable=True, batchSize=batchSize, throttle=throttle)
+        print(f"流式引擎已订阅{tableName}@{host}:{port}")
+
+
+if __name__ == "__main__":
+    from func import streamFunc
+    parser = argparse.ArgumentParser(description="使用本地分钟K线文件回放流式因子计算")
+    parser.add_argument("barsPath", help="分钟频数据表文件(csv), 字段与indicator_cfg中的分钟频数据表一致")
+    parser.add_argument("--factors", nargs="+", default=["shio", "shioStrong", "shioWeak", "vaR240_m120", "cvaR240_m120"],
+                        help="需要流式计算的因子")
+    args = parser.parse_args()
+    with open(r".\config\factor.json5", "r",encoding='utf-8') as f:
+        factor_cfg = json5.load(f)
+    with open(r".\config\indicator.json5","r",encoding='utf-8') as f:
+        indicator_cfg = json5.load(f)
+    with open(r".\config\class.json5","r",encoding='utf-8') as f:
+        class_cfg = json5.load(f)
+    func_map = get_funcMapFromImport(streamFunc)
+    F = FactorCalculator(session=None, config=config,
+                         factor_cfg=factor_cfg,
+                         indicator_cfg=indicator_cfg,
+                         func_map=func_map,
+                         class_cfg=class_cfg)
+    F.set_factorList(factor_list=args.factors)
+    engine = StreamEngine(F, func_map)
+    engine.init()
+    bars = pd.read_csv(args.barsPath)
+    for res in engine.run(data for _, data in bars.groupby(["TradeDate", "TradeTime"], sort=True)):   # 按分钟切分的微批
+        pass
+    for factor in engine.factorList:
+        print(engine.snapshot(factor))
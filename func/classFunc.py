@@ -14,7 +14,7 @@ def shioDataPrepare(self: FactorCalculator) -> Dict:
     update {self.sourceObj} set vwap = nullFill!({amountCol}\{volumeCol},0.0);
     update {self.sourceObj} set mVol = msum({volumeCol},9) context by {self.symbolCol}, {self.dateCol};
     update {self.sourceObj} set mVol = move(mVol,4) context by {self.symbolCol}, {self.dateCol};
-    """, "columns": ["vwap","mVol"], "vars":None}
+    """, "columns": ["vwap","mVol"], "reads": [volumeCol, amountCol], "vars":None}
 
 def vaRDataPrepare(self: FactorCalculator) -> Dict:
     """VaR因子数据准备函数"""
@@ -22,10 +22,9 @@ def vaRDataPrepare(self: FactorCalculator) -> Dict:
     volumeCol = "stockMin1KBar_volume"
     amountCol = "stockMin1KBar_amount"
     return {"cmd": f"""
-    varFunc = valueAtRisk{{,'normal',0.95}};
-    cvarFunc = condValueAtRisk{{, 'normal',0.95}};
     update {self.sourceObj} set vwap = nullFill!({amountCol}/{volumeCol},0);
     update {self.sourceObj} set ret240 = nullFill(({closeCol}-move({closeCol},240))/{closeCol},0.0) context by {self.symbolCol};
     update {self.sourceObj} set ret240 = clip(ret240,-0.99,0.99);
-    """}
+    """, "columns": ["vwap","ret240"], "reads": [closeCol, volumeCol, amountCol],
+        "callBackPeriod": 240}
 
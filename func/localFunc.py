@@ -0,0 +1,258 @@
+"""
+本地NumPy/pandas版本的classFunc/calFunc, 供CalculatorLocal.LocalBackend使用
+注: 函数名与DolphinDB版本保持一致(由factor_cfg/class_cfg中的函数名索引), 传入的self为LocalBackend,
+    calFunc固定格式: self: LocalBackend, factorName: str, feature: Dict, 返回(symbol, TradeDate, factor, factorName)的DataFrame
+"""
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+from typing import Dict
+
+
+# ---------------------------------------- 基础函数(对应func/utilFunc.py) ----------------------------------------
+def crossFill(self, data: pd.DataFrame, factorName: str) -> pd.DataFrame:
+    """截面空缺值均值填充"""
+    data[factorName] = data[factorName].fillna(data.groupby(self.dateCol)[factorName].transform("mean"))
+    return data
+
+def toFactor(self, df: pd.DataFrame, factorName: str, fill: bool = True) -> pd.DataFrame:
+    """整理为 symbol, TradeDate, factor, factorName 格式的因子表, 除零得到的inf按DolphinDB处理为空值"""
+    data = pd.DataFrame({self.symbolCol: df[self.symbolCol].values,
+                         self.dateCol: df[self.dateCol].values,
+                         "factor": factorName,
+                         factorName: df[factorName].replace([np.inf, -np.inf], np.nan).values})
+    if fill:
+        data = crossFill(self, data, factorName)
+    return data
+
+def nullLess(x, y) -> np.ndarray:
+    """x<y, DolphinDB比较运算中空值视为最小值"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return np.where(np.isnan(x), ~np.isnan(y), np.where(np.isnan(y), False, x < y))
+
+def rolling(self, df: pd.DataFrame, col: str, k: int, func: str) -> pd.Series:
+    """按symbol分组的滑动窗口统计, 窗口内非空值数量不足k时为空值(与DolphinDB mavg/mstd/msum一致)"""
+    res = getattr(df.groupby(self.symbolCol, sort=False)[col].rolling(k, min_periods=k), func)()
+    return res.reset_index(level=0, drop=True).reindex(df.index)
+
+def mstd(self, factorName: str, dependFactor: str, k: int) -> pd.DataFrame:
+    middle = self.factorDict[dependFactor]
+    middle = middle.assign(**{factorName: rolling(self, middle, dependFactor, k, "std")})
+    return toFactor(self, middle, factorName)
+
+def mavg(self, factorName: str, dependFactor: str, k: int) -> pd.DataFrame:
+    middle = self.factorDict[dependFactor]
+    middle = middle.assign(**{factorName: rolling(self, middle, dependFactor, k, "mean")})
+    return toFactor(self, middle, factorName)
+
+def reverse(self, factorName: str, dependFactor: list) -> pd.DataFrame:
+    dependFactor0, dependFactor1 = dependFactor[0], dependFactor[1]
+    middle = self.factorDict[dependFactor0].merge(self.factorDict[dependFactor1][[self.symbolCol, self.dateCol, dependFactor1]],
+                                                  on=[self.symbolCol, self.dateCol], how="left")
+    cond = nullLess(middle[dependFactor1], middle.groupby(self.dateCol)[dependFactor1].transform("mean"))
+    middle[factorName] = np.where(cond, -1.0 * middle[dependFactor0], 0.0)
+    return toFactor(self, middle, factorName)
+
+def umr(self, factorName: str, dependFactor: list, k: int) -> pd.DataFrame:
+    returnFactor, riskFactor = dependFactor[0], dependFactor[1]
+    middle = self.factorDict[returnFactor].merge(self.factorDict[riskFactor][[self.symbolCol, self.dateCol, riskFactor]],
+                                                 on=[self.symbolCol, self.dateCol], how="left")
+    middle["riskReturn"] = middle[riskFactor] * middle[returnFactor]
+    middle[factorName] = rolling(self, middle, "riskReturn", k, "sum")
+    return toFactor(self, middle, factorName)
+
+def get_family(self, factorName: str, feature: Dict, **args) -> pd.DataFrame:
+    """因子族成员(由factor_cfg中的family模板展开), pandas的滚动窗口本身即为增量计算"""
+    params = feature["params"]
+    transform = {"avg": mavg, "std": mstd}[params["transform"]]
+    return transform(self, factorName, feature["dependency"]["factor"][0], k=params["window"])
+
+def prev(self, df: pd.DataFrame, col: str) -> pd.Series:
+    """按symbol分组的前一期值"""
+    return df.groupby(self.symbolCol, sort=False)[col].shift(1)
+
+
+# ---------------------------------------- classFunc(对应func/classFunc.py) ----------------------------------------
+def shioDataPrepare(self):
+    """潮汐因子数据准备函数"""
+    volumeCol = "stockMin1KBar_volume"
+    amountCol = "stockMin1KBar_amount"
+    df = self.sourceObj
+    df["vwap"] = (df[amountCol] / df[volumeCol]).replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    group = df.groupby([self.symbolCol, self.dateCol], sort=False)[volumeCol]
+    df["mVol"] = group.rolling(9, min_periods=9).sum().reset_index(level=[0, 1], drop=True).reindex(df.index)
+    df["mVol"] = df.groupby([self.symbolCol, self.dateCol], sort=False)["mVol"].shift(4)
+    return {"columns": ["vwap", "mVol"]}
+
+def vaRDataPrepare(self):
+    """VaR因子数据准备函数"""
+    closeCol = "stockMin1KBar_close"
+    volumeCol = "stockMin1KBar_volume"
+    amountCol = "stockMin1KBar_amount"
+    df = self.sourceObj
+    df["vwap"] = (df[amountCol] / df[volumeCol]).replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    close = df[closeCol]
+    df["ret240"] = ((close - df.groupby(self.symbolCol, sort=False)[closeCol].shift(240)) / close).fillna(0.0)
+    df["ret240"] = df["ret240"].clip(-0.99, 0.99)
+    return {"columns": ["vwap", "ret240"]}
+
+
+# ---------------------------------------- 潮汐因子(对应func/shioMidFunc.py+func/shioCalFunc.py) ----------------------------------------
+def shioKernel(mvol: np.ndarray, price: np.ndarray, start: np.ndarray):
+    """
+    向量化计算每个(TradeDate, symbol)分组的潮汐位置
+    start: 每个分组的起始行号(数据已按分组连续排列)
+    return: idx_max, idx_m, idx_n(相对price[idx_max+1:]的位置, 与DolphinDB defg版本一致), 以及每个分组的长度
+    注: 空切片/全空值时imax/imin返回-1, 与DolphinDB一致
+    """
+    n = len(mvol)
+    length = np.diff(np.append(start, n))
+    group = np.repeat(np.arange(len(start)), length)
+    pos = np.arange(n) - start[group]
+
+    def first_extreme(values: np.ndarray, mask: np.ndarray, mode: str):
+        """分组内满足mask的第一个最大/最小值位置, 无有效值时返回-1"""
+        valid = mask & ~np.isnan(values)
+        fill = -np.inf if mode == "max" else np.inf
+        v = np.where(valid, values, fill)
+        ufunc = np.maximum if mode == "max" else np.minimum
+        extreme = ufunc.reduceat(v, start)
+        hit = valid & (v == extreme[group])
+        idx = np.minimum.reduceat(np.where(hit, pos, n), start)
+        return np.where(idx == n, -1, idx)
+
+    idx_max = first_extreme(mvol, np.ones(n, dtype=bool), "max")
+    idx_m = first_extreme(price, pos < idx_max[group], "min")
+    idx_n = first_extreme(price, (pos > idx_max[group]) & (idx_max[group] >= 0), "min")
+    idx_n = np.where(idx_n >= 0, idx_n - idx_max - 1, -1)
+    return idx_max, idx_m, idx_n, length
+
+def shioTake(values: np.ndarray, start: np.ndarray, length: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """取每个分组内第idx个元素, 越界时为空值(与DolphinDB下标越界返回NULL一致)"""
+    valid = (idx >= 0) & (idx < length)
+    res = np.full(len(idx), np.nan)
+    res[valid] = values[start[valid] + idx[valid]]
+    return res
+
+def shioPrepare(self, closeCol: str):
+    """按(TradeDate, symbol)分组排列数据, 返回分组键与潮汐位置"""
+    df = self.sourceObj.sort_values([self.dateCol, self.symbolCol], kind="stable")
+    keys = df[[self.dateCol, self.symbolCol]]
+    start = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).values)
+    mvol = df["mVol"].values.astype(float)
+    price = df[closeCol].values.astype(float)
+    idx_max, idx_m, idx_n, length = shioKernel(mvol, price, start)
+    res = keys.iloc[start].reset_index(drop=True)
+    Cmax = shioTake(price, start, length, idx_max)
+    Cm, Cn = shioTake(price, start, length, idx_m), shioTake(price, start, length, idx_n)
+    Vm, Vn = shioTake(mvol, start, length, idx_m), shioTake(mvol, start, length, idx_n)
+    return res, idx_max, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn
+
+def get_shio(self, factorName: str, feature: Dict, **args):
+    res, idx_max, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioPrepare(self, "stockMin1KBar_close")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res[factorName] = (Cn - Cm) / Cm / (idx_n - idx_m)
+    return toFactor(self, res, factorName)
+
+def get_shioStrong(self, factorName: str, feature: Dict = None, **args):
+    res, idx_max, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioPrepare(self, "stockMin1KBar_close")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res[factorName] = np.where(nullLess(Vm, Vn), (Cmax - Cm) / Cm / (idx_max - idx_m), (Cn - Cmax) / Cmax / (idx_n - idx_max))
+    return toFactor(self, res, factorName)
+
+def get_shioWeak(self, factorName: str, feature: Dict, **args):
+    res, idx_max, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioPrepare(self, "stockMin1KBar_close")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res[factorName] = np.where(nullLess(Vn, Vm), (Cmax - Cm) / Cm / (idx_max - idx_m), (Cn - Cmax) / Cmax / (idx_n - idx_max))
+    return toFactor(self, res, factorName)
+
+
+# ---------------------------------------- VaR因子(对应func/varCalFunc.py) ----------------------------------------
+def vaR(self, factorName: str, feature: Dict, conditional: bool = False) -> pd.DataFrame:
+    """滚动VaR/CVaR(损失为正), normal为滚动均值/标准差的闭式解, historical为滚动分位数(CVaR为尾部均值)"""
+    params = feature["params"]
+    method, confidence, window = params.get("method", "normal"), params.get("confidence", 0.95), params.get("window", 120)
+    df = self.sourceObj
+    roll = df.groupby(self.symbolCol, sort=False)["ret240"].rolling(window, min_periods=1)
+    if method == "normal":
+        z = NormalDist().inv_cdf(1 - confidence)
+        scale = NormalDist().pdf(z) / (1 - confidence) if conditional else -z
+        res = -roll.mean() + scale * roll.std()
+    elif method == "historical":
+        if conditional:
+            res = -roll.apply(lambda x: x[x <= np.quantile(x, 1 - confidence)].mean(), raw=True)
+        else:
+            res = -roll.quantile(1 - confidence, interpolation="linear")
+    else:
+        raise ValueError(f"不支持的VaR计算方法{method}, 可选normal/historical")
+    middle = df.assign(**{factorName: res.reset_index(level=0, drop=True).reindex(df.index)})
+    data = toFactor(self, middle, factorName, fill=False)
+    data.insert(2, self.timeCol, middle[self.timeCol].values)  # 分钟频因子保留K线时间
+    return data
+
+def get_vaR240_m120(self, factorName: str, feature: Dict, **args):
+    return vaR(self, factorName, feature)
+
+def get_cvaR240_m120(self, factorName: str, feature: Dict, **args):
+    return vaR(self, factorName, feature, conditional=True)
+
+
+# ---------------------------------------- 股票因子(对应func/coinCalFunc.py) ----------------------------------------
+def get_interDayReturn(self, factorName: str, feature: Dict, **args):
+    """过去一天的隔夜收益率,今日open-昨日close"""
+    df = self.sourceObj
+    prevClose = prev(self, df, "stockDayKBar_close")
+    df = df.assign(**{factorName: ((df["stockDayKBar_open"] - prevClose) / prevClose).fillna(0.0)})
+    return toFactor(self, df, factorName)
+
+def get_intraDayReturn(self, factorName: str, feature: Dict, **args):
+    """过去一天的日内收益率"""
+    df = self.sourceObj
+    prevClose, prevOpen = prev(self, df, "stockDayKBar_close"), prev(self, df, "stockDayKBar_open")
+    df = df.assign(**{factorName: ((prevClose - prevOpen) / prevClose).fillna(0.0)})
+    return toFactor(self, df, factorName)
+
+def get_intraDayTurnoverRateDiff(self, factorName: str, feature: Dict, **args):
+    df = self.sourceObj
+    turnoverRateCol = "stockBasic_turnoverRate"
+    df = df.assign(**{factorName: (df[turnoverRateCol] - prev(self, df, turnoverRateCol)).fillna(0.0)})
+    return toFactor(self, df, factorName)
+
+def get_interDayReturnReverse(self, factorName: str, feature: Dict, **args):
+    return reverse(self, factorName, feature["dependency"]["factor"])
+
+get_intraDayReturnReverse = get_intraDayTurnoverRateDiffReverse = get_interDayReturnReverse
+
+
+# ---------------------------------------- UMR因子(对应func/umrCalFunc.py) ----------------------------------------
+def get_dayOverBenchRet(self, factorName: str, feature: Dict, **args):
+    """日内收益率"""
+    df = self.sourceObj
+    openCol, closeCol = "stockDayKBar_open", "stockDayKBar_close"
+    df = df.assign(**{factorName: ((df[closeCol] - df[openCol]) / df[openCol] - df["stockDayIndex_pctChg"] / 100.0).fillna(0.0)})
+    return toFactor(self, df, factorName, fill=False)
+
+def get_riskTR(self, factorName: str, feature: Dict, **args):
+    """日度TR真实波动"""
+    df = self.sourceObj
+    prevClose = prev(self, df, "stockDayKBar_close")
+    high, low = df["stockDayKBar_high"], df["stockDayKBar_low"]
+    tr = pd.concat([high - low, (high - prevClose).abs(), (low - prevClose).abs()], axis=1).max(axis=1)
+    df = df.assign(**{factorName: tr / prevClose})
+    return toFactor(self, df, factorName)
+
+def get_adjRiskTR10(self, factorName: str, feature: Dict, **args):
+    """调整后的日度TR真实波动"""
+    return mavg(self, factorName, feature["dependency"]["factor"][0], k=10)
+
+def get_riskTurnoverRate(self, factorName: str, feature: Dict, **args):
+    """日度换手率风险"""
+    df = self.sourceObj
+    df = df.assign(**{factorName: df["stockBasic_turnoverRate"]})
+    return toFactor(self, df, factorName)
+
+def get_umrTR10(self, factorName: str, feature: Dict, **args):
+    """TR衡量的UMR"""
+    return umr(self, factorName, dependFactor=feature["dependency"]["factor"], k=10)
+
+get_umrTurnoverRate10 = get_umrTR10
@@ -4,113 +4,27 @@
 from Calculator import FactorCalculator
 from typing import Dict
 
-def get_shio(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    closeCol = "stockMin1KBar_close"
-    return f"""
-    {self.middleObj} = select shioFunc(mVol, {closeCol}) as {factorName} from {self.sourceObj} 
-                        group by {self.dateCol}, {self.symbolCol} order by {self.dateCol};
-    // dateCol,symbolCol,factorName
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
-
-def get_shio_avg20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]   # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mavg({dependFactor},20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
+def shio(self: FactorCalculator, feature: Dict, defgFunc: str, segmentExpr: str):
     """
-
-def get_shio_std20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]  # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mstd({dependFactor},20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
+    潮汐类因子: midFunc为shioSegment时从向量化分段统计量shioTb中select, 否则按(日期, 标的)分组调用defg函数
     """
-
-def get_shioStrong(self: FactorCalculator, factorName: str, **args):
     closeCol = "stockMin1KBar_close"
-    return f"""
-    {self.middleObj} = select shioStrongFunc(mVol, {closeCol}) as {factorName} from {self.sourceObj} 
-                        group by {self.dateCol}, {self.symbolCol} order by {self.dateCol};
-    // dateCol,symbolCol,factorName
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
+    if "shioSegment" in (feature["dependency"]["midFunc"] or []):
+        return {"select": segmentExpr,
+                "from": "shioTb",
+                "by": f"order by {self.dateCol}",
+                "fill": True}
+    return {"select": f"{defgFunc}(mVol, {closeCol})",
+            "from": self.sourceObj,
+            "by": f"group by {self.dateCol}, {self.symbolCol} order by {self.dateCol}",
+            "fill": True,
+            "reads": ["mVol", closeCol]}
 
-def get_shioStrong_avg20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]   # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mavg({dependFactor},20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
+def get_shio(self: FactorCalculator, factorName: str, feature: Dict, **args):
+    return shio(self, feature, "shioFunc", "(Cn-Cm)\\Cm\\(idxN-idxM)")
 
-def get_shioStrong_std20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]  # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mstd({dependFactor},20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
+def get_shioStrong(self: FactorCalculator, factorName: str, feature: Dict, **args):
+    return shio(self, feature, "shioStrongFunc", "iif(Vm<Vn, (Cmax-Cm)\\Cm\\(idxMax-idxM), (Cn-Cmax)\\Cmax\\(idxN-idxMax))")
 
 def get_shioWeak(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    closeCol = "stockMin1KBar_close"
-    return f"""
-    {self.middleObj} = select shioWeakFunc(mVol, {closeCol}) as {factorName} from {self.sourceObj} 
-                        group by {self.dateCol}, {self.symbolCol} order by {self.dateCol};
-    // dateCol,symbolCol,factorName
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
-
-def get_shioWeak_avg20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]   # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mavg({dependFactor}, 20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕")
-    """
-
-def get_shioWeak_std20(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    dependFactor = feature["dependency"]["factor"][0]   # 依赖计算的因子
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mstd({dependFactor}, 20) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕")
-    """
\ No newline at end of file
+    return shio(self, feature, "shioWeakFunc", "iif(Vm>Vn, (Cmax-Cm)\\Cm\\(idxMax-idxM), (Cn-Cmax)\\Cmax\\(idxN-idxMax))")
\ No newline at end of file
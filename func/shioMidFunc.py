@@ -57,3 +57,23 @@ def shioWeakFunc(self: FactorCalculator) -> Dict:
     ""","var":None}
 
 
+def shioSegment(self: FactorCalculator) -> Dict:
+    """
+    潮汐因子的向量化分段计算: 不再逐个(日期, 标的)分组调用defg函数, 而是对整张分钟表执行三次分组向量运算,
+    一次得到潮汐/涨潮半潮汐/退潮半潮汐共用的分段统计量shioTb(每个日期+标的一行)
+    1. context by求组内行号pos与成交量峰值位置idxMax(imax, 首个最大值)
+    2. 将峰值前/后的价格以外的位置置空, 再context by求imin, 即峰值前的价格最低点idxM与峰值后的价格最低点idxN
+       注: 与defg版本一致, idxN为相对于峰值后切片的位置, 取价格/成交量时按组内绝对位置取值
+    3. group by按位置取出Cmax/Cm/Cn/Vm/Vn(位置越界或为-1时为空值, 与defg版本的下标越界取值一致)
+    calFunc从shioTb中select因子表达式(按日期排序), 结果与shioFunc/shioStrongFunc/shioWeakFunc相同, 对比见tests/test_shio_segment.py
+    """
+    closeCol = "stockMin1KBar_close"
+    return {"cmd": f"""
+    shioTb = select {self.symbolCol}, {self.dateCol}, mVol, {closeCol} as price, rowNo(mVol) as pos, imax(mVol) as idxMax from {self.sourceObj} context by {self.dateCol}, {self.symbolCol};
+    update shioTb set idxM = imin(iif(pos<idxMax, price, NULL)), idxN = imin(iif(pos>idxMax, price, NULL)) context by {self.dateCol}, {self.symbolCol};
+    update shioTb set idxN = iif(idxN<0, -1, idxN-idxMax-1);
+    shioTb = select first(idxMax) as idxMax, first(idxM) as idxM, first(idxN) as idxN,
+                    max(iif(pos==idxMax, price, NULL)) as Cmax, max(iif(pos==idxM, price, NULL)) as Cm, max(iif(pos==idxN, price, NULL)) as Cn,
+                    max(iif(pos==idxM, mVol, NULL)) as Vm, max(iif(pos==idxN, mVol, NULL)) as Vn
+             from shioTb group by {self.dateCol}, {self.symbolCol};
+    """, "reads": ["mVol", closeCol]}
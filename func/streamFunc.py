@@ -0,0 +1,160 @@
+"""
+流式(逐K线)版本的classFunc/calFunc, 供CalculatorStream.StreamEngine使用
+注: 函数名与DolphinDB版本保持一致(由factor_cfg/class_cfg中的函数名索引), 传入的self为StreamEngine,
+    state为该标的的增量状态(dict, 各函数以自己的键保存状态), bar为当前K线(标准字段名称: 数据表名_指标名)
+    classFunc固定格式: self, state: Dict, bar: Dict, 将生成的中间列写入bar
+    calFunc固定格式: self, state: Dict, bar: Dict, factorName: str, feature: Dict, 返回{"value": 因子值, "fill": 是否截面填充}
+    每根K线的计算量与历史长度无关, 结果与批量计算(func/localFunc.py)一致
+"""
+import math
+from collections import deque
+from statistics import NormalDist
+from typing import Dict
+
+
+def isnan(x) -> bool:
+    return x is None or (isinstance(x, float) and math.isnan(x))
+
+def div(x: float, y: float) -> float:
+    """除法, 空值或除零时为空值(与DolphinDB一致)"""
+    if isnan(x) or isnan(y) or y == 0:
+        return math.nan
+    return x / y
+
+def nullLess(x: float, y: float) -> bool:
+    """x<y, DolphinDB比较运算中空值视为最小值"""
+    if isnan(x):
+        return not isnan(y)
+    return False if isnan(y) else x < y
+
+def new_day(state: Dict, key: str, date) -> bool:
+    """该标的进入新的交易日时返回True(按日重置的状态使用)"""
+    if state.get(key) != date:
+        state[key] = date
+        return True
+    return False
+
+
+# ---------------------------------------- classFunc(对应func/classFunc.py) ----------------------------------------
+def shioDataPrepare(self, state: Dict, bar: Dict):
+    """潮汐因子数据准备函数: vwap, mVol = move(msum(volume,9),4) context by symbol, TradeDate"""
+    volume, amount = bar["stockMin1KBar_volume"], bar["stockMin1KBar_amount"]
+    bar["vwap"] = div(amount, volume)
+    bar["vwap"] = 0.0 if isnan(bar["vwap"]) else bar["vwap"]
+    if new_day(state, "shioDataPrepare.date", bar[self.dateCol]):
+        state["volume9"] = deque(maxlen=9)     # 最近9根K线的成交量
+        state["msum9"] = deque(maxlen=5)       # 最近5根K线的msum(volume,9)
+    state["volume9"].append(volume)
+    volume9 = state["volume9"]
+    state["msum9"].append(sum(volume9) if len(volume9) == 9 and not any(isnan(v) for v in volume9) else math.nan)
+    bar["mVol"] = state["msum9"][0] if len(state["msum9"]) == 5 else math.nan
+
+def vaRDataPrepare(self, state: Dict, bar: Dict):
+    """VaR因子数据准备函数: vwap, ret240 = clip((close-move(close,240))/close, -0.99, 0.99) context by symbol"""
+    close, volume, amount = bar["stockMin1KBar_close"], bar["stockMin1KBar_volume"], bar["stockMin1KBar_amount"]
+    bar["vwap"] = div(amount, volume)
+    bar["vwap"] = 0.0 if isnan(bar["vwap"]) else bar["vwap"]
+    close240 = state.setdefault("close240", deque(maxlen=241))   # 跨日保存最近241根K线的收盘价
+    close240.append(close)
+    ret240 = div(close - close240[0], close) if len(close240) == 241 else math.nan
+    bar["ret240"] = 0.0 if isnan(ret240) else min(max(ret240, -0.99), 0.99)
+
+
+# ---------------------------------------- 潮汐因子(对应func/shioMidFunc.py+func/shioCalFunc.py) ----------------------------------------
+def shioUpdate(self, state: Dict, bar: Dict) -> Dict:
+    """
+    潮汐分段状态的O(1)更新(每根K线只更新一次, 三个潮汐因子共用):
+    price/mvol: 当日序列; peak: 成交量峰值位置(首个最大值); prefMin: 每个位置之前(含)的价格最低点位置;
+    postMin: 峰值之后的价格最低点位置(峰值移动时清空)
+    """
+    if new_day(state, "shio.date", bar[self.dateCol]):
+        state["shio"] = {"price": [], "mvol": [], "prefMin": [], "peak": -1, "postMin": -1, "bar": None}
+    shio = state["shio"]
+    if shio["bar"] is bar:
+        return shio
+    shio["bar"] = bar
+    price, mvol = shio["price"], shio["mvol"]
+    p, v = bar["stockMin1KBar_close"], bar["mVol"]
+    i = len(price)
+    price.append(p)
+    mvol.append(v)
+    last = shio["prefMin"][-1] if shio["prefMin"] else -1
+    shio["prefMin"].append(i if not isnan(p) and (last < 0 or p < price[last]) else last)
+    if not isnan(v) and (shio["peak"] < 0 or v > mvol[shio["peak"]]):
+        shio["peak"], shio["postMin"] = i, -1
+    elif shio["peak"] >= 0 and not isnan(p) and (shio["postMin"] < 0 or p < price[shio["postMin"]]):
+        shio["postMin"] = i
+    return shio
+
+def shioStats(self, state: Dict, bar: Dict):
+    """当前的潮汐位置与取值, 与shioSegment一致: idx_n为相对峰值后切片的位置, 取值时按当日绝对位置"""
+    shio = shioUpdate(self, state, bar)
+    price, mvol, peak = shio["price"], shio["mvol"], shio["peak"]
+    at = lambda values, idx: values[idx] if 0 <= idx < len(values) else math.nan
+    idx_m = shio["prefMin"][peak - 1] if peak >= 1 else -1
+    idx_n = shio["postMin"] - peak - 1 if shio["postMin"] >= 0 else -1
+    return peak, idx_m, idx_n, at(price, peak), at(price, idx_m), at(price, idx_n), at(mvol, idx_m), at(mvol, idx_n)
+
+def get_shio(self, state: Dict, bar: Dict, factorName: str, feature: Dict):
+    peak, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioStats(self, state, bar)
+    value = div(div(Cn - Cm, Cm), idx_n - idx_m) if peak >= 0 else math.nan
+    return {"value": value, "fill": True}
+
+def get_shioStrong(self, state: Dict, bar: Dict, factorName: str, feature: Dict):
+    peak, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioStats(self, state, bar)
+    if peak < 0:
+        return {"value": math.nan, "fill": True}
+    value = div(div(Cmax - Cm, Cm), peak - idx_m) if nullLess(Vm, Vn) else div(div(Cn - Cmax, Cmax), idx_n - peak)
+    return {"value": value, "fill": True}
+
+def get_shioWeak(self, state: Dict, bar: Dict, factorName: str, feature: Dict):
+    peak, idx_m, idx_n, Cmax, Cm, Cn, Vm, Vn = shioStats(self, state, bar)
+    if peak < 0:
+        return {"value": math.nan, "fill": True}
+    value = div(div(Cmax - Cm, Cm), peak - idx_m) if nullLess(Vn, Vm) else div(div(Cn - Cmax, Cmax), idx_n - peak)
+    return {"value": value, "fill": True}
+
+
+# ---------------------------------------- VaR因子(对应func/varCalFunc.py) ----------------------------------------
+def vaR(self, state: Dict, bar: Dict, factorName: str, feature: Dict, conditional: bool = False):
+    """
+    滚动VaR/CVaR(损失为正): 窗口内容与滚动和/平方和按因子保存, normal每根K线O(1)更新;
+    滚动和每个交易日开始时由窗口内容重新求和, 避免长时间运行的累计误差
+    """
+    params = feature["params"]
+    method, confidence, window = params.get("method", "normal"), params.get("confidence", 0.95), params.get("window", 120)
+    key = f"vaR.{window}"
+    if key not in state:
+        state[key] = {"window": deque(maxlen=window), "sum": 0.0, "sum2": 0.0, "bar": None}
+    roll = state[key]
+    if new_day(state, f"{key}.date", bar[self.dateCol]):
+        roll["sum"], roll["sum2"] = math.fsum(roll["window"]), math.fsum(x * x for x in roll["window"])
+    if roll["bar"] is not bar:   # VaR与CVaR共用同一窗口, 每根K线只更新一次
+        roll["bar"] = bar
+        x = bar["ret240"]
+        if len(roll["window"]) == window:
+            old = roll["window"][0]
+            roll["sum"], roll["sum2"] = roll["sum"] - old, roll["sum2"] - old * old
+        roll["window"].append(x)
+        roll["sum"], roll["sum2"] = roll["sum"] + x, roll["sum2"] + x * x
+    n = len(roll["window"])
+    if method == "normal":
+        mean = roll["sum"] / n
+        std = math.sqrt(max(roll["sum2"] - n * mean * mean, 0.0) / (n - 1)) if n > 1 else math.nan
+        z = NormalDist().inv_cdf(1 - confidence)
+        scale = NormalDist().pdf(z) / (1 - confidence) if conditional else -z
+        value = -mean + scale * std
+    elif method == "historical":
+        values = sorted(roll["window"])
+        pos = (n - 1) * (1 - confidence)    # 线性插值的分位数(与mpercentile/pandas一致)
+        q = values[int(pos)] + (values[min(int(pos) + 1, n - 1)] - values[int(pos)]) * (pos - int(pos))
+        value = -sum(x for x in values if x <= q) / len([x for x in values if x <= q]) if conditional else -q
+    else:
+        raise ValueError(f"不支持的VaR计算方法{method}, 可选normal/historical")
+    return {"value": value, "fill": False}
+
+def get_vaR240_m120(self, state: Dict, bar: Dict, factorName: str, feature: Dict):
+    return vaR(self, state, bar, factorName, feature)
+
+def get_cvaR240_m120(self, state: Dict, bar: Dict, factorName: str, feature: Dict):
+    return vaR(self, state, bar, factorName, feature, conditional=True)
@@ -11,27 +11,18 @@ idxPctChgCol = "stockDayIndex_pctChg"  # 指数收益率
 
 def get_dayOverBenchRet(self: FactorCalculator, factorName: str, feature: Dict, **args):
     """日内收益率"""
-    return rf"""
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor, 
-                    nullFill(({closeCol}-{openCol})\{openCol}-({idxPctChgCol}\100.0),0.0) as {factorName}
-                    from {self.sourceObj}
-                    context by {self.symbolCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; 
-    print("因子{factorName}计算完毕");
-    """
+    return {"select": rf"nullFill(({closeCol}-{openCol})\{openCol}-({idxPctChgCol}\100.0),0.0)",
+            "from": self.sourceObj,
+            "by": f"context by {self.symbolCol}",
+            "reads": [closeCol, openCol, idxPctChgCol]}
 
 def get_riskTR(self: FactorCalculator, factorName: str, feature: Dict, **args):
     """日度TR真实波动"""
-    return f"""
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,
-                     byRow(max, [{highCol}-{lowCol}, abs({highCol}-prev({closeCol})), abs({lowCol}-prev({closeCol}))])\prev({closeCol}) as {factorName} 
-                     from {self.sourceObj}
-                     context by {self.symbolCol};
-    // 截面空缺值均值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName}, avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj}; 
-    print("因子{factorName}计算完毕");
-    """
+    return {"select": rf"byRow(max, [{highCol}-{lowCol}, abs({highCol}-prev({closeCol})), abs({lowCol}-prev({closeCol}))])\prev({closeCol})",
+            "from": self.sourceObj,
+            "by": f"context by {self.symbolCol}",
+            "fill": True,
+            "reads": [highCol, lowCol, closeCol]}
 
 def get_adjRiskTR10(self: FactorCalculator, factorName: str, feature: Dict, **args):
     """调整后的日度TR真实波动"""
@@ -40,14 +31,11 @@ def get_adjRiskTR10(self: FactorCalculator, factorName: str, feature: Dict, **ar
 
 def get_riskTurnoverRate(self: FactorCalculator, factorName: str, feature:Dict, **args):
     """日度换手率风险"""
-    return f"""
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,
-        {turnoverRateCol} as {factorName} from {self.sourceObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};
-    print("因子{factorName}计算完毕");
-    """
+    return {"select": turnoverRateCol,
+            "from": self.sourceObj,
+            "by": "",
+            "fill": True,
+            "reads": [turnoverRateCol]}
 
 def get_umrTR10(self: FactorCalculator, factorName: str, feature: Dict, **args):
     """TR衡量的UMR"""
@@ -3,50 +3,93 @@ from typing import Dict
 
 
 def mstd(self: FactorCalculator, factorName: str, dependFactor: str, k: int):
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mstd({dependFactor},{k}) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
+    return {"select": f"mstd({dependFactor},{k})",
+            "from": self.factor_ref(dependFactor),
+            "by": f"context by {self.symbolCol}",
+            "fill": True}
 
 def mavg(self: FactorCalculator, factorName: str, dependFactor: str, k: int):
-    return f"""
-    {self.middleObj} = {self.factorDict}["{dependFactor}"].copy();
-    update {self.middleObj} set {factorName} = mavg({dependFactor},{k}) context by {self.symbolCol};
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
-    {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
+    return {"select": f"mavg({dependFactor},{k})",
+            "from": self.factor_ref(dependFactor),
+            "by": f"context by {self.symbolCol}",
+            "fill": True}
+
+def family(self: FactorCalculator, dependFactor: str, transform: str, k: int):
     """
+    因子族共用的滚动统计内核: 每个依赖因子只生成一次前缀和表(累计和/累计平方和/累计非空数量),
+    窗口统计由前缀和之差得到, 族内所有 变换×窗口 的因子合并为一次select, 计算量随依赖因子数量而非族大小增长
+    1. 前缀和表先按(symbol, TradeDate[, TradeTime])显式排序, 累计和与窗口差分均按该顺序计算
+    2. 累计和基于按标的中心化的值x-c(c为该标的均值), 均值远大于波动时平方和相减不再损失精度; 均值 = 窗口和/k + c
+    3. 前缀和表同时保存不含当前行的前缀和(preX/preX2/preN), 窗口和 = 当前行的累计和 - 窗口首行之前的前缀和;
+       窗口首行早于表的第一行或窗口内非空值数量不足k时为空值(与mavg/mstd一致)
+    增量模式下父因子有滚动状态时(见FactorCalculator.get_state), 前缀和表由状态表中尾部的x与新日期拼接后重新计算, 不再回看父因子
+    """
+    prefixObj = f"{dependFactor}_prefix"
+    keyCols = self.get_keyCols(dependFactor)
+    windowSum = lambda col, preCol: f"({col}-move({preCol},{k-1}))"
+    sumX, sumX2, countX = windowSum("sumX", "preX"), windowSum("sumX2", "preX2"), windowSum("countX", "preN")
+    if transform == "avg":
+        expr = f"iif({countX}=={k}, {sumX}\\{k}+c, NULL)"
+    elif transform == "std":
+        expr = f"iif({countX}=={k}, sqrt(max(({sumX2}-{sumX}*{sumX}\\{k})\\{k-1}, 0.0)), NULL)"
+    else:
+        raise ValueError(f"不支持的因子族变换{transform}, 可选avg/std")
+    if dependFactor in self.stateDict:
+        prep = f"""
+    // 从滚动状态表读取{dependFactor}的尾部, 只追加{self.stateDict[dependFactor]}之后的新日期
+    {prefixObj} = unionAll(select {self.symbolCol},{self.dateCol},x from loadTable("{self.featureDB}", "{self.stateTB}") where factor="{dependFactor}",
+                           select {self.symbolCol},{self.dateCol},double({dependFactor}) as x from {self.factor_ref(dependFactor)} where {self.dateCol}>{self.stateDict[dependFactor]});
+    """
+    else:
+        prep = f"""
+    {prefixObj} = select {",".join(keyCols)},double({dependFactor}) as x from {self.factor_ref(dependFactor)};
+    """
+    sortCols = keyCols if dependFactor not in self.stateDict else keyCols[:2]  # 滚动状态只按日期保存
+    prep += f"""sortBy!({prefixObj}, `{"`".join(sortCols)});
+    update {prefixObj} set c = avg(x) context by {self.symbolCol};   // 按标的中心化
+    update {prefixObj} set sumX = cumsum(nullFill(x-c,0.0)), sumX2 = cumsum(nullFill((x-c)*(x-c),0.0)), countX = cumcount(x) context by {self.symbolCol};
+    update {prefixObj} set preX = sumX-nullFill(x-c,0.0), preX2 = sumX2-nullFill((x-c)*(x-c),0.0), preN = countX-iif(isNull(x),0,1);
+    """
+    return {"prep": prep,
+            "select": expr,
+            "from": prefixObj,
+            "by": f"context by {self.symbolCol} csort {','.join(keyCols[1:])}",
+            "fill": True}
+
+def get_family(self: FactorCalculator, factorName: str, feature: Dict, **args):
+    """因子族成员(由factor_cfg中的family模板展开, 见expand_factor_family)"""
+    params = feature["params"]
+    return family(self, feature["dependency"]["factor"][0], params["transform"], params["window"])
 
 def reverse(self: FactorCalculator, factorName: str, dependFactor: list):
     dependFactor0, dependFactor1 = dependFactor[0], dependFactor[1]
-    return f"""
+    if self.factor_ref(dependFactor0) == self.factor_ref(dependFactor1) == self.panelObj:  # 因子宽表中直接读取两列
+        return {"select": f"iif({dependFactor1}<avg({dependFactor1}), -1.0 * {dependFactor0}, 0.0)",
+                "from": self.panelObj,
+                "by": f"context by {self.dateCol}",
+                "fill": True}
+    return {"cmd": f"""
     {self.middleObj} = lj({self.factorDict}["{dependFactor0}"].copy(), {self.factorDict}["{dependFactor1}"].copy(), `{self.symbolCol}`{self.dateCol});
     update {self.middleObj} set {factorName} = 0.0;
     update {self.middleObj} set {factorName} = -1.0 * {dependFactor0} where {dependFactor1}<avg({dependFactor1}) context by {self.dateCol};
     {self.dataObj} = select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,{factorName} from {self.middleObj};
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
     {self.factorDict}["{factorName}"] = {self.dataObj};  // 丢进因子数据变量
     print("因子{factorName}计算完毕");
-    """
+    """, "fill": True, "reads": []}
 
 def umr(self: FactorCalculator, factorName: str, dependFactor: list, k:int):
     returnFactor, riskFactor = dependFactor[0], dependFactor[1]
-    return f"""
+    if self.factor_ref(returnFactor) == self.factor_ref(riskFactor) == self.panelObj:  # 因子宽表中直接读取两列
+        return {"select": f"msum({riskFactor}*({returnFactor}), {k})",
+                "from": self.panelObj,
+                "by": f"context by {self.symbolCol}",
+                "fill": True}
+    return {"cmd": f"""
     {self.middleObj} = lj({self.factorDict}["{returnFactor}"].copy(), {self.factorDict}["{riskFactor}"].copy(), `{self.symbolCol}`{self.dateCol});
     {self.dataObj} =  select {self.symbolCol},{self.dateCol},"{factorName}" as `factor,
                         msum({riskFactor}*({returnFactor}), 10) as {factorName} 
                         from {self.middleObj}
                         context by {self.symbolCol}
-    // 截面空缺值填充
-    update {self.dataObj} set {factorName} = nullFill({factorName},avg({factorName})) context by {self.dateCol};
     {self.factorDict}["{factorName}"] = {self.dataObj}
     print("因子{factorName}计算完毕");    
-    """
+    """, "fill": True, "reads": []}
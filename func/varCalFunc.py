@@ -1,31 +1,42 @@
 """
 注: 固定格式必须传入self: FactorCalculator, factorName: str, feature:Dict[Optional] {factor_cfg中的对应属性}
 """
+from statistics import NormalDist
 from Calculator import FactorCalculator
 from typing import Dict
 
-def get_vaR240_m120(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    return f"""
-    // dateCol,symbolCol,factorName
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},
-                    "{factorName}" as `factor,
-                    moving(varFunc,ret240,120,1) as `{factorName} 
-                    from {self.sourceObj}
-                    context by symbol
-                    order by symbol;
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
+def vaR(self: FactorCalculator, feature: Dict, conditional: bool = False):
+    """
+    滚动VaR/CVaR(损失为正), 不再对每一行调用moving(valueAtRisk/condValueAtRisk)
+    params: method(normal/historical, 默认normal), confidence(置信水平, 默认0.95), window(滚动窗口, 默认120)
+    1. normal: 只依赖滚动均值μ与标准差σ, 由mavg/mstd逐行O(1)更新
+       VaR = -(μ + σ·Φ⁻¹(1-c)), CVaR = -μ + σ·φ(Φ⁻¹(1-c))/(1-c)
+    2. historical: VaR为滚动窗口的(1-c)分位数取负, 由mpercentile维护窗口内的顺序统计量;
+       CVaR(尾部均值)没有增量形式, 仍使用moving(condValueAtRisk)
     """
+    params = feature["params"]
+    method, confidence, window = params.get("method", "normal"), params.get("confidence", 0.95), params.get("window", 120)
+    retCol = "ret240"
+    if method == "normal":
+        z = NormalDist().inv_cdf(1 - confidence)
+        if conditional:
+            expr = f"-mavg({retCol},{window},1) + {NormalDist().pdf(z) / (1 - confidence)!r}*mstd({retCol},{window},1)"
+        else:
+            expr = f"-mavg({retCol},{window},1) + {-z!r}*mstd({retCol},{window},1)"
+    elif method == "historical":
+        if conditional:
+            expr = f"moving(condValueAtRisk{{,'historical',{confidence}}},{retCol},{window},1)"
+        else:
+            expr = f"-mpercentile({retCol},{round((1 - confidence) * 100, 10)},{window},'linear',1)"
+    else:
+        raise ValueError(f"不支持的VaR计算方法{method}, 可选normal/historical")
+    return {"select": expr,
+            "from": self.sourceObj,
+            "by": f"context by {self.symbolCol} csort {self.dateCol},{self.timeCol} order by {self.symbolCol},{self.dateCol},{self.timeCol}",
+            "reads": [retCol]}
+
+def get_vaR240_m120(self: FactorCalculator, factorName: str, feature: Dict, **args):
+    return vaR(self, feature)
 
 def get_cvaR240_m120(self: FactorCalculator, factorName: str, feature: Dict, **args):
-    return f"""
-    // dateCol,symbolCol,factorName
-    {self.dataObj} = select {self.symbolCol},{self.dateCol},
-                    "{factorName}" as `factor,
-                    moving(cvarFunc,ret240,120,1) as `{factorName} 
-                    from {self.sourceObj}
-                    context by symbol
-                    order by symbol;
-    {self.factorDict}["{factorName}"] = {self.dataObj}; // 丢进因子数据变量
-    print("因子{factorName}计算完毕");
-    """
\ No newline at end of file
+    return vaR(self, feature, conditional=True)
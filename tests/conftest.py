@@ -0,0 +1,104 @@
+"""
+测试公共工具: 不依赖DolphinDB server
+1. FakeSession: 记录提交的脚本, 按respondList中的(条件, 返回值)应答查询
+2. make_calculator: 使用config目录中的配置创建FactorCalculator
+3. data_dir: 生成小规模合成行情数据(本地后端/流式引擎使用的csv)
+"""
+import os
+import sys
+import re
+import copy
+import json5
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Calculator import *  # noqa: E402
+from func import classFunc, shioMidFunc, shioCalFunc, varCalFunc, coinCalFunc, umrCalFunc, utilFunc  # noqa: E402
+
+DDB_MODULES = [classFunc, shioMidFunc, shioCalFunc, varCalFunc, coinCalFunc, umrCalFunc, utilFunc]
+
+
+def load_cfg():
+    """factor/indicator/class配置(每次重新读取, 测试之间互不影响)"""
+    resList = []
+    for name in ["factor.json5", "indicator.json5", "class.json5"]:
+        with open(os.path.join(ROOT, "config", name), "r", encoding="utf-8") as f:
+            resList.append(json5.load(f))
+    return resList
+
+
+class FakeSession:
+    """记录脚本的DolphinDB session替身: respondList中第一个满足条件(脚本->bool)的返回值作为run的结果"""
+    def __init__(self, respondList=None):
+        self.scripts = []
+        self.respondList = list(respondList or [])
+
+    def run(self, script, *args, **kwargs):
+        self.scripts.append(script)
+        for cond, value in self.respondList:
+            if cond(script):
+                return value(script) if callable(value) else value
+        if "temporalAdd(" in script and "\n" not in script.strip():   # 回看日期: 按工作日近似
+            date, nDays = re.match(r"temporalAdd\(([\d.]+),(-?\d+)", script).groups()
+            return pd.Timestamp(date.replace(".", "-")) + pd.offsets.BDay(int(nDays))
+        return None
+
+    def existsTable(self, **kwargs):
+        return True
+
+    def existsDatabase(self, **kwargs):
+        return True
+
+    def upload(self, *args, **kwargs):
+        return None
+
+
+def make_calculator(factor_list=None, session=None, modules=None, backend=None, **configDict):
+    """使用config目录中的配置创建FactorCalculator, configDict覆盖全局config中的配置项"""
+    factor_cfg, indicator_cfg, class_cfg = load_cfg()
+    F = FactorCalculator(session=session if session is not None else FakeSession(),
+                         config={**copy.deepcopy(config), **configDict},
+                         factor_cfg=factor_cfg,
+                         indicator_cfg=indicator_cfg,
+                         func_map=get_funcMapFromImport(*(modules or DDB_MODULES)),
+                         class_cfg=class_cfg,
+                         backend=backend)
+    F.set_factorList(factor_list or list(F.factor_cfg.keys()))
+    return F
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """合成行情: 3个标的, 30个交易日的日K线/基本面/指数, 前4个交易日的1分钟K线(每日240根)"""
+    rng = np.random.default_rng(0)
+    symbols = [f"{i:06d}.SZ" for i in range(3)]
+    dates = pd.bdate_range("2024-01-01", periods=30)
+    dayList, minList = [], []
+    times = [str(t)[-8:] for t in pd.timedelta_range("09:31:00", periods=240, freq="min")]
+    for symbol in symbols:
+        close = 10 + rng.standard_normal(len(dates)).cumsum() * 0.1
+        open_ = close * (1 + rng.standard_normal(len(dates)) * 0.01)
+        dayList.append(pd.DataFrame({"symbol": symbol, "TradeDate": dates, "open": open_,
+                                     "high": np.maximum(open_, close) * 1.01, "low": np.minimum(open_, close) * 0.99,
+                                     "close": close, "volume": rng.integers(100000, 1000000, len(dates)),
+                                     "amount": rng.random(len(dates)) * 1e7}))
+        for date in dates[:4]:
+            price = 10 + rng.standard_normal(240).cumsum() * 0.01
+            minList.append(pd.DataFrame({"symbol": symbol, "TradeDate": date, "TradeTime": times,
+                                         "open": price, "high": price, "low": price, "close": price,
+                                         "volume": rng.integers(100, 10000, 240), "amount": rng.random(240) * 1e5}))
+    day = pd.concat(dayList, ignore_index=True)
+    day.to_csv(tmp_path / "stockDayKBar.csv", index=False)
+    pd.concat(minList, ignore_index=True).to_csv(tmp_path / "stockMin1KBar.csv", index=False)
+    pd.DataFrame({"TradeDate": dates, "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0,
+                  "pct_chg": rng.standard_normal(len(dates)), "pre_close": 1.0, "volume": 1, "amount": 1.0}
+                 ).to_csv(tmp_path / "stockDayIndex.csv", index=False)
+    basic = day[["symbol", "TradeDate"]].rename(columns={"symbol": "ts_code", "TradeDate": "trade_date"})
+    basic["turnover_rate"] = rng.random(len(basic))
+    basic.loc[basic.sample(frac=0.05, random_state=1).index, "turnover_rate"] = np.nan
+    basic.to_csv(tmp_path / "stockBasic.csv", index=False)
+    return tmp_path
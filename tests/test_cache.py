@@ -0,0 +1,41 @@
+"""结果缓存: 因子指纹(user-011)"""
+from conftest import *
+
+
+def test_fingerprint_stable_across_init_check():
+    F = make_calculator()
+    F.init_check()
+    before = {factor: F.get_fingerprint(factor) for factor in F.factor_list}
+    F.init_check()  # explain之后再run等重复调用
+    G = make_calculator()
+    G.init_check()
+    assert before == {factor: F.get_fingerprint(factor) for factor in F.factor_list}
+    assert before == {factor: G.get_fingerprint(factor) for factor in G.factor_list}
+
+
+def test_fingerprint_includes_helper_source():
+    F = make_calculator(["vaR240_m120"])
+    source = F.get_funcSource(F.func_map["get_vaR240_m120"])
+    assert "def vaR(" in source
+    assert "def family(" in F.get_funcSource(F.func_map["get_family"])
+
+
+def test_fingerprint_propagates_to_downstream():
+    F = make_calculator(["shio_avg20"])
+    F.init_check()
+    before = F.get_fingerprint("shio_avg20")
+    F.factor_cfg["shio"]["params"]["callBackPeriod"] = 1
+    assert F.get_fingerprint("shio_avg20") != before
+
+
+def test_run_skips_factors_with_matching_fingerprint():
+    factorList = ["interDayReturn", "intraDayReturn"]
+    G = make_calculator(factorList)
+    G.init_check()
+    stored = pd.DataFrame({"factor": factorList, "fingerprint": [G.get_fingerprint(factor) for factor in factorList],
+                           "startDate": [pd.Timestamp("2020.01.01")] * 2, "endDate": [pd.Timestamp("2025.01.01")] * 2})
+    session = FakeSession([(lambda script: "select factor, fingerprint" in script, stored)])
+    F = make_calculator(factorList, session=session, resultCache=True)
+    for _ in range(2):  # 同一进程中多次运行, 指纹不随init_check变化
+        assert F.run("2024.01.01", "2024.06.30") is None
+    assert not any("InsertDayFactor(" in script and "day_factor_need" in script for script in session.scripts)
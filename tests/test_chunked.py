@@ -0,0 +1,21 @@
+"""分块模式: 按时间窗口运行, 窗口向前加载回看期且只写入窗口内部(user-002)"""
+from conftest import *
+
+
+def test_chunk_list_is_contiguous():
+    chunkList = FactorCalculator.get_chunkList("2024.02.15", "2024.09.10", "Q")
+    assert chunkList == [("2024.02.15", "2024.03.31"), ("2024.04.01", "2024.06.30"), ("2024.07.01", "2024.09.10")]
+
+
+def test_run_chunked_runs_each_window_with_warmup():
+    session = FakeSession()
+    F = make_calculator(["interDayReturn_avg20"], session=session)
+    F.run_chunked("2024.01.01", "2024.06.30", freq="Q")
+    scripts = [script for script in session.scripts if "InsertDayFactor(" in script and "writeStartDict" in script]
+    assert len(scripts) == 2
+    for script, chunk_start in zip(scripts, ["2024.01.01", "2024.04.01"]):
+        writeStart = (pd.Timestamp(chunk_start) - pd.Timedelta(days=1)).strftime("%Y.%m.%d")
+        assert f"writeStartDict = dict(['interDayReturn_avg20'], [{writeStart}]);" in script   # 只写入窗口内部
+        loadStart = F.get_callBackDate(chunk_start, F.get_callBackPeriod("interDayReturn_avg20"))
+        assert f"start_date = {loadStart};" in script   # 向前多加载回看期
+        assert f"{F.factorDict}.clear!()" in script
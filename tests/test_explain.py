@@ -0,0 +1,38 @@
+"""执行计划: 所有表的行数使用同一模型(user-018)"""
+from conftest import *
+
+ROWS = {"stockDayKBar": 3000, "stockMin1KBar": 3000 * 240, "stockBasic": 3000, "stockDayIndex": 30}
+
+
+def source_rows(F, script):
+    """按脚本中的loadTable返回原始数据表的行数"""
+    for dataPath, cfg in F.indicator_cfg.items():
+        if f'loadTable("{cfg["dataPath"][0]}", "{cfg["dataPath"][1]}")' in script:
+            return ROWS.get(dataPath, 3000)
+    return 3000
+
+
+def make_explain_calculator():
+    F = make_calculator(session=FakeSession([(lambda script: "exec count(*)" in script, lambda script: source_rows(F, script))]))
+    return F
+
+
+def test_prefix_rows_follow_base_factor_rows():
+    F = make_explain_calculator()
+    stages = F.explain("2024.01.01", "2024.12.31")["stages"]
+    factorRows = stages[stages["stage"] == "factor"].drop_duplicates("object").set_index("object")["rows"]
+    prep = stages[stages["stage"] == "prep"]
+    assert len(prep) > 0
+    for obj, rows, nBytes in zip(prep["object"], prep["rows"], prep["bytes"]):
+        base = obj[:-len("_prefix")]
+        assert rows == factorRows[base]
+        assert nBytes == F.get_prefixBytes(rows)
+
+
+def test_daily_factor_rows_from_source_rows():
+    F = make_explain_calculator()
+    stages = F.explain("2024.01.01", "2024.12.31")["stages"]
+    factorRows = stages[stages["stage"] == "factor"].drop_duplicates("object").set_index("object")["rows"]
+    assert factorRows["shio"] == ROWS["stockMin1KBar"] // F.barsPerDay   # 分钟频数据计算的日频因子
+    assert factorRows["vaR240_m120"] == ROWS["stockMin1KBar"]
+    assert factorRows["shio_avg5"] == factorRows["shio"]     # 因子族成员与父因子行数相同
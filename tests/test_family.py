@@ -0,0 +1,49 @@
+"""因子族内核: 显式排序与中心化前缀和(user-023)"""
+from conftest import *
+from func.utilFunc import family
+
+
+def window_stats(x, k, center):
+    """按family生成的表达式逐步计算(numpy): 前缀和 -> 窗口差分 -> avg/std"""
+    c = np.nanmean(x) if center else 0.0
+    xc = np.nan_to_num(x - c)
+    sumX, sumX2, countX = np.cumsum(xc), np.cumsum(xc * xc), np.cumsum(~np.isnan(x))
+    preX, preX2, preN = sumX - xc, sumX2 - xc * xc, countX - ~np.isnan(x)
+    move = lambda v: np.concatenate([np.full(k - 1, np.nan), v[:len(v) - k + 1]])
+    wX, wX2, wN = sumX - move(preX), sumX2 - move(preX2), countX - move(preN)
+    avg = np.where(wN == k, wX / k + c, np.nan)
+    std = np.where(wN == k, np.sqrt(np.maximum((wX2 - wX * wX / k) / (k - 1), 0.0)), np.nan)
+    return avg, std
+
+
+def test_centered_prefix_sums_keep_precision_on_long_history():
+    x = 1e4 + np.random.default_rng(0).standard_normal(20000) * 1e-2  # 均值远大于波动的长历史
+    x[100] = np.nan
+    expected = pd.Series(x).rolling(5, min_periods=5)
+    avg, std = window_stats(x, 5, center=True)
+    np.testing.assert_allclose(avg, expected.mean(), rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(std, expected.std(), rtol=1e-5, equal_nan=True)
+    _, rawStd = window_stats(x, 5, center=False)   # 未中心化的累计平方和相减
+    assert np.nanmax(np.abs(rawStd / expected.std() - 1)) > 1e-2
+
+
+def test_family_sorts_prefix_before_cumsum():
+    F = make_calculator()
+    F.init_check()
+    res = family(F, "shio", "std", 5)
+    prep = res["prep"]
+    assert prep.index(f"sortBy!(shio_prefix, `{F.symbolCol}`{F.dateCol})") < prep.index("cumsum(")
+    assert "c = avg(x)" in prep and "x-c" in prep
+    assert res["by"] == f"context by {F.symbolCol} csort {F.dateCol}"
+    assert family(F, "shio", "avg", 5)["select"].endswith("\\5+c, NULL)")
+
+
+def test_family_state_mode_rebuilds_prefix_from_tail_values():
+    F = make_calculator()
+    F.init_check()
+    F.stateDict = {"shio": "2024.01.05"}
+    prep = family(F, "shio", "avg", 5)["prep"]
+    assert f'select {F.symbolCol},{F.dateCol},x from loadTable("{F.featureDB}", "{F.stateTB}")' in prep
+    assert f"where {F.dateCol}>2024.01.05" in prep
+    assert prep.index("sortBy!(shio_prefix") < prep.index("cumsum(")
+    assert "sumX0" not in prep
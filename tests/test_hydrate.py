@@ -0,0 +1,30 @@
+"""依赖因子读取: 只读取日频因子数据库, 分钟频依赖因子显式提示重新计算(user-012)"""
+from conftest import *
+
+
+def make_hydrate_calculator(coverage):
+    session = FakeSession([(lambda script: "as startDate" in script, coverage)])
+    F = make_calculator(["interDayReturn_avg5", "vaR240_m120"], session=session, hydrate=True)
+    F.factor_cfg["vaR240_m120_avg5"] = {**copy.deepcopy(F.factor_cfg["interDayReturn_avg5"]),
+                                        "dependency": {"factor": ["vaR240_m120"], "midFunc": None}}
+    F.set_factorList(["interDayReturn_avg5", "vaR240_m120_avg5"])
+    F.init_check()
+    return F
+
+
+def test_hydrate_reads_daily_and_reports_minute_dependencies(capsys):
+    coverage = pd.DataFrame({"factor": ["interDayReturn"], "startDate": pd.to_datetime(["2020-01-01"]),
+                             "lastDate": pd.to_datetime(["2024-12-31"])})
+    F = make_hydrate_calculator(coverage)
+    hydrateList = F.plan_hydrate("2024.01.01", "2024.06.30")
+    assert hydrateList == ["interDayReturn"]
+    assert "vaR240_m120" in F.factor_list    # 分钟频依赖因子保留, 重新计算
+    query = [script for script in F.session.scripts if "as startDate" in script][0]
+    assert "vaR240_m120" not in query
+    assert "分钟频依赖因子['vaR240_m120']" in capsys.readouterr().out
+
+
+def test_hydrate_reports_minute_dependencies_without_daily_coverage(capsys):
+    F = make_hydrate_calculator(pd.DataFrame({"factor": [], "startDate": [], "lastDate": []}))
+    assert F.plan_hydrate("2024.01.01", "2024.06.30") == []
+    assert "分钟频依赖因子['vaR240_m120']" in capsys.readouterr().out
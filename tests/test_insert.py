@@ -0,0 +1,35 @@
+"""因子写入: 写入速度记录进阶段统计(user-010)"""
+from conftest import *
+
+
+def test_update_data_records_insert_rate():
+    F = make_calculator(telemetry=True)
+    F.init_check()
+    script = F.update_data(factor_list=[F.factor_day_list[0], F.factor_min_list[0]])
+    assert "limit 10" not in script
+    assert script.count("insertRate = Insert") == 2
+    assert script.count(f'{F.statsTB}.tableInsert(') == 2
+    assert all("insertRate);" in line for line in script.splitlines() if "string(getCurrentSessionAndUser()[0])" in line)
+    assert "krow \\ max(1, now()-startTime)" in F.data_insert()
+
+
+def test_write_behind_records_job_rate():
+    F = make_calculator(telemetry=True)
+    F.init_check()
+    factorName = F.factor_day_list[0]
+    script = F.write_cmd(factorName) + F.update_data(factor_list=[factorName])
+    assert f'writeFactors.append!("{factorName}")' in script
+    assert "insertRate = getJobReturn(writeJobs[i], true)" in script
+    assert "writeFactors[i]" in script
+
+
+def test_collect_stats_keeps_insert_rate():
+    stats = pd.DataFrame({"group": ["g", "g"], "kind": ["calFunc", "insert"], "name": ["a", "a"],
+                          "startTime": pd.to_datetime(["2024-01-01 09:00:00", "2024-01-01 09:00:01"]),
+                          "endTime": pd.to_datetime(["2024-01-01 09:00:01", "2024-01-01 09:00:03"]),
+                          "rows": [10, 10], "memBefore": [0, 0], "memAfter": [8, 0], "worker": ["1", "1"],
+                          "rowsPerSec": [np.nan, 5.0]})
+    F = make_calculator(telemetry=True, session=FakeSession([(lambda script: "select * from" in script, stats)]))
+    res = F.collect_stats()
+    assert res.loc[res["kind"] == "insert", "rowsPerSec"].tolist() == [5.0]
+    assert res["duration"].tolist() == [1000.0, 2000.0]
@@ -0,0 +1,54 @@
+"""加载规划: 被多个dataPath组共用的数据表只加载一次存入sourceDict, 最后一次使用后释放"""
+import re
+from conftest import FakeSession, make_calculator
+
+SHARED = ["stockMin1KBar", "stockDayKBar", "stockBasic", "stockDayIndex"]
+
+
+def run_script():
+    session = FakeSession()
+    F = make_calculator(session=session)
+    F.run("2024.01.01", "2024.03.31")
+    return F, max(session.scripts, key=len)
+
+
+def test_shared_tables_loaded_once():
+    F, script = run_script()
+    for path in SHARED:
+        # 每次加载为dateCol的if/else两个分支, 带日期过滤的分支只出现一次
+        assert len(re.findall(rf'{F.sourceDict}\["{path}"\] = <select[^\n]*where', script)) == 1, path
+        assert script.count(f'{F.sourceDict}.erase!("{path}")') == 1, path
+        assert script.index(f'{F.sourceDict}["{path}"] = <select') < script.index(f'{F.sourceDict}.erase!("{path}")')
+    assert F.loadedDict == {}
+
+
+def test_plan_load_counts():
+    F = make_calculator()
+    F.init_check()
+    F.init_group()
+    F.plan_load()
+    assert set(F.loadCountDict) == set(SHARED)
+    groupList = [dataPath for dataPathDict in [F.dataPath_MD_dict, F.dataPath_MM_dict, F.dataPath_DD_dict]
+                 for dataPath in dataPathDict if dataPath]
+    for path in SHARED:
+        assert F.loadCountDict[path] == sum(path in dataPath.split("$") for dataPath in groupList)
+
+
+def test_need_broadcast():
+    F = make_calculator()
+    F.init_check()
+    F.init_group()
+    splitPath, dayPath = ["stockMin1KBar", "stockDayKBar"], ["stockDayKBar", "stockBasic"]
+    featureDict = F.get_featuresGivenFactor(F.dataPath_MD_dict["$".join(splitPath)])
+    assert F.is_splitPath(splitPath) and not F.is_splitPath(dayPath)
+    assert not F.need_broadcast(splitPath, featureDict, "update df set vwap = stockMin1KBar_amount\\stockMin1KBar_volume")
+    assert F.need_broadcast(splitPath, featureDict, "update df set ret = stockMin1KBar_close\\stockDayKBar_close")
+    assert F.need_broadcast(dayPath, featureDict, "")    # 非分钟频+日频组总是展开
+
+
+def test_split_group_skips_day_tables():
+    F, script = run_script()
+    i = script.index("// 从共用数据表构建stockMin1KBar\n")
+    build = script[i:script.index("update df", i)]
+    assert "stockDayKBar" not in build and "lsj(" not in build and F.daySourceObj not in build
+    assert "从共用数据表构建stockMin1KBar$stockDayKBar" not in script
@@ -0,0 +1,60 @@
+"""本地执行后端: 不依赖DolphinDB server(user-005)"""
+from conftest import *
+from CalculatorLocal import LocalBackend
+from func import localFunc
+
+
+def make_local(factor_list, data_dir, func_map=None):
+    func_map = func_map if func_map is not None else get_funcMapFromImport(localFunc)
+    return make_calculator(factor_list, session=None, modules=[localFunc], backend=LocalBackend(str(data_dir), func_map))
+
+
+def test_local_family_matches_pandas_rolling(data_dir):
+    F = make_local(["interDayReturn_avg5", "interDayReturn_std5"], data_dir)
+    res = F.run("2024.01.01", "2024.02.09")
+    base = res["interDayReturn_avg5"].merge(res["interDayReturn_std5"], on=[F.symbolCol, F.dateCol])
+    base = base.merge(F.backend.factorDict["interDayReturn"][[F.symbolCol, F.dateCol, "interDayReturn"]], on=[F.symbolCol, F.dateCol])
+    group = base.groupby(F.symbolCol)["interDayReturn"]
+    np.testing.assert_allclose(base["interDayReturn_avg5"], group.transform(lambda x: x.rolling(5, min_periods=5).mean()),
+                               rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(base["interDayReturn_std5"], group.transform(lambda x: x.rolling(5, min_periods=5).std()),
+                               rtol=1e-9, equal_nan=True)
+    assert base["interDayReturn_avg5"].notna().sum() == 3 * (30 - 5 + 1)
+
+
+def test_local_vaR_on_tiny_frame():
+    backend = LocalBackend(None, {})
+    backend.symbolCol, backend.dateCol, backend.timeCol = "symbol", "TradeDate", "TradeTime"
+    ret = np.random.default_rng(0).standard_normal(16) * 0.01
+    backend.sourceObj = pd.DataFrame({"symbol": ["a"] * 8 + ["b"] * 8, "TradeDate": pd.Timestamp("2024-01-02"),
+                                      "TradeTime": [f"09:3{i}:00" for i in range(8)] * 2, "ret240": ret})
+    for method in ["normal", "historical"]:
+        res = localFunc.vaR(backend, "v", {"params": {"method": method, "confidence": 0.95, "window": 4}})
+        assert list(res.columns) == ["symbol", "TradeDate", "TradeTime", "factor", "v"]
+        for k, symbol in enumerate(["a", "b"]):
+            x = ret[8 * k + 4: 8 * k + 8]  # 最后一根K线的窗口
+            expected = -x.mean() + 1.6448536269514722 * x.std(ddof=1) if method == "normal" else -np.quantile(x, 0.05)
+            assert res.loc[res["symbol"] == symbol, "v"].iloc[-1] == pytest.approx(expected, rel=1e-12)
+
+
+def test_local_missing_function_fails_before_compute(data_dir):
+    func_map = get_funcMapFromImport(localFunc)
+    func_map.pop("get_vaR240_m120")
+    F = make_local(["interDayReturn", "vaR240_m120"], data_dir, func_map)
+    with pytest.raises(NotImplementedError, match="get_vaR240_m120"):
+        F.run("2024.01.01", "2024.01.05")
+    assert F.backend.factorDict == {} and F.backend.tableDict == {}
+
+
+def test_local_explain_counts_rows_from_files(data_dir):
+    F = make_local(["interDayReturn", "vaR240_m120"], data_dir)
+    res = F.explain("2024.01.01", "2024.01.05")
+    load = res["stages"].query("stage == 'load'").drop_duplicates("object").set_index("object")["rows"]
+    assert load["stockDayKBar"] == 3 * 5
+    assert load["stockMin1KBar"] == 3 * 4 * 240
+
+
+def test_script_modes_require_dolphindb_backend(data_dir):
+    F = make_local(["interDayReturn"], data_dir)
+    with pytest.raises(NotImplementedError, match="run_chunked"):
+        F.run_chunked("2024.01.01", "2024.01.05")
@@ -0,0 +1,16 @@
+"""因子宽表模式: 原地新增列(user-008)"""
+from conftest import *
+
+
+def test_panel_appends_columns_in_place():
+    F = make_calculator(factorPanel=True)
+    F.init_check()
+    F.init_group()
+    factorList = F.dataPath_DD_dict["stockDayKBar"]
+    script = F.processing_group("2024.01.01", "2024.03.31", "stockDayKBar", factorList)
+    assert f"{F.panelObj} = lj(" not in script   # 宽表不再整体复制
+    assert f"{F.middleObj} = lj(select {F.symbolCol},{F.dateCol} from {F.panelObj}" in script
+    # factorDict在组内计算完毕后一次性指向宽表
+    assert script.count(f"{F.factorDict}[factor] = {F.panelObj}") == 1
+    assert script.index(f"{F.factorDict}[factor] = {F.panelObj}") > script.rindex(f"update {F.panelObj} set")
+    assert F.panelMode is False
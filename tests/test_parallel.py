@@ -0,0 +1,51 @@
+"""并发模式: dataPath组调度(user-003)"""
+from concurrent.futures import Future
+from conftest import *
+
+
+class FakePool:
+    """连接池替身: 提交的脚本立即完成"""
+    def __init__(self):
+        self.scripts = []
+
+    def runTaskAsync(self, script):
+        future = Future()
+        future.set_result(None)
+        self.scripts.append(script)
+        return future
+
+
+def test_group_graph_follows_factor_dependency():
+    F = make_calculator()
+    F.init_check()
+    F.init_group()
+    dataPathDict = {**F.dataPath_MD_dict, **F.dataPath_MM_dict, **F.dataPath_DD_dict}
+    G = F.get_groupGraph(dataPathDict)
+    factorGroup = {factor: dataPath for dataPath, factorList in dataPathDict.items() for factor in factorList}
+    for factor, dataPath in factorGroup.items():
+        for dep in F.factor_cfg[factor]["dependency"]["factor"] or []:
+            if factorGroup.get(dep, dataPath) != dataPath:
+                assert G.has_edge(factorGroup[dep], dataPath)
+
+
+def test_run_parallel_submits_every_group_once():
+    F = make_calculator()
+    F.loadCountDict = {"stale": 1}  # 之前运行遗留的加载规划
+    pool = FakePool()
+    F.run_parallel("2024.01.01", "2024.03.31", pool)
+    assert len(pool.scripts) == len(F.dolphindb_cmdDict)
+    assert F.loadCountDict == {}
+    assert not any('sourceDict["' in script for script in pool.scripts)
+
+
+def test_run_parallel_rejects_cyclic_groups(monkeypatch):
+    F = make_calculator()
+    def cyclic(dataPathDict):
+        G = nx.DiGraph()
+        G.add_nodes_from(dataPathDict.keys())
+        a, b = list(dataPathDict.keys())[:2]
+        G.add_edges_from([(a, b), (b, a)])
+        return G
+    monkeypatch.setattr(F, "get_groupGraph", cyclic)
+    with pytest.raises(ValueError, match="循环依赖"):
+        F.run_parallel("2024.01.01", "2024.03.31", FakePool())
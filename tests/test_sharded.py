@@ -0,0 +1,18 @@
+"""分片模式: 分片只计算时序部分, 截面填充在主session合并分片后执行(user-004)"""
+from conftest import *
+from test_parallel import FakePool
+
+
+def test_run_sharded_defers_fill_to_main_session():
+    session = FakeSession()
+    F = make_calculator(["interDayReturn", "interDayReturn_avg5"], session=session)
+    pool = FakePool()
+    F.run_sharded("2024.01.01", "2024.03.31", pool, nShard=3)
+    assert len(pool.scripts) == 3 * len({**F.dataPath_MD_dict, **F.dataPath_MM_dict, **F.dataPath_DD_dict})
+    for shardId, script in enumerate(pool.scripts[:3]):
+        assert f"hashBucket(" in script and f", 3)=={shardId}" in script
+        assert "nullFill(interDayReturn,avg(interDayReturn))" not in script    # 分片内只计算时序部分
+    main = "".join(session.scripts)
+    assert 'unionAll([factorDictShard["interDayReturn#0"],factorDictShard["interDayReturn#1"],factorDictShard["interDayReturn#2"]], false)' in main
+    assert main.index("unionAll(") < main.index("nullFill(interDayReturn,avg(interDayReturn))")
+    assert F.shardMode is False and F.fuseDict == {}
@@ -0,0 +1,67 @@
+"""
+潮汐因子: 向量化分段版本(shioSegment)与defg版本(shioFunc/shioStrongFunc/shioWeakFunc)结果一致(user-021)
+需要DolphinDB server(环境变量DDB_HOST/DDB_PORT/DDB_USER/DDB_PASSWORD), 不可用时跳过
+"""
+import os
+from conftest import *
+from func.shioMidFunc import shioFunc, shioStrongFunc, shioWeakFunc, shioSegment
+from func.shioCalFunc import get_shio, get_shioStrong, get_shioWeak
+
+FACTORS = ["shio", "shioStrong", "shioWeak"]
+FUNCS = [get_shio, get_shioStrong, get_shioWeak]
+
+
+@pytest.fixture
+def ddb_session():
+    session = ddb.session()
+    try:
+        connected = session.connect(os.environ.get("DDB_HOST", "localhost"), int(os.environ.get("DDB_PORT", 8848)),
+                                    os.environ.get("DDB_USER", "admin"), os.environ.get("DDB_PASSWORD", "123456"))
+    except Exception:
+        connected = False
+    if not connected:
+        pytest.skip("DolphinDB server不可用")
+    yield session
+    session.close()
+
+
+def make_bars() -> pd.DataFrame:
+    """分钟K线(classFunc之后的sourceObj): 包含成交量峰值在首根/末根有效K线、峰值并列与前12根mVol为空的情形"""
+    rng = np.random.default_rng(0)
+    dataList = []
+    for i, symbol in enumerate([f"{i:06d}.SZ" for i in range(4)]):
+        for date in pd.bdate_range("2024-01-01", periods=3):
+            mVol = rng.integers(100, 10000, 240).astype(float)
+            mVol[:12] = np.nan
+            if i == 1:
+                mVol[12] = 1e6  # 峰值为首根有效K线: 峰值前没有价格
+            elif i == 2:
+                mVol[-1] = 1e6  # 峰值为末根K线: 峰值后没有价格
+            elif i == 3:
+                mVol[[50, 150]] = 1e6   # 峰值并列: 取首个
+            dataList.append(pd.DataFrame({"symbol": symbol, "TradeDate": date, "mVol": mVol,
+                                          "stockMin1KBar_close": 10 + rng.standard_normal(240).cumsum() * 0.01}))
+    return pd.concat(dataList, ignore_index=True)
+
+
+def test_shio_segment_matches_defg(ddb_session):
+    F = make_calculator(FACTORS, session=ddb_session)
+    F.init_check()
+    ddb_session.upload({F.sourceObj: make_bars()})
+    ddb_session.run("".join([func(F)["cmd"] for func in [shioFunc, shioStrongFunc, shioWeakFunc]]) + shioSegment(F)["cmd"])
+    keyCols = [F.dateCol, F.symbolCol]
+
+    def select(midFunc: str) -> pd.DataFrame:
+        feature = {"dependency": {"factor": None, "midFunc": [midFunc]}}
+        resList = [func(F, factorName, feature) for factorName, func in zip(FACTORS, FUNCS)]
+        keys = "" if resList[0]["by"].startswith("group by") else f"{','.join(keyCols)}, "
+        res = ddb_session.run(f"""select {keys}{", ".join([f"{res['select']} as {factorName}" for factorName, res in zip(FACTORS, resList)])}
+                                  from {resList[0]["from"]} {resList[0]["by"]}""")
+        return res[keyCols + FACTORS].sort_values(keyCols).reset_index(drop=True)
+
+    try:
+        defg, segment = select("shioFunc"), select("shioSegment")
+    finally:
+        ddb_session.run(f"undef(`shioTb`{F.sourceObj}); undef(`shioFunc`shioStrongFunc`shioWeakFunc, DEF);")
+    assert len(defg) == 12
+    pd.testing.assert_frame_equal(defg, segment, check_exact=False, rtol=0, atol=1e-9)
@@ -0,0 +1,52 @@
+"""滚动状态与依赖/回看期辅助函数(user-024)"""
+from conftest import *
+
+
+def test_get_deps_normalizes_config():
+    F = make_calculator()
+    F.init_check()
+    F.factor_cfg["shio_avg5"]["dependency"]["factor"] = "shio"  # 单个因子名称
+    assert F.get_deps("shio_avg5") == ["shio"]
+    assert F.get_deps("shio") == []
+    assert F.get_familyDict()["shio"][0] == "shio_avg5"
+
+
+def test_get_periodDays_converts_minute_bars():
+    F = make_calculator()
+    F.init_check()
+    assert F.get_periodDays("vaR240_m120") == -(-120 // F.barsPerDay)    # 分钟频: K线数量向上取整为交易日
+    assert F.get_periodDays("shio_avg20") == 20
+
+
+def test_state_length_and_callback_with_state():
+    F = make_calculator()
+    F.init_check()
+    memberList = F.get_familyDict()["shio"]
+    assert F.get_stateLength(memberList) == max(int(F.factor_cfg[m]["params"]["window"]) for m in memberList)
+    assert F.get_callBackPeriod("shio_avg120") == 120
+    F.stateDict = {"shio": "2024.03.29"}    # 窗口已保存于滚动状态表
+    assert F.get_callBackPeriod("shio_avg120") == 0
+
+
+def test_get_state_requires_matching_fingerprint_and_members():
+    F = make_calculator()
+    F.init_check()
+    familyDict = F.get_familyDict()
+    df = pd.DataFrame({"factor": ["shio", "interDayReturn"],
+                       "fingerprint": [F.get_stateFingerprint("shio", familyDict["shio"]), "stale"],
+                       "stateDate": pd.to_datetime(["2024-03-29", "2024-03-29"])})
+    F.session = FakeSession([(lambda script: "as stateDate" in script, df)])
+    lastDateDict = {factor: "2024.03.29" for factor in familyDict["shio"] + familyDict["interDayReturn"]}
+    assert F.get_state(lastDateDict) == {"shio": "2024.03.29"}
+    lastDateDict[familyDict["shio"][0]] = "2024.03.28"   # 落后于状态的成员需要从头计算
+    assert F.get_state(lastDateDict) == {}
+
+
+def test_state_cmd_keeps_state_length_rows():
+    F = make_calculator(["shio_avg5", "shio_std20"])
+    F.init_check()
+    F.prepDict = {"shio_prefix": "..."}
+    cmd = F.state_cmd()
+    assert f"csort {F.dateCol} limit -20;" in cmd
+    assert 'delete from loadTable' in cmd and 'undef("shio_prefix")' in cmd
+    assert F.prepDict == {}
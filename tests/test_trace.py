@@ -0,0 +1,19 @@
+"""trace导出: 增量模式同样记录阶段统计(user-020)"""
+import json
+from conftest import *
+
+STATS = pd.DataFrame({"group": ["stockDayKBar"], "kind": ["calFunc"], "name": ["interDayReturn"],
+                      "startTime": pd.to_datetime(["2024-01-01 09:00:00"]), "endTime": pd.to_datetime(["2024-01-01 09:00:01"]),
+                      "rows": [10], "memBefore": [0], "memAfter": [8], "worker": ["1"], "rowsPerSec": [np.nan]})
+
+
+def test_run_incremental_exports_trace(tmp_path):
+    session = FakeSession([(lambda script: script.startswith("select * from"), STATS),
+                           (lambda script: "as lastDate" in script, pd.DataFrame({"factor": [], "lastDate": []}))])
+    F = make_calculator(["interDayReturn"], session=session)
+    path = tmp_path / "trace.json"
+    F.run_incremental("2024.01.01", "2024.01.31", trace=str(path))
+    assert F.telemetry is False     # 只在本次运行中临时开启
+    assert any(f"{F.statsTB}.tableInsert(" in script for script in session.scripts)
+    events = json.loads(path.read_text(encoding="utf-8"))["traceEvents"]
+    assert [event["name"] for event in events if event["ph"] == "X"] == ["interDayReturn"]